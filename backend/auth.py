@@ -1,39 +1,128 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from models import User
+from passwords import pwd_context, password_hasher
 import os
 
-# 密码加密配置
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # JWT配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-jwt-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30天
 
+# 身份缓存：已验证的token -> 用户，有效期（秒）和最多缓存的token数
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
 security = HTTPBearer()
 
+class IdentityCache:
+    """token到用户的TTL + LRU缓存
+    
+    缓存的User已从会话中分离，只供读取；修改用户数据的接口需要在自己的会话中重新查询，
+    并在提交后调用invalidate_user（筹码、禁用、管理员权限变化后下一次请求重新查库）。
+    """
+    
+    def __init__(self, ttl: float = IDENTITY_CACHE_TTL, max_size: int = IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # token -> (过期时间, 用户)，按最近使用排序
+        self._entries: OrderedDict = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+    
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        """缓存用户，不超过token本身的过期时间（token_expires_at为UNIX时间戳）"""
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (time.monotonic() + ttl, user)
+        self._tokens_by_user.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def _remove(self, token: str):
+        _, user = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.id]
+    
+    def invalidate_user(self, user_id: int):
+        """用户数据变化后丢弃其所有token的缓存"""
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(token)
+            self.invalidations += 1
+    
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_user.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "users": len(self._tokens_by_user),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+identity_cache = IdentityCache()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
+    """验证密码（同步计算，接口中使用password_hasher）"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
+    """生成密码哈希（同步计算，供初始化脚本使用；接口中使用password_hasher）"""
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """验证用户身份"""
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(db: AsyncSession, username: str, password: str,
+                            client: Optional[str] = None) -> Optional[User]:
+    """验证用户身份（bcrypt在线程池中计算，client为客户端IP，用于准入控制）"""
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password, client)
+    if not verified:
         return None
+    if new_hash:
+        # 哈希参数已调整，登录成功时透明地按新参数重新保存
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -48,20 +137,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """验证令牌并返回用户名"""
+def decode_token(token: str) -> Optional[dict]:
+    """验证令牌并返回载荷"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str) -> Optional[str]:
+    """验证令牌并返回用户名"""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
+async def user_for_token(db: AsyncSession, token: str) -> Optional[User]:
+    """按token取用户，优先使用身份缓存（返回的User不属于db会话）"""
+    user = identity_cache.get(token)
+    if user is not None:
+        return user
+    return await load_user(db, token)
 
-def get_current_user(
+async def load_user(db: AsyncSession, token: str) -> Optional[User]:
+    """查询token对应的用户并放入身份缓存"""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    user = await db.scalar(select(User).where(User.username == payload["sub"]))
+    if user is None:
+        return None
+    db.expunge(user)
+    identity_cache.put(token, user, payload.get("exp"))
+    return user
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """获取当前用户"""
     credentials_exception = HTTPException(
@@ -70,15 +182,7 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        token = credentials.credentials
-        username = verify_token(token)
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
+    user = await user_for_token(db, credentials.credentials)
     if user is None:
         raise credentials_exception
     
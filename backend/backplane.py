@@ -0,0 +1,275 @@
+import os
+import uuid
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Set
+import msgpack
+from sharding import SHARD_INDEX
+from logger import get_logger
+
+logger = get_logger("backplane")
+
+# 设置后使用Redis发布/订阅在多个节点间广播（如 redis://localhost:6379/0），否则只在进程内投递
+BACKPLANE_URL = os.getenv("BACKPLANE_URL")
+CHANNEL_PREFIX = "poker:"
+
+# 本节点投递回调：房间消息 (room_id, text, kind, exclude_user, overrides)，个人消息 (user_id, text, kind, room_id) -> 是否在本节点
+DeliverRoom = Callable[[int, str, Optional[str], Optional[int], Optional[Dict[int, str]]], None]
+DeliverUser = Callable[[int, str, Optional[str], Optional[int]], bool]
+# 发往所有节点的消息 (kind, text)，如大厅索引的更新
+DeliverNode = Callable[[str, str], None]
+# 转给房间所属分片的命令 (kind, text)，由承载该房间牌局的节点执行
+DeliverShard = Callable[[str, str], None]
+
+class Backplane(ABC):
+    """房间广播和个人消息的投递后端
+
+    ConnectionManager只调用publish_*，由后端决定消息送到哪些节点；
+    各节点收到后通过attach注册的回调交给本地连接的发送队列。
+    """
+
+    # 消息是否送达其他节点（决定大厅索引能否收到其他分片的牌局事件）
+    spans_nodes = False
+
+    def __init__(self):
+        self._deliver_room: Optional[DeliverRoom] = None
+        self._deliver_user: Optional[DeliverUser] = None
+        self._deliver_node: Optional[DeliverNode] = None
+        self._deliver_shard: Optional[DeliverShard] = None
+
+    def attach(self, deliver_room: DeliverRoom, deliver_user: DeliverUser, deliver_node: Optional[DeliverNode] = None,
+               deliver_shard: Optional[DeliverShard] = None):
+        self._deliver_room = deliver_room
+        self._deliver_user = deliver_user
+        self._deliver_node = deliver_node
+        self._deliver_shard = deliver_shard
+
+    @abstractmethod
+    def publish_room(self, room_id: int, text: str, kind: Optional[str] = None,
+                     exclude_user: Optional[int] = None, overrides: Optional[Dict[int, str]] = None):
+        """向房间所有成员发送text；overrides中的成员改为收到各自的消息（如带本人手牌的增量）"""
+
+    @abstractmethod
+    def publish_user(self, user_id: int, text: str, kind: Optional[str] = None, room_id: Optional[int] = None):
+        """发给用户的连接（可能在其他节点）"""
+
+    @abstractmethod
+    def publish_nodes(self, kind: str, text: str):
+        """发给所有节点（包括本节点）"""
+
+    def publish_shard(self, shard: int, kind: str, text: str) -> bool:
+        """发给承载该分片的节点；无法送达其他节点时返回False"""
+        return False
+
+    # 本节点开始/不再有某房间的成员或某用户的连接时调用，用于订阅对应频道
+    def subscribe_room(self, room_id: int):
+        pass
+
+    def unsubscribe_room(self, room_id: int):
+        pass
+
+    def subscribe_user(self, user_id: int):
+        pass
+
+    def unsubscribe_user(self, user_id: int):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {"type": type(self).__name__}
+
+class InProcessBackplane(Backplane):
+    """单节点部署：直接投递给本进程的连接"""
+
+    def publish_room(self, room_id: int, text: str, kind: Optional[str] = None,
+                     exclude_user: Optional[int] = None, overrides: Optional[Dict[int, str]] = None):
+        self._deliver_room(room_id, text, kind, exclude_user, overrides)
+
+    def publish_user(self, user_id: int, text: str, kind: Optional[str] = None, room_id: Optional[int] = None):
+        self._deliver_user(user_id, text, kind, room_id)
+
+    def publish_nodes(self, kind: str, text: str):
+        if self._deliver_node:
+            self._deliver_node(kind, text)
+
+class RedisBackplane(Backplane):
+    """通过Redis发布/订阅在多个节点间广播
+
+    每个房间、每个用户一个频道，节点只订阅本地有成员的房间和本地连接的用户；
+    每个节点另外订阅自己的分片频道，接收其他节点转来的、修改本节点牌桌的命令。
+    发布时先直接投递给本节点的连接，再把同一事件循环轮次内的所有消息按频道合并，
+    用一次pipeline往返发出（同一频道内保持顺序）；收到自己发布的消息时跳过。
+    """
+
+    spans_nodes = True
+
+    def __init__(self, url: Optional[str] = BACKPLANE_URL, client=None):
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.redis = client
+        self.node_id = uuid.uuid4().hex[:12]
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._pending: Dict[str, List] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self._channels: Set[str] = set()
+        self.published = 0
+        self.publish_calls = 0
+        self.round_trips = 0
+        self.received = 0
+        self.errors = 0
+
+    def publish_room(self, room_id: int, text: str, kind: Optional[str] = None,
+                     exclude_user: Optional[int] = None, overrides: Optional[Dict[int, str]] = None):
+        self._deliver_room(room_id, text, kind, exclude_user, overrides)
+        self._queue(f"{CHANNEL_PREFIX}room:{room_id}", [kind, room_id, text, exclude_user, overrides])
+
+    def publish_user(self, user_id: int, text: str, kind: Optional[str] = None, room_id: Optional[int] = None):
+        # 用户连接在本节点时不再经过Redis
+        if not self._deliver_user(user_id, text, kind, room_id):
+            self._queue(f"{CHANNEL_PREFIX}user:{user_id}", [kind, room_id, text])
+
+    def publish_nodes(self, kind: str, text: str):
+        if self._deliver_node:
+            self._deliver_node(kind, text)
+        self._queue(f"{CHANNEL_PREFIX}nodes", [kind, text])
+
+    def publish_shard(self, shard: int, kind: str, text: str) -> bool:
+        self._queue(f"{CHANNEL_PREFIX}shard:{shard}", [kind, text])
+        return True
+
+    def _queue(self, channel: str, entry: List):
+        self._pending.setdefault(channel, []).append(entry)
+        self.published += 1
+        if self._flush_task is None:
+            # 本轮事件循环中后续发布的消息都会并入同一批
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            # 上一批发送期间积累的消息在下一次往返中发出
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                pipe = self.redis.pipeline(transaction=False)
+                for channel, entries in batch.items():
+                    pipe.publish(channel, msgpack.packb([self.node_id, entries], use_bin_type=True))
+                try:
+                    await pipe.execute()
+                except Exception as e:
+                    # 广播尽力而为：客户端按seq发现缺失后会重新请求完整状态
+                    self.errors += 1
+                    logger.error("发布 %s 个频道的消息失败: %s", len(batch), e)
+                    continue
+                self.publish_calls += len(batch)
+                self.round_trips += 1
+        finally:
+            self._flush_task = None
+
+    def _subscribe(self, channel: str):
+        if channel not in self._channels:
+            self._channels.add(channel)
+            asyncio.get_running_loop().create_task(self._change_subscription(self.pubsub.subscribe, channel))
+
+    def _unsubscribe(self, channel: str):
+        if channel in self._channels:
+            self._channels.discard(channel)
+            asyncio.get_running_loop().create_task(self._change_subscription(self.pubsub.unsubscribe, channel))
+
+    async def _change_subscription(self, method, channel: str):
+        try:
+            await method(channel)
+        except Exception as e:
+            self.errors += 1
+            logger.error("修改频道 %s 的订阅失败: %s", channel, e)
+
+    def subscribe_room(self, room_id: int):
+        self._subscribe(f"{CHANNEL_PREFIX}room:{room_id}")
+
+    def unsubscribe_room(self, room_id: int):
+        self._unsubscribe(f"{CHANNEL_PREFIX}room:{room_id}")
+
+    def subscribe_user(self, user_id: int):
+        self._subscribe(f"{CHANNEL_PREFIX}user:{user_id}")
+
+    def unsubscribe_user(self, user_id: int):
+        self._unsubscribe(f"{CHANNEL_PREFIX}user:{user_id}")
+
+    async def start(self):
+        # 先订阅全体节点频道和本节点的分片频道，保证监听开始时连接已建立
+        await self.pubsub.subscribe(f"{CHANNEL_PREFIX}nodes", f"{CHANNEL_PREFIX}shard:{SHARD_INDEX}")
+        self._listen_task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error("接收广播消息失败: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None:
+                self._dispatch(message["channel"], message["data"])
+
+    def _dispatch(self, channel: bytes, data: bytes):
+        node_id, entries = msgpack.unpackb(data, raw=False, strict_map_key=False)
+        if node_id == self.node_id:
+            return
+        self.received += len(entries)
+        channel = channel.decode() if isinstance(channel, bytes) else channel
+        if channel == f"{CHANNEL_PREFIX}nodes":
+            if self._deliver_node:
+                for kind, text in entries:
+                    self._deliver_node(kind, text)
+        elif channel.startswith(f"{CHANNEL_PREFIX}shard:"):
+            if self._deliver_shard:
+                for kind, text in entries:
+                    self._deliver_shard(kind, text)
+        elif channel.startswith(f"{CHANNEL_PREFIX}room:"):
+            for kind, room_id, text, exclude_user, overrides in entries:
+                self._deliver_room(room_id, text, kind, exclude_user, overrides)
+        else:
+            user_id = int(channel.rsplit(":", 1)[1])
+            for kind, room_id, text in entries:
+                self._deliver_user(user_id, text, kind, room_id)
+
+    async def stop(self):
+        if self._flush_task:
+            await self._flush_task
+        if self._listen_task:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+            self._listen_task = None
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "type": type(self).__name__,
+            "node_id": self.node_id,
+            "channels": len(self._channels),
+            "published": self.published,
+            "publish_calls": self.publish_calls,
+            "round_trips": self.round_trips,
+            "received": self.received,
+            "errors": self.errors
+        }
+
+def create_backplane() -> Backplane:
+    """按BACKPLANE_URL选择广播后端"""
+    if BACKPLANE_URL:
+        logger.info("使用Redis广播后端: %s", BACKPLANE_URL)
+        return RedisBackplane(BACKPLANE_URL)
+    return InProcessBackplane()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+房间广播延迟基准：9名玩家、9名玩家+100名旁观连接
+
+用模拟WebSocket（每次发送固定网络耗时）测量 broadcast_to_room 和
+broadcast_game_state 从入队到所有连接发送完成的耗时，并与逐个await发送的旧方式对比；
+最后一组测量一个卡住的慢连接对房间内其他连接的影响。
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+from logger import set_level
+from websocket_handler import ConnectionManager
+
+SEND_LATENCY = 0.0005  # 模拟每次发送的网络耗时（秒）
+ROUNDS = 50
+
+class FakeWebSocket:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.bytes_sent = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+    async def send_text(self, text: str):
+        self.bytes_sent += len(text)
+        await asyncio.sleep(self.latency)
+
+async def build_room(connections: int, players: int, stalled: int = 0) -> ConnectionManager:
+    manager = ConnectionManager()
+    room_id = 1
+    game = manager.game_manager.create_game(room_id, 10, 20)
+    manager.room_connections[room_id] = []
+    for user_id in range(1, connections + 1):
+        # 前stalled个连接模拟卡住的客户端
+        await manager.connect(FakeWebSocket(3600 if user_id <= stalled else SEND_LATENCY), user_id)
+        manager.room_connections[room_id].append(user_id)
+        if user_id <= players:
+            game.add_player(user_id, f"player{user_id}", 1000, user_id - 1)
+    game.start_game()
+    return manager
+
+async def sequential_broadcast(manager: ConnectionManager, message: dict, room_id: int):
+    """旧方式：每个连接各自序列化并依次await"""
+    for user_id in manager.room_connections[room_id]:
+        await manager.active_connections[user_id].websocket.send_text(json.dumps(message))
+
+async def drained(manager: ConnectionManager, skip: int = 0):
+    """等待除前skip个连接外的发送队列全部发完"""
+    while any(connection.pending for user_id, connection in manager.active_connections.items() if user_id > skip):
+        await asyncio.sleep(0)
+
+async def measure(label: str, func, manager: ConnectionManager = None, skip: int = 0) -> None:
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await func()
+        if manager:
+            await drained(manager, skip)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<42} p50={statistics.median(samples):7.2f}ms  p99={samples[int(len(samples) * 0.99) - 1]:7.2f}ms")
+
+async def run_case(connections: int, players: int, stalled: int = 0):
+    print(f"--- {players} 名玩家, 共 {connections} 个连接, {stalled} 个卡住 ---")
+    manager = await build_room(connections, players, stalled)
+    game = manager.game_manager.get_game(1)
+    message = {"type": "game_state", "data": game.get_game_state()}
+
+    async def game_state_round():
+        # 每轮让当前玩家行动一次，保证有增量可发
+        current = game.players[game.current_player_index]
+        game.player_action(current.user_id, "call" if game.current_bet > current.current_bet else "check")
+        if game.game_stage == "finished":
+            game._reset_all_players_ready_status()
+            game.start_game()
+        await manager.broadcast_game_state(1)
+
+    if not stalled:
+        await measure("sequential (旧: 逐个序列化+await)", lambda: sequential_broadcast(manager, message, 1))
+    await measure("broadcast_to_room (序列化一次+写队列)", lambda: manager.broadcast_to_room(message, 1), manager, stalled)
+    await measure("broadcast_game_state (增量)", game_state_round, manager, stalled)
+    metrics = manager.get_metrics()
+    print(f"{'metrics':<42} queue_depth_max={metrics['queue_depth_max']}  coalesced={metrics['messages_coalesced']}")
+    for connection in manager.active_connections.values():
+        connection.close()
+
+async def main():
+    # 屏蔽连接/断开日志
+    set_level("WARNING")
+    await run_case(connections=9, players=9)
+    await run_case(connections=109, players=9)
+    await run_case(connections=109, players=9, stalled=1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
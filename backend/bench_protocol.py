@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket消息编码基准：JSON文本帧 vs msgpack二进制帧（protocol.py）
+
+用模拟WebSocket记录一手9人牌局（开局到摊牌，所有人跟注/过牌）中9个玩家连接收到的全部消息，
+比较两种编码的线上字节数，以及服务器编码、客户端解码一手牌全部消息的CPU耗时。
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+import protocol
+from logger import set_level
+from websocket_handler import ConnectionManager
+
+PLAYERS = 9
+ROUNDS = 200
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+async def record_hand() -> list:
+    """一手9人牌局中所有玩家连接收到的消息（JSON文本）"""
+    manager = ConnectionManager()
+    room_id = 1
+    game = manager.game_manager.create_game(room_id, 10, 20)
+    manager.room_connections[room_id] = []
+    sockets = [FakeWebSocket() for _ in range(PLAYERS)]
+    for user_id, websocket in enumerate(sockets, 1):
+        await manager.connect(websocket, user_id)
+        manager.room_connections[room_id].append(user_id)
+        game.add_player(user_id, f"player{user_id}", 1000, user_id - 1)
+    await manager.start_game(1, room_id)
+    while game.game_stage not in ("waiting", "finished"):
+        current = game.players[game.current_player_index]
+        action = "call" if game.current_bet > current.current_bet else "check"
+        await manager.handle_game_action(current.user_id, room_id, action, 0)
+    await asyncio.sleep(0.1)
+    for connection in manager.active_connections.values():
+        connection.close()
+    return [text for websocket in sockets for text in websocket.sent]
+
+def measure(label: str, func) -> float:
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(samples)
+    print(f"{label:<36} p50={median:7.3f}ms")
+    return median
+
+async def main():
+    set_level("WARNING")
+    texts = await record_hand()
+    messages = [json.loads(text) for text in texts]
+    frames = [protocol.encode(message) for message in messages]
+    # 编解码结果与JSON路径一致
+    assert [protocol.decode(frame) for frame in frames] == messages
+
+    kinds = {}
+    for message in messages:
+        kinds[message["type"]] = kinds.get(message["type"], 0) + 1
+    print(f"--- 一手{PLAYERS}人牌局: {len(messages)} 条消息 {kinds} ---")
+
+    json_bytes = sum(len(text.encode()) for text in texts)
+    binary_bytes = sum(len(frame) for frame in frames)
+    print(f"{'bytes json':<36} {json_bytes:>9}")
+    print(f"{'bytes msgpack':<36} {binary_bytes:>9}  ({binary_bytes / json_bytes:.0%})")
+
+    json_encode = measure("encode json (json.dumps)", lambda: [json.dumps(message) for message in messages])
+    binary_encode = measure("encode msgpack (protocol.encode)", lambda: [protocol.encode(message) for message in messages])
+    # 服务器实际路径：广播文本已按JSON序列化，二进制连接发送前转换（不计缓存命中）
+    convert = measure("json文本转二进制 (text_to_binary)",
+                      lambda: [protocol.encode(json.loads(text)) for text in texts])
+    json_decode = measure("decode json (json.loads)", lambda: [json.loads(text) for text in texts])
+    binary_decode = measure("decode msgpack (protocol.decode)", lambda: [protocol.decode(frame) for frame in frames])
+    print(f"{'msgpack/json':<36} encode={binary_encode / json_encode:.2f}x  decode={binary_decode / json_decode:.2f}x"
+          f"  转换={convert / json_encode:.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+from fastapi import WebSocket
+from protocol import text_to_binary
+
+# 单次发送超时（秒）
+SEND_TIMEOUT = 2.0
+# 发送队列上限，满了直接断开
+MAX_QUEUE_SIZE = 256
+# 高水位：队列持续高于该值超过宽限时间的连接视为慢消费者并断开
+HIGH_WATER_MARK = 64
+HIGH_WATER_GRACE = 5.0
+
+class OutboundConnection:
+    """一个WebSocket连接的有界发送队列和独立写任务
+
+    广播方只负责入队，不等待网络发送，慢连接不会阻塞房间内的其他连接。
+    队列中始终是JSON文本，二进制连接在发送时才转换，被合并丢弃的消息不做转换。
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int,
+                 on_evict: Optional[Callable[["OutboundConnection", str], None]] = None,
+                 max_queue: int = MAX_QUEUE_SIZE, high_water: int = HIGH_WATER_MARK,
+                 binary: bool = False):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.binary = binary
+        self.on_evict = on_evict
+        self.max_queue = max_queue
+        self.high_water = high_water
+        # 队列元素：(消息类型, 房间ID, 已序列化文本)
+        self.queue: Deque[Tuple[Optional[str], Optional[int], str]] = deque()
+        self.closed = False
+        self.sending = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._over_high_water_since: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    @property
+    def pending(self) -> int:
+        """尚未发送完成的消息数（含正在发送的一条）"""
+        return len(self.queue) + (1 if self.sending else 0)
+
+    def enqueue(self, text: str, kind: Optional[str] = None, room_id: Optional[int] = None) -> bool:
+        """消息入队，返回是否成功"""
+        if self.closed:
+            return False
+
+        if kind == "game_state":
+            # 完整快照取代之前同房间未发出的快照和增量
+            self._discard(room_id, ("game_state", "game_state_patch"))
+        elif kind == "game_state_patch" and len(self.queue) >= self.high_water:
+            # 积压时丢弃同房间未发出的增量，客户端发现seq不连续后会请求完整快照
+            self._discard(room_id, ("game_state_patch",))
+        elif kind == "spectator_state":
+            # 观战帧是完整状态，只需发送最新的一帧
+            self._discard(room_id, ("spectator_state",))
+
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            self.evict("发送队列已满")
+            return False
+
+        self.queue.append((kind, room_id, text))
+        self._wakeup.set()
+
+        if len(self.queue) > self.high_water:
+            now = time.monotonic()
+            if self._over_high_water_since is None:
+                self._over_high_water_since = now
+            elif now - self._over_high_water_since > HIGH_WATER_GRACE:
+                self.evict("持续超过高水位")
+                return False
+        else:
+            self._over_high_water_since = None
+        return True
+
+    def _discard(self, room_id: Optional[int], kinds: Tuple[str, ...]):
+        """移除队列中同房间的指定类型消息"""
+        kept = deque(item for item in self.queue if not (item[0] in kinds and item[1] == room_id))
+        removed = len(self.queue) - len(kept)
+        if removed:
+            self.coalesced += removed
+            self.queue = kept
+
+    async def _writer(self):
+        """写任务：按顺序发送队列中的消息"""
+        while not self.closed:
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            _, _, text = self.queue.popleft()
+            self.sending = True
+            try:
+                if self.binary:
+                    await asyncio.wait_for(self.websocket.send_bytes(text_to_binary(text)), SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(text), SEND_TIMEOUT)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.evict("发送失败或超时")
+                return
+            finally:
+                self.sending = False
+
+    def evict(self, reason: str):
+        """断开慢消费者"""
+        if self.closed:
+            return
+        self.dropped += len(self.queue)
+        self.close()
+        asyncio.create_task(self._close_socket())
+        if self.on_evict:
+            self.on_evict(self, reason)
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=1013, reason="Slow consumer")
+        except Exception:
+            pass
+
+    def close(self):
+        """停止写任务并清空队列"""
+        self.closed = True
+        self.queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "binary": self.binary,
+            "queue_depth": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator
 import os
 from dotenv import load_dotenv
 
@@ -8,27 +10,40 @@ load_dotenv()
 
 # 数据库配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./poker_game.db")
+SQL_ECHO = os.getenv("SQL_ECHO", "true").lower() == "true"  # 开发环境显示SQL语句
 
-# 创建数据库引擎
+def _async_url(url: str) -> str:
+    """把同步驱动的连接串换成对应的异步驱动"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+# 创建数据库引擎（同步引擎供建表和脚本使用）
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
-        DATABASE_URL, 
+        DATABASE_URL,
         connect_args={"check_same_thread": False},
-        echo=True  # 开发环境显示SQL语句
+        echo=SQL_ECHO
     )
 else:
-    engine = create_engine(DATABASE_URL, echo=True)
+    engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
+
+# 异步引擎供API请求使用，查询不阻塞事件循环（WebSocket广播也跑在同一个循环上）
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=SQL_ECHO)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 提交后不过期对象，避免访问属性时触发隐式的同步加载
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # 创建基类
 Base = declarative_base()
 
 # 依赖注入：获取数据库会话
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+WebSocket入站消息分发：按消息类型注册数据模式和处理函数
+
+所有注册的类型组成一个以type区分的联合模式，由pydantic-core编译成一个校验器：
+- JSON文本帧直接从原始文本解析并校验，不先生成中间dict；
+- 二进制帧经protocol.decode解码后校验。
+校验失败的消息回复error后丢弃，不会进入房间actor和PokerGame。新增消息类型只需定义data模型并注册处理函数。
+每种类型分别统计处理次数、拒绝次数、处理失败次数和处理耗时分位数。
+"""
+
+import time
+from collections import deque
+from typing import Annotated, Any, Awaitable, Callable, Deque, Dict, List, Literal, Optional, Type, Union
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+import protocol
+from schemas import EmptyData
+
+Handler = Callable[[Any, BaseModel], Awaitable[None]]
+
+# 错误回复中最多列出的校验错误数
+MAX_REPORTED_ERRORS = 5
+
+class InvalidMessage(ValueError):
+    """入站消息无法解码或不符合注册的模式"""
+
+    def __init__(self, message_type: Optional[str], errors: List[Dict]):
+        super().__init__(f"无效的消息: {message_type}")
+        self.message_type = message_type
+        self.errors = errors
+
+class Route:
+    """一种消息类型的模式、处理函数和统计"""
+
+    def __init__(self, message_type: str, schema: Type[BaseModel], handler: Handler):
+        self.message_type = message_type
+        self.schema = schema
+        self.handler = handler
+        self.handled = 0
+        self.rejected = 0
+        self.failed = 0
+        # 最近的处理耗时（秒），用于计算分位数
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        return {
+            "handled": self.handled,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": percentile(1.0)
+        }
+
+class MessageDispatcher:
+    """按type把入站消息校验后交给注册的处理函数"""
+
+    def __init__(self):
+        self.routes: Dict[str, Route] = {}
+        # 类型未注册或帧本身无法解码的消息数
+        self.rejected_unknown = 0
+        self._adapter: Optional[TypeAdapter] = None
+
+    def handler(self, message_type: str, schema: Type[BaseModel] = EmptyData):
+        """注册处理函数的装饰器：handler(session, data)，data为schema的实例"""
+        def register(func: Handler) -> Handler:
+            self.routes[message_type] = Route(message_type, schema, func)
+            # 下次解码时重新编译联合模式
+            self._adapter = None
+            return func
+        return register
+
+    def _compile(self) -> TypeAdapter:
+        envelopes = tuple(
+            create_model(
+                f"{route.message_type}_message",
+                type=(Literal[route.message_type], ...),
+                data=(route.schema, Field(default_factory=route.schema))
+            )
+            for route in self.routes.values()
+        )
+        if len(envelopes) == 1:
+            return TypeAdapter(envelopes[0])
+        return TypeAdapter(Annotated[Union[envelopes], Field(discriminator="type")])
+
+    def decode(self, payload: Union[str, bytes]) -> BaseModel:
+        """解码并校验一帧消息，返回带type和data的消息模型"""
+        if self._adapter is None:
+            self._adapter = self._compile()
+        try:
+            if isinstance(payload, bytes):
+                return self._adapter.validate_python(protocol.decode(payload))
+            return self._adapter.validate_json(payload)
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_input=False, include_context=False)
+            loc = errors[0]["loc"] if errors else ()
+            message_type = loc[0] if loc and loc[0] in self.routes else None
+            raise InvalidMessage(message_type, [
+                {"loc": list(error["loc"]), "msg": error["msg"]} for error in errors[:MAX_REPORTED_ERRORS]
+            ]) from None
+        except ValueError as e:
+            raise InvalidMessage(None, [{"loc": [], "msg": str(e) or type(e).__name__}]) from None
+
+    async def dispatch(self, session: Any, payload: Union[str, bytes]):
+        """校验一帧消息并执行对应的处理函数；无效消息抛出InvalidMessage，处理函数的异常原样抛出"""
+        try:
+            message = self.decode(payload)
+        except InvalidMessage as e:
+            if e.message_type is None:
+                self.rejected_unknown += 1
+            else:
+                self.routes[e.message_type].rejected += 1
+            raise
+        route = self.routes[message.type]
+        start = time.perf_counter()
+        try:
+            await route.handler(session, message.data)
+        except Exception:
+            route.failed += 1
+            raise
+        finally:
+            route._latencies.append(time.perf_counter() - start)
+        route.handled += 1
+
+    def stats(self) -> Dict:
+        return {
+            "rejected_unknown": self.rejected_unknown,
+            "types": {message_type: route.stats() for message_type, route in self.routes.items()}
+        }
@@ -0,0 +1,93 @@
+import time
+from math import comb
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+from game_logic import Deck, HandEvaluator
+
+# 剩余发牌组合数不超过该值时穷举计算，否则蒙特卡洛抽样
+EXACT_RUNOUT_LIMIT = 50_000
+# 蒙特卡洛每批抽样数，控制单批内存占用
+SAMPLE_CHUNK_SIZE = 20_000
+
+def calculate_equity(
+    hole_cards: Dict[int, List[int]],
+    community_cards: List[int],
+    deck: Union[Deck, Sequence[int]],
+    samples: int = 100_000,
+    time_budget: float = 2.0,
+    seed: Optional[int] = None,
+) -> Dict:
+    """计算每位玩家的胜/平/负概率
+
+    hole_cards: {user_id: [两张整数牌]}，community_cards为已发公共牌，
+    deck为剩余牌堆（Deck或整数牌列表）。剩余发牌组合较少时穷举，
+    否则按批向量化抽样，累计耗时超过time_budget后提前停止。
+    """
+    user_ids = list(hole_cards)
+    if not user_ids:
+        return {"exact": True, "samples": 0, "players": {}}
+
+    remaining = np.array(deck.cards if isinstance(deck, Deck) else list(deck), dtype=np.intp)
+    board = np.array(community_cards, dtype=np.intp)
+    holes = np.array([hole_cards[user_id] for user_id in user_ids], dtype=np.intp)
+    need = 5 - len(board)
+
+    wins = np.zeros(len(user_ids), dtype=np.int64)
+    ties = np.zeros(len(user_ids), dtype=np.int64)
+    shares = np.zeros(len(user_ids), dtype=np.float64)
+
+    total_runouts = comb(len(remaining), need)
+    exact = total_runouts <= EXACT_RUNOUT_LIMIT
+    evaluated = 0
+
+    if exact:
+        if need > 0:
+            runouts = np.array(list(combinations(remaining.tolist(), need)), dtype=np.intp)
+        else:
+            runouts = np.empty((1, 0), dtype=np.intp)
+        for start in range(0, len(runouts), SAMPLE_CHUNK_SIZE):
+            evaluated += _accumulate(holes, board, runouts[start:start + SAMPLE_CHUNK_SIZE], wins, ties, shares)
+    else:
+        rng = np.random.default_rng(seed)
+        deadline = time.perf_counter() + time_budget
+        while evaluated < samples:
+            chunk = min(SAMPLE_CHUNK_SIZE, samples - evaluated)
+            # 每行独立随机排列后取前need张，即无放回抽样
+            picks = rng.random((chunk, len(remaining))).argpartition(need, axis=1)[:, :need]
+            evaluated += _accumulate(holes, board, remaining[picks], wins, ties, shares)
+            if time.perf_counter() >= deadline:
+                break
+
+    players = {}
+    for i, user_id in enumerate(user_ids):
+        win = wins[i] / evaluated
+        tie = ties[i] / evaluated
+        players[user_id] = {
+            "win": round(float(win), 4),
+            "tie": round(float(tie), 4),
+            "lose": round(float(1 - win - tie), 4),
+            "equity": round(float(shares[i] / evaluated), 4),
+        }
+
+    return {"exact": exact, "samples": evaluated, "players": players}
+
+def _accumulate(holes: np.ndarray, board: np.ndarray, runouts: np.ndarray,
+                wins: np.ndarray, ties: np.ndarray, shares: np.ndarray) -> int:
+    """评估一批发牌结果，累加到胜/平/份额计数中，返回本批数量"""
+    count = len(runouts)
+    boards = np.concatenate([np.broadcast_to(board, (count, len(board))), runouts], axis=1)
+
+    # (玩家数, 批量) 的强度矩阵，所有玩家一次性评估
+    hands = np.concatenate([
+        np.broadcast_to(holes[:, None, :], (len(holes), count, 2)),
+        np.broadcast_to(boards[None, :, :], (len(holes), count, 5)),
+    ], axis=2).reshape(-1, 7)
+    strengths = HandEvaluator.evaluate_array(hands).reshape(len(holes), count)
+
+    best = strengths == strengths.max(axis=0)
+    winners = best.sum(axis=0)
+    wins += (best & (winners == 1)).sum(axis=1)
+    ties += (best & (winners > 1)).sum(axis=1)
+    shares += (best / winners).sum(axis=1)
+    return count
@@ -1,8 +1,16 @@
 import random
-from typing import List, Dict, Optional, Tuple
+import time
+import functools
+from typing import List, Dict, Optional, Tuple, Callable
 from enum import Enum
 from dataclasses import dataclass
-import itertools
+import logging
+import numpy as np
+from pot_ledger import PotLedger
+from rng import TableRng
+from logger import get_logger
+
+logger = get_logger("game_logic")
 
 class Suit(Enum):
     HEARTS = "♥"
@@ -37,43 +45,68 @@ class HandRank(Enum):
     STRAIGHT_FLUSH = 9
     ROYAL_FLUSH = 10
 
+# 整数牌编码：card_id = (点数 - 2) * 4 + 花色序号，取值0~51
+# 牌局内部（牌堆、手牌、公共牌、评估器）只使用整数，序列化时再转换为字典
+_SUITS = list(Suit)
+_RANK_NAMES = {11: 'J', 12: 'Q', 13: 'K', 14: 'A'}
+_FULL_DECK = tuple(range(52))
+_CARD_STRS = tuple(
+    f"{_RANK_NAMES.get(card_id // 4 + 2, str(card_id // 4 + 2))}{_SUITS[card_id % 4].value}"
+    for card_id in _FULL_DECK
+)
+_CARD_DICTS = tuple(
+    {'suit': _SUITS[card_id % 4].value, 'rank': card_id // 4 + 2, 'display': _CARD_STRS[card_id]}
+    for card_id in _FULL_DECK
+)
+
+def card_to_str(card_id: int) -> str:
+    """整数牌转换为显示字符串，如 A♠"""
+    return _CARD_STRS[card_id]
+
+def card_to_dict(card_id: int) -> Dict:
+    """整数牌转换为前端使用的字典"""
+    return dict(_CARD_DICTS[card_id])
+
 @dataclass
 class Card:
     suit: Suit
     rank: Rank
     
+    @classmethod
+    def from_id(cls, card_id: int) -> "Card":
+        """由整数牌构造"""
+        return cls(_SUITS[card_id % 4], Rank(card_id // 4 + 2))
+    
+    @property
+    def id(self) -> int:
+        """整数牌编码"""
+        return (self.rank.value - 2) * 4 + _SUITS.index(self.suit)
+    
     def __str__(self):
-        rank_str = {
-            11: 'J', 12: 'Q', 13: 'K', 14: 'A'
-        }.get(self.rank.value, str(self.rank.value))
-        return f"{rank_str}{self.suit.value}"
+        return card_to_str(self.id)
     
     def to_dict(self):
-        return {
-            'suit': self.suit.value,
-            'rank': self.rank.value,
-            'display': str(self)
-        }
+        return card_to_dict(self.id)
 
 class Deck:
     def __init__(self):
-        self.cards = []
+        self.cards: List[int] = []
         self.reset()
     
     def reset(self):
         """重置并洗牌"""
-        self.cards = [Card(suit, rank) for suit in Suit for rank in Rank]
+        self.cards = list(_FULL_DECK)
         self.shuffle()
     
     def shuffle(self):
         """洗牌"""
         random.shuffle(self.cards)
     
-    def deal_card(self) -> Optional[Card]:
+    def deal_card(self) -> Optional[int]:
         """发一张牌"""
         return self.cards.pop() if self.cards else None
     
-    def deal_cards(self, count: int) -> List[Card]:
+    def deal_cards(self, count: int) -> List[int]:
         """发多张牌"""
         return [self.deal_card() for _ in range(count) if self.cards]
 
@@ -83,7 +116,7 @@ class Player:
         self.username = username
         self.chips = chips
         self.position = position
-        self.hole_cards: List[Card] = []
+        self.hole_cards: List[int] = []
         self.current_bet = 0
         self.total_bet = 0
         self.is_folded = False
@@ -94,7 +127,7 @@ class Player:
     
     def bet(self, amount: int) -> int:
         """下注"""
-        actual_bet = min(amount, self.chips)
+        actual_bet = max(0, min(amount, self.chips))
         self.chips -= actual_bet
         self.current_bet += actual_bet
         self.total_bet += actual_bet
@@ -126,144 +159,417 @@ class Player:
             'is_all_in': self.is_all_in,
             'is_active': self.is_active,
             'is_ready': self.is_ready,
-            'hole_cards': [card.to_dict() for card in self.hole_cards] if show_hole_cards else []
+            'hole_cards': [card_to_dict(card) for card in self.hole_cards] if show_hole_cards else []
         }
 
+# 查表评估器：每种牌型编码为一个整数强度，数值越大牌越强
+# 强度 = 牌型 << 20 | 最多5个比较点数（每个4位）
+_CATEGORY_SHIFT = 20
+_RANK_PRIMES = {2: 2, 3: 3, 4: 5, 5: 7, 6: 11, 7: 13, 8: 17, 9: 19, 10: 23, 11: 29, 12: 31, 13: 37, 14: 41}
+# 按整数牌预先展开的质数和点数位
+_CARD_PRIMES = tuple(_RANK_PRIMES[card_id // 4 + 2] for card_id in _FULL_DECK)
+_CARD_BITS = tuple(1 << (card_id // 4) for card_id in _FULL_DECK)
+_WHEEL_MASK = (1 << 12) | 0b1111  # A-2-3-4-5
+_STRAIGHT_CATEGORIES = {HandRank.STRAIGHT.value, HandRank.STRAIGHT_FLUSH.value, HandRank.ROYAL_FLUSH.value}
+# 各牌型参与比较的点数个数（与旧版评估器返回的values长度一致）
+_VALUE_COUNTS = {
+    HandRank.HIGH_CARD.value: 5,
+    HandRank.PAIR.value: 4,
+    HandRank.TWO_PAIR.value: 3,
+    HandRank.THREE_OF_A_KIND.value: 3,
+    HandRank.FLUSH.value: 5,
+    HandRank.FULL_HOUSE.value: 2,
+    HandRank.FOUR_OF_A_KIND.value: 2,
+}
+
+def _pack_strength(hand_rank: HandRank, values: List[int]) -> int:
+    """将牌型和比较点数打包为整数强度"""
+    strength = hand_rank.value << _CATEGORY_SHIFT
+    for i, value in enumerate(values):
+        strength |= value << (16 - 4 * i)
+    return strength
+
+def _straight_high(rank_mask: int) -> int:
+    """返回点数掩码中最大顺子的最高牌，没有顺子返回0（A-2-3-4-5记为5）"""
+    for high in range(14, 5, -1):
+        straight = 0b11111 << (high - 6)
+        if rank_mask & straight == straight:
+            return high
+    if rank_mask & _WHEEL_MASK == _WHEEL_MASK:
+        return 5
+    return 0
+
+def _top_ranks(rank_mask: int, count: int) -> List[int]:
+    """从点数掩码中取出最大的count个点数"""
+    ranks = []
+    for rank in range(14, 1, -1):
+        if rank_mask & (1 << (rank - 2)):
+            ranks.append(rank)
+            if len(ranks) == count:
+                break
+    return ranks
+
+def _build_flush_table() -> List[int]:
+    """同花表：13位点数掩码 -> 该花色下最强5张牌的强度"""
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count("1") < 5:
+            continue
+        high = _straight_high(mask)
+        if high == 14:
+            table[mask] = _pack_strength(HandRank.ROYAL_FLUSH, [high])
+        elif high:
+            table[mask] = _pack_strength(HandRank.STRAIGHT_FLUSH, [high])
+        else:
+            table[mask] = _pack_strength(HandRank.FLUSH, _top_ranks(mask, 5))
+    return table
+
+def _best_rank_strength(counts: Dict[int, int]) -> int:
+    """不考虑同花时，按点数分布计算最强5张牌的强度"""
+    ranks_desc = sorted(counts, reverse=True)
+    trips = [r for r in ranks_desc if counts[r] >= 3]
+    pairs = [r for r in ranks_desc if counts[r] >= 2]
+    
+    quads = [r for r in ranks_desc if counts[r] >= 4]
+    if quads:
+        kicker = next(r for r in ranks_desc if r != quads[0])
+        return _pack_strength(HandRank.FOUR_OF_A_KIND, [quads[0], kicker])
+    
+    if trips and len(pairs) >= 2:
+        pair = next(r for r in pairs if r != trips[0])
+        return _pack_strength(HandRank.FULL_HOUSE, [trips[0], pair])
+    
+    rank_mask = 0
+    for rank in ranks_desc:
+        rank_mask |= 1 << (rank - 2)
+    high = _straight_high(rank_mask)
+    if high:
+        return _pack_strength(HandRank.STRAIGHT, [high])
+    
+    if trips:
+        kickers = [r for r in ranks_desc if r != trips[0]][:2]
+        return _pack_strength(HandRank.THREE_OF_A_KIND, [trips[0]] + kickers)
+    
+    if len(pairs) >= 2:
+        kicker = next(r for r in ranks_desc if r not in pairs[:2])
+        return _pack_strength(HandRank.TWO_PAIR, pairs[:2] + [kicker])
+    
+    if pairs:
+        kickers = [r for r in ranks_desc if r != pairs[0]][:3]
+        return _pack_strength(HandRank.PAIR, [pairs[0]] + kickers)
+    
+    return _pack_strength(HandRank.HIGH_CARD, ranks_desc[:5])
+
+def _build_rank_table() -> Dict[int, int]:
+    """点数表：5/6/7张牌点数的质数乘积 -> 非同花最强5张牌的强度"""
+    table = {}
+    ranks = list(range(2, 15))
+    counts: Dict[int, int] = {}
+    
+    def visit(index: int, total: int, product: int):
+        if total >= 5 and product not in table:
+            table[product] = _best_rank_strength(counts)
+        if total == 7 or index == len(ranks):
+            return
+        rank = ranks[index]
+        # 当前点数不取
+        visit(index + 1, total, product)
+        # 当前点数取1~4张
+        for count in range(1, min(4, 7 - total) + 1):
+            counts[rank] = count
+            visit(index + 1, total + count, product * _RANK_PRIMES[rank] ** count)
+        counts.pop(rank, None)
+    
+    visit(0, 0, 1)
+    return table
+
+_FLUSH_TABLE = _build_flush_table()
+_RANK_TABLE = _build_rank_table()
+_HAND_RANKS = {hand_rank.value: hand_rank for hand_rank in HandRank}
+
+# 向量化评估使用的NumPy表；下标52为填充牌（质数1、无点数位、无花色）
+PAD_CARD = 52
+_FLUSH_TABLE_NP = np.array(_FLUSH_TABLE, dtype=np.int32)
+_RANK_KEYS_NP = np.array(sorted(_RANK_TABLE), dtype=np.int64)
+_RANK_VALUES_NP = np.array([_RANK_TABLE[key] for key in _RANK_KEYS_NP.tolist()], dtype=np.int32)
+_CARD_PRIMES_NP = np.array(_CARD_PRIMES + (1,), dtype=np.int64)
+# 每张牌在52位掩码中的位置：花色 * 13 + 点数序号
+_CARD_SUIT_BITS_NP = np.array([_CARD_BITS[card_id] << (13 * (card_id & 3)) for card_id in _FULL_DECK] + [0], dtype=np.int64)
+_DECODED_STRENGTHS: Dict[int, Tuple[HandRank, Tuple[int, ...]]] = {}
+
 class HandEvaluator:
     @staticmethod
-    def evaluate_hand(cards: List[Card]) -> Tuple[HandRank, List[int]]:
+    def evaluate_hand(cards: List[int]) -> Tuple[HandRank, List[int]]:
         """评估手牌强度"""
         if len(cards) < 5:
             return HandRank.HIGH_CARD, []
         
-        # 获取所有可能的5张牌组合
-        best_hand = None
-        best_rank = HandRank.HIGH_CARD
-        best_values = []
-        
-        for combo in itertools.combinations(cards, 5):
-            rank, values = HandEvaluator._evaluate_five_cards(list(combo))
-            if rank.value > best_rank.value or (rank == best_rank and values > best_values):
-                best_hand = combo
-                best_rank = rank
-                best_values = values
-        
-        return best_rank, best_values
+        return HandEvaluator.decode_strength(HandEvaluator.evaluate_strength(cards))
     
     @staticmethod
-    def _evaluate_five_cards(cards: List[Card]) -> Tuple[HandRank, List[int]]:
-        """评估5张牌的组合"""
-        ranks = sorted([card.rank.value for card in cards], reverse=True)
-        suits = [card.suit for card in cards]
-        
-        # 检查是否为同花
-        is_flush = len(set(suits)) == 1
-        
-        # 检查是否为顺子
-        is_straight = HandEvaluator._is_straight(ranks)
-        
-        # 统计每个点数的出现次数
-        rank_counts = {}
-        for rank in ranks:
-            rank_counts[rank] = rank_counts.get(rank, 0) + 1
-        
-        counts = sorted(rank_counts.values(), reverse=True)
-        unique_ranks = sorted(rank_counts.keys(), key=lambda x: (rank_counts[x], x), reverse=True)
-        
-        # 判断牌型
-        if is_straight and is_flush:
-            if ranks == [14, 13, 12, 11, 10]:  # 皇家同花顺
-                return HandRank.ROYAL_FLUSH, ranks
-            else:  # 同花顺
-                return HandRank.STRAIGHT_FLUSH, ranks
-        elif counts == [4, 1]:  # 四条
-            return HandRank.FOUR_OF_A_KIND, unique_ranks
-        elif counts == [3, 2]:  # 葫芦
-            return HandRank.FULL_HOUSE, unique_ranks
-        elif is_flush:  # 同花
-            return HandRank.FLUSH, ranks
-        elif is_straight:  # 顺子
-            return HandRank.STRAIGHT, ranks
-        elif counts == [3, 1, 1]:  # 三条
-            return HandRank.THREE_OF_A_KIND, unique_ranks
-        elif counts == [2, 2, 1]:  # 两对
-            return HandRank.TWO_PAIR, unique_ranks
-        elif counts == [2, 1, 1, 1]:  # 一对
-            return HandRank.PAIR, unique_ranks
-        else:  # 高牌
-            return HandRank.HIGH_CARD, ranks
+    def evaluate_strength(cards: List[int]) -> int:
+        """查表计算5~7张牌的整数强度，可直接比较大小；不足5张返回0"""
+        if len(cards) < 5:
+            return 0
+        if isinstance(cards[0], Card):
+            cards = [card.id for card in cards]
+        
+        product = 1
+        suit_masks = [0, 0, 0, 0]
+        for card in cards:
+            product *= _CARD_PRIMES[card]
+            suit_masks[card & 3] |= _CARD_BITS[card]
+        
+        strength = _RANK_TABLE[product]
+        for mask in suit_masks:
+            flush_strength = _FLUSH_TABLE[mask]
+            if flush_strength > strength:
+                strength = flush_strength
+        return strength
     
     @staticmethod
-    def _is_straight(ranks: List[int]) -> bool:
-        """检查是否为顺子"""
-        ranks = sorted(set(ranks))
-        if len(ranks) != 5:
-            return False
-        
-        # 普通顺子
-        if ranks[-1] - ranks[0] == 4:
-            return True
-        
-        # A-2-3-4-5 顺子
-        if ranks == [2, 3, 4, 5, 14]:
-            return True
-        
-        return False
+    def evaluate_array(cards: np.ndarray) -> np.ndarray:
+        """向量化评估：cards为(N, k)整数牌矩阵（k<=7，可用PAD_CARD填充），返回N个整数强度"""
+        cards = np.asarray(cards, dtype=np.intp)
+        products = _CARD_PRIMES_NP[cards].prod(axis=1)
+        index = np.minimum(np.searchsorted(_RANK_KEYS_NP, products), len(_RANK_KEYS_NP) - 1)
+        strengths = np.where(_RANK_KEYS_NP[index] == products, _RANK_VALUES_NP[index], 0).astype(np.int32)
+        
+        # 牌互不重复，求和即按位或，得到四个花色各13位的点数掩码
+        suit_masks = _CARD_SUIT_BITS_NP[cards].sum(axis=1)
+        for suit in range(4):
+            masks = (suit_masks >> (13 * suit)) & 0x1FFF
+            np.maximum(strengths, _FLUSH_TABLE_NP[masks], out=strengths)
+        return strengths
+    
+    @staticmethod
+    def evaluate_batch(hands: List[List[int]]) -> np.ndarray:
+        """批量评估：一次向量化调用评估任意多手牌（可来自不同牌桌，张数不同），返回整数强度数组"""
+        cards = np.full((len(hands), 7), PAD_CARD, dtype=np.intp)
+        for i, hand in enumerate(hands):
+            cards[i, :len(hand)] = hand
+        return HandEvaluator.evaluate_array(cards)
+    
+    @staticmethod
+    def decode_strength(strength: int) -> Tuple[HandRank, List[int]]:
+        """将整数强度还原为(牌型, 比较点数)"""
+        if strength == 0:
+            return HandRank.HIGH_CARD, []
+        decoded = _DECODED_STRENGTHS.get(strength)
+        if decoded is None:
+            category = strength >> _CATEGORY_SHIFT
+            if category in _STRAIGHT_CATEGORIES:
+                high = (strength >> 16) & 0xF
+                values = (14, 5, 4, 3, 2) if high == 5 else tuple(range(high, high - 5, -1))
+            else:
+                values = tuple((strength >> (16 - 4 * i)) & 0xF for i in range(_VALUE_COUNTS[category]))
+            decoded = (_HAND_RANKS[category], values)
+            _DECODED_STRENGTHS[strength] = decoded
+        return decoded[0], list(decoded[1])
+
+_MISSING = object()
+
+def _journaled(method):
+    """成功执行的状态变更通过journal事件通知监听者，用于崩溃恢复时按顺序重放
+
+    牌局进行中的操作同时记入本手牌的动作序列（牌局历史）。结算可能在方法内部完成，
+    所以先记入、失败再撤回，保证hand_complete事件中的记录已包含触发结算的动作。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        actions = self.hand_actions if self.game_stage not in ("waiting", "finished") else None
+        if actions is not None:
+            actions.append([method.__name__, list(args), kwargs])
+        result = method(self, *args, **kwargs)
+        failed = result is False or (isinstance(result, dict) and not result.get("success"))
+        if failed and actions is not None:
+            actions.pop()
+        if not failed and self.event_listeners:
+            self._emit("journal", {"op": method.__name__, "args": list(args), "kwargs": kwargs})
+        return result
+    return wrapper
+
+# 牌桌快照中直接保存的标量/简单结构字段
+_SNAPSHOT_FIELDS = (
+    'room_id', 'small_blind', 'big_blind', 'community_cards', 'pot', 'current_bet',
+    'current_player_index', 'dealer_position', 'game_stage', 'is_finished', 'game_results',
+    '_first_game', 'all_in_snapshot', 'equity', 'pending_showdown', 'state_version',
+    'hand_started_at', 'hand_roster', 'hand_deck_order', 'hand_actions', 'hand_seed', 'deck_commitment'
+)
+
+# 每张牌桌的座位数（座位号0-8）
+MAX_SEATS = 9
 
 class PokerGame:
     def __init__(self, room_id: int, small_blind: int, big_blind: int):
         self.room_id = room_id
         self.small_blind = small_blind
         self.big_blind = big_blind
-        self.players: List[Player] = []
+        # 玩家按座位号排列，未选座（position为-1）的排在最后；seats按座位号、_players_by_id按user_id索引
+        self._players: List[Player] = []
+        self.seats: List[Optional[Player]] = [None] * MAX_SEATS
+        self._players_by_id: Dict[int, Player] = {}
+        self._player_index: Dict[int, int] = {}
+        # 本轮下注的计数，每次行动增量更新：在局（未弃牌）、其中全下、已行动、
+        # 未全下且下注不足、未全下且尚未行动的玩家数
+        self._live = 0
+        self._all_in = 0
+        self._acted = 0
+        self._owing = 0
+        self._waiting = 0
         self.deck = Deck()
-        self.community_cards: List[Card] = []
+        self.community_cards: List[int] = []
         self.pot = 0
         self.current_bet = 0
         self.current_player_index = 0
         self.dealer_position = 0  # 初始庄家位置，会在第一次开始游戏时设置
         self.game_stage = "waiting"  # waiting, preflop, flop, turn, river, showdown
         self.is_finished = False
-        self.side_pots: List[Dict] = []
+        self.pot_ledger = PotLedger()  # 按玩家投入增量维护主池/边池
         self.game_results: Optional[Dict] = None
         self._first_game = True  # 标记是否是第一局游戏
+        self.all_in_snapshot: Optional[Dict] = None  # 全员全下时的手牌/公共牌/剩余牌堆，用于计算胜率
+        self.equity: Optional[Dict] = None  # 全下后的胜率结果
+        self.equity_estimates: Dict[Tuple[int, float], Dict] = {}  # 按(抽样数, 时间上限)缓存的胜率
+        self.defer_showdown = False  # 为True时摊牌评估交给PokerGameManager批量处理
+        self.pending_showdown = False
+        self.event_listeners: List[Callable[["PokerGame", str, Dict], None]] = []
+        # 增量广播：版本号、上次广播的公共状态、已下发的手牌
+        self.state_version = 0
+        self._patch_baseline: Dict = {}
+        self._sent_hole_cards: Dict[int, Tuple[int, ...]] = {}
+        # 本手牌开始时的玩家座位和筹码，用于生成牌局记录（中途离开的玩家也能记账）
+        self.hand_started_at: Optional[float] = None
+        self.hand_roster: Dict[int, Dict] = {}
+        # 本手牌发牌前的牌堆顺序和进行中的操作序列，用于牌局历史和确定性重放
+        self.hand_deck_order: List[int] = []
+        self.hand_actions: List[List] = []
+        # 发牌随机源：本手牌的种子在结束前保密，只公布其sha256承诺
+        self.rng = TableRng(room_id)
+        self.hand_seed: Optional[bytes] = None
+        self.deck_commitment: Optional[str] = self.rng.prepare().commitment
+    
+    def _emit(self, event: str, data: Optional[Dict] = None):
+        """通知监听者牌局事件"""
+        for listener in self.event_listeners:
+            listener(self, event, data or {})
+    
+    @property
+    def players(self) -> List[Player]:
+        return self._players
+    
+    @players.setter
+    def players(self, players: List[Player]):
+        self._players = list(players)
+        self._reindex()
+        self._recount()
+    
+    @property
+    def live_count(self) -> int:
+        """本手牌中未弃牌的玩家数（含全下的玩家）"""
+        return self._live
     
+    def _reindex(self):
+        """按座位重建玩家顺序和索引（只在入座、离座、换座时调用）"""
+        self.seats = [None] * MAX_SEATS
+        unseated = []
+        for player in self._players:
+            if 0 <= player.position < MAX_SEATS and self.seats[player.position] is None:
+                self.seats[player.position] = player
+            else:
+                unseated.append(player)
+        unseated.sort(key=lambda p: (p.position if p.position >= 0 else 999, p.user_id))
+        self._players = [player for player in self.seats if player is not None] + unseated
+        self._players_by_id = {player.user_id: player for player in self._players}
+        self._player_index = {player.user_id: i for i, player in enumerate(self._players)}
+    
+    def _seat_taken(self, position: int) -> bool:
+        if 0 <= position < MAX_SEATS:
+            return self.seats[position] is not None
+        return any(p.position == position for p in self._players)
+    
+    def _dealer_index(self) -> Optional[int]:
+        """庄家在玩家列表中的下标"""
+        if 0 <= self.dealer_position < MAX_SEATS:
+            dealer = self.seats[self.dealer_position]
+            return self._player_index[dealer.user_id] if dealer else None
+        # 庄家没有选座（position为-1）时按顺序查找
+        return next((i for i, p in enumerate(self._players) if p.position == self.dealer_position), None)
+    
+    def _tally(self, player: Player, sign: int):
+        """把一名玩家计入（sign=1）或移出（sign=-1）本轮下注的计数"""
+        if not player.is_active or player.is_folded:
+            return
+        self._live += sign
+        if player.has_acted_this_round:
+            self._acted += sign
+        if player.is_all_in:
+            self._all_in += sign
+        else:
+            if player.current_bet < self.current_bet:
+                self._owing += sign
+            if not player.has_acted_this_round:
+                self._waiting += sign
+    
+    def _recount(self):
+        """重新统计本轮下注的计数（开局、新一轮、玩家离座时）"""
+        self._live = self._all_in = self._acted = self._owing = self._waiting = 0
+        for player in self._players:
+            self._tally(player, 1)
+    
+    @_journaled
     def add_player(self, user_id: int, username: str, chips: int, position: int = None) -> bool:
         """添加玩家"""
-        if len(self.players) >= 9:
+        if len(self._players) >= MAX_SEATS:
             return False
         
         # 检查用户是否已存在
-        for p in self.players:
-            if p.user_id == user_id:
-                return True  # 用户已存在，直接返回成功
+        if user_id in self._players_by_id:
+            return True  # 用户已存在，直接返回成功
         
         # 如果没有指定位置，设置为-1（表示未选择座位）
         if position is None:
             position = -1
-        else:
-            # 检查指定位置是否已被占用
-            for p in self.players:
-                if p.position == position:
-                    return False
+        elif self._seat_taken(position):
+            # 指定位置已被占用
+            return False
         
         player = Player(user_id, username, chips, position)
-        self.players.append(player)
-        # 按位置排序玩家列表，-1的玩家排在最后
-        self.players.sort(key=lambda p: (p.position if p.position >= 0 else 999, p.user_id))
+        self._players.append(player)
+        # 按座位重建顺序，-1的玩家排在最后
+        self._reindex()
+        self._tally(player, 1)
         return True
     
+    @_journaled
     def remove_player(self, user_id: int) -> bool:
         """移除玩家"""
-        for i, player in enumerate(self.players):
-            if player.user_id == user_id:
-                self.players.pop(i)
-                # 不重新分配位置，保持其他玩家的座位不变
-                return True
-        return False
+        index = self._player_index.get(user_id)
+        if index is None:
+            return False
+        self._players.pop(index)
+        self._reindex()
+        self._recount()
+        # 已投入的筹码留在奖池中
+        self.pot_ledger.fold(user_id)
+        if self.game_stage in ("preflop", "flop", "turn", "river"):
+            if self._live <= 1:
+                # 离座后只剩一名（或没有）在局玩家，不再等待行动，奖池直接结算
+                logger.debug("Only %s active players left after removal, going to showdown", self._live)
+                self._showdown()
+            elif index < self.current_player_index:
+                # 前面的座位离开，当前行动玩家的下标前移一位
+                self.current_player_index -= 1
+            elif index == self.current_player_index:
+                # 轮到行动的玩家离开：从上一个座位继续查找，下注轮可能因此结束
+                self.current_player_index = (index - 1) % len(self._players)
+                self._next_player()
+        # 不重新分配位置，保持其他玩家的座位不变
+        return True
     
-    def start_game(self) -> bool:
-        """开始游戏"""
+    @_journaled
+    def start_game(self, deck_order: Optional[List[int]] = None) -> bool:
+        """开始游戏；deck_order指定牌堆顺序（从末尾发牌），用于重放牌局历史"""
         if len(self.players) < 2:
             return False
         
@@ -281,26 +587,45 @@ class PokerGame:
         if self._first_game and self.players:
             self.dealer_position = self.players[0].position
             self._first_game = False
-            print(f"[DEBUG] First game: dealer_position set to {self.dealer_position}")
+            logger.debug("First game: dealer_position set to %s", self.dealer_position)
         
         # 重置游戏状态
-        self.deck.reset()
+        if deck_order is None:
+            hand_seed = self.rng.draw()
+            self.deck.cards = list(hand_seed.deck)
+            self.hand_seed = hand_seed.seed
+            self.deck_commitment = hand_seed.commitment
+        else:
+            self.deck.cards = list(deck_order)
+            self.hand_seed = None
+            self.deck_commitment = None
         self.community_cards = []
         self.pot = 0
+        self.pot_ledger.reset()
         self.current_bet = 0
         self.game_stage = "preflop"
         self.is_finished = False
         self.game_results = None
+        self.all_in_snapshot = None
+        self.equity = None
+        self.equity_estimates = {}
+        self.hand_started_at = time.time()
+        self.hand_roster = {
+            p.user_id: {'username': p.username, 'position': p.position, 'chips_at_start': p.chips}
+            for p in self.players
+        }
+        self.hand_deck_order = list(self.deck.cards)
+        self.hand_actions = []
         
-        print(f"[DEBUG] start_game: game_stage={self.game_stage}")
-        print(f"[DEBUG] start_game: dealer_position={self.dealer_position}")
+        logger.debug("start_game: game_stage=%s", self.game_stage)
+        logger.debug("start_game: dealer_position=%s", self.dealer_position)
         
         # 发手牌
         for _ in range(2):
             for player in self.players:
                 if not player.is_folded:
                     card = self.deck.deal_card()
-                    if card:
+                    if card is not None:
                         player.hole_cards.append(card)
         
         # 下盲注
@@ -311,11 +636,7 @@ class PokerGame:
         # 注意：这里需要基于数组索引，而不是position
         
         # 找到庄家在数组中的索引
-        dealer_array_index = None
-        for i, player in enumerate(self.players):
-            if player.position == self.dealer_position:
-                dealer_array_index = i
-                break
+        dealer_array_index = self._dealer_index()
         
         if dealer_array_index is not None:
             if len(self.players) == 2:
@@ -331,9 +652,13 @@ class PokerGame:
             # 如果找不到庄家，默认从第一个玩家开始
             self.current_player_index = 0
         
-        print(f"[DEBUG] start_game: dealer_position={self.dealer_position}, dealer_array_index={dealer_array_index}")
-        print(f"[DEBUG] start_game: current_player_index={self.current_player_index}")
-        print(f"[DEBUG] start_game: players={[(p.user_id, p.position) for p in self.players]}")
+        logger.debug("start_game: dealer_position=%s, dealer_array_index=%s", self.dealer_position, dealer_array_index)
+        logger.debug("start_game: current_player_index=%s", self.current_player_index)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("start_game: players=%s", [(p.user_id, p.position) for p in self.players])
+        
+        # 盲注可能已让玩家全下，按开局后的状态统计本轮计数
+        self._recount()
         
         # 确保找到下一个活跃玩家
         self._find_next_active_player()
@@ -344,11 +669,7 @@ class PokerGame:
         """下盲注"""
         if len(self.players) >= 2:
             # 找到庄家在数组中的索引
-            dealer_array_index = None
-            for i, player in enumerate(self.players):
-                if player.position == self.dealer_position:
-                    dealer_array_index = i
-                    break
+            dealer_array_index = self._dealer_index()
             
             if dealer_array_index is not None:
                 if len(self.players) == 2:
@@ -361,26 +682,27 @@ class PokerGame:
                     big_blind_array_index = (dealer_array_index + 2) % len(self.players)
                 
                 small_blind_player = self.players[small_blind_array_index]
-                small_blind_amount = small_blind_player.bet(self.small_blind)
-                self.pot += small_blind_amount
+                small_blind_amount = self._place_bet(small_blind_player, self.small_blind)
                 
                 big_blind_player = self.players[big_blind_array_index]
-                big_blind_amount = big_blind_player.bet(self.big_blind)
+                big_blind_amount = self._place_bet(big_blind_player, self.big_blind)
                 self.current_bet = self.big_blind
-                self.pot += big_blind_amount
                 
-                print(f"[DEBUG] _post_blinds: dealer={dealer_array_index}, small_blind={small_blind_array_index}, big_blind={big_blind_array_index}")
-                print(f"[DEBUG] Small blind: user {small_blind_player.user_id} bet {small_blind_amount}")
-                print(f"[DEBUG] Big blind: user {big_blind_player.user_id} bet {big_blind_amount}")
+                logger.debug("_post_blinds: dealer=%s, small_blind=%s, big_blind=%s", dealer_array_index, small_blind_array_index, big_blind_array_index)
+                logger.debug("Small blind: user %s bet %s", small_blind_player.user_id, small_blind_amount)
+                logger.debug("Big blind: user %s bet %s", big_blind_player.user_id, big_blind_amount)
     
+    @_journaled
     def player_action(self, user_id: int, action: str, amount: int = 0) -> Dict:
         """玩家行动"""
-        player = self._get_player_by_id(user_id)
-        current_player = self.players[self.current_player_index] if self.current_player_index < len(self.players) else None
+        player = self._players_by_id.get(user_id)
+        current_player = self._players[self.current_player_index] if self.current_player_index < len(self._players) else None
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        print(f"[DEBUG] player_action: user_id={user_id}, current_player_index={self.current_player_index}")
-        print(f"[DEBUG] current_player: {current_player.user_id if current_player else None}")
-        print(f"[DEBUG] players: {[(p.user_id, p.position) for p in self.players]}")
+        if debug:
+            logger.debug("player_action: user_id=%s, current_player_index=%s", user_id, self.current_player_index)
+            logger.debug("current_player: %s", current_player.user_id if current_player else None)
+            logger.debug("players: %s", [(p.user_id, p.position) for p in self._players])
         
         if not player or player != current_player:
             return {"success": False, "message": "不是你的回合"}
@@ -388,31 +710,63 @@ class PokerGame:
         if player.is_folded or not player.is_active:
             return {"success": False, "message": "你已经弃牌或不在游戏中"}
         
-        result = {"success": True, "action": action}
+        if self.pending_showdown:
+            return {"success": False, "message": "正在摊牌结算"}
+        
+        # 行动前把玩家移出本轮计数，行动后按新的状态计入
+        self._tally(player, -1)
+        previous_bet = self.current_bet
         
         # 标记玩家已在本轮行动
         player.has_acted_this_round = True
+        result = self._apply_action(player, action, amount)
+        
+        self._tally(player, 1)
+        if self.current_bet != previous_bet:
+            # 加注后其他未全下的在局玩家都需要补齐下注
+            self._owing = self._live - self._all_in - (0 if player.is_all_in else 1)
+        
+        if not result["success"]:
+            return result
+        
+        # 检查弃牌后是否只剩一个活跃玩家，如果是则立即结束游戏
+        if action == "fold" and self._live <= 1:
+            logger.debug("Only %s active players left after fold, going to showdown", self._live)
+            self.game_stage = "showdown"
+            self._showdown()
+            return result
+        
+        if debug:
+            logger.debug("player_action completed: %s by %s", action, player.username)
+            logger.debug("Current game state: pot=%s, current_bet=%s", self.pot, self.current_bet)
+            logger.debug("Player states: %s", [(p.user_id, p.chips, p.current_bet, p.is_folded, p.is_all_in) for p in self._players])
+        
+        # 移动到下一个玩家
+        self._next_player()
+        
+        if debug:
+            logger.debug("After _next_player: current_player_index=%s", self.current_player_index)
+            if self.current_player_index < len(self._players):
+                logger.debug("Next player: %s", self._players[self.current_player_index].user_id)
+        
+        return result
+    
+    def _apply_action(self, player: Player, action: str, amount: int) -> Dict:
+        """执行一次下注动作（不移动行动玩家）"""
+        result = {"success": True, "action": action}
         
         if action == "fold":
             player.fold()
+            self.pot_ledger.fold(player.user_id)
             result["message"] = f"{player.username} 弃牌"
-            
-            # 检查弃牌后是否只剩一个活跃玩家，如果是则立即结束游戏
-            active_players = [p for p in self.players if p.is_active and not p.is_folded]
-            if len(active_players) <= 1:
-                print(f"[DEBUG] Only {len(active_players)} active players left after fold, going to showdown")
-                self.game_stage = "showdown"
-                self._showdown()
-                return result
         
         elif action == "call":
-            call_amount = self.current_bet - player.current_bet
-            print(f"[DEBUG] Call calculation: current_bet={self.current_bet}, player.current_bet={player.current_bet}, call_amount={call_amount}")
-            print(f"[DEBUG] Player chips before bet: {player.chips}")
-            actual_bet = player.bet(call_amount)
-            print(f"[DEBUG] Actual bet amount: {actual_bet}")
-            print(f"[DEBUG] Player chips after bet: {player.chips}")
-            self.pot += actual_bet
+            call_amount = max(0, self.current_bet - player.current_bet)
+            logger.debug("Call calculation: current_bet=%s, player.current_bet=%s, call_amount=%s", self.current_bet, player.current_bet, call_amount)
+            logger.debug("Player chips before bet: %s", player.chips)
+            actual_bet = self._place_bet(player, call_amount)
+            logger.debug("Actual bet amount: %s", actual_bet)
+            logger.debug("Player chips after bet: %s", player.chips)
             result["message"] = f"{player.username} 跟注 {actual_bet}"
         
         elif action == "raise":
@@ -420,9 +774,10 @@ class PokerGame:
                 return {"success": False, "message": "加注金额不足"}
             
             total_bet_needed = amount - player.current_bet
-            actual_bet = player.bet(total_bet_needed)
-            self.pot += actual_bet
-            self.current_bet = player.current_bet
+            actual_bet = self._place_bet(player, total_bet_needed)
+            # 筹码不足的全下不会降低当前下注额
+            if player.current_bet > self.current_bet:
+                self.current_bet = player.current_bet
             result["message"] = f"{player.username} 加注到 {self.current_bet}"
         
         elif action == "check":
@@ -432,212 +787,177 @@ class PokerGame:
         
         elif action == "all_in":
             all_in_amount = player.chips
-            actual_bet = player.bet(all_in_amount)
-            self.pot += actual_bet
+            actual_bet = self._place_bet(player, all_in_amount)
             if player.current_bet > self.current_bet:
                 self.current_bet = player.current_bet
             result["message"] = f"{player.username} 全下 {actual_bet}"
         
-        print(f"[DEBUG] player_action completed: {action} by {player.username}")
-        print(f"[DEBUG] Current game state: pot={self.pot}, current_bet={self.current_bet}")
-        print(f"[DEBUG] Player states: {[(p.user_id, p.chips, p.current_bet, p.is_folded, p.is_all_in) for p in self.players]}")
-        
-        # 移动到下一个玩家
-        self._next_player()
-        
-        print(f"[DEBUG] After _next_player: current_player_index={self.current_player_index}")
-        if self.current_player_index < len(self.players):
-            print(f"[DEBUG] Next player: {self.players[self.current_player_index].user_id}")
-        
         return result
     
+    def _place_bet(self, player: Player, amount: int) -> int:
+        """玩家下注并计入奖池账本，返回实际下注额"""
+        actual_bet = player.bet(amount)
+        self.pot += actual_bet
+        self.pot_ledger.add(player.user_id, actual_bet, player.is_all_in)
+        return actual_bet
+    
     def _get_player_by_id(self, user_id: int) -> Optional[Player]:
         """根据用户ID获取玩家"""
-        for player in self.players:
-            if player.user_id == user_id:
-                return player
-        return None
+        return self._players_by_id.get(user_id)
     
     def _next_player(self):
         """移动到下一个活跃玩家"""
-        start_index = self.current_player_index
-        attempts = 0
-        max_attempts = len(self.players)
-        
-        print(f"[DEBUG] _next_player: starting from index {self.current_player_index}")
-        
-        while attempts < max_attempts:
-            self.current_player_index = (self.current_player_index + 1) % len(self.players)
-            current_player = self.players[self.current_player_index]
-            
-            print(f"[DEBUG] _next_player: moved to player {current_player.user_id} at index {self.current_player_index}")
-            print(f"[DEBUG] Player state: is_active={current_player.is_active}, is_folded={current_player.is_folded}, is_all_in={current_player.is_all_in}")
-            print(f"[DEBUG] Player bet state: current_bet={current_player.current_bet}, game_current_bet={self.current_bet}, has_acted={current_player.has_acted_this_round}")
-            
-            # 跳过已弃牌或不活跃的玩家
-            if current_player.is_active and not current_player.is_folded:
-                # 检查是否需要行动：如果不是all_in且下注不足，则需要行动
-                if not current_player.is_all_in and current_player.current_bet < self.current_bet:
-                    print(f"[DEBUG] Found next active player who needs to act: {current_player.user_id}")
-                    return
-                # 如果是all_in或下注已足够，但还没有在本轮行动过，也需要给机会行动（比如check）
-                elif not current_player.has_acted_this_round and not current_player.is_all_in and current_player.current_bet == self.current_bet:
-                    print(f"[DEBUG] Found player who can check: {current_player.user_id}")
-                    return
-                # 如果是all_in或已经行动过且下注足够，继续寻找下一个需要行动的玩家
-                else:
-                    print(f"[DEBUG] Player {current_player.user_id} doesn't need to act (all_in={current_player.is_all_in}, bet={current_player.current_bet}/{self.current_bet}, has_acted={current_player.has_acted_this_round})")
-            
-            attempts += 1
+        players = self._players
+        count = len(players)
+        # 每次行动都会经过这里，逐个座位的调试日志只在DEBUG级别时生成
+        debug = logger.isEnabledFor(logging.DEBUG)
+        
+        if debug:
+            logger.debug("_next_player: starting from index %s", self.current_player_index)
+        
+        # 计数表明没有玩家需要行动时不必逐个座位查找（转一整圈后下标不变）
+        if self._owing or self._waiting:
+            for _ in range(count):
+                self.current_player_index = (self.current_player_index + 1) % count
+                current_player = players[self.current_player_index]
+                
+                if debug:
+                    logger.debug("_next_player: moved to player %s at index %s", current_player.user_id, self.current_player_index)
+                    logger.debug("Player state: is_active=%s, is_folded=%s, is_all_in=%s", current_player.is_active, current_player.is_folded, current_player.is_all_in)
+                    logger.debug("Player bet state: current_bet=%s, game_current_bet=%s, has_acted=%s", current_player.current_bet, self.current_bet, current_player.has_acted_this_round)
+                
+                # 跳过已弃牌或不活跃的玩家
+                if current_player.is_active and not current_player.is_folded:
+                    # 检查是否需要行动：如果不是all_in且下注不足，则需要行动
+                    if not current_player.is_all_in and current_player.current_bet < self.current_bet:
+                        if debug:
+                            logger.debug("Found next active player who needs to act: %s", current_player.user_id)
+                        return
+                    # 如果是all_in或下注已足够，但还没有在本轮行动过，也需要给机会行动（比如check）
+                    elif not current_player.has_acted_this_round and not current_player.is_all_in and current_player.current_bet == self.current_bet:
+                        if debug:
+                            logger.debug("Found player who can check: %s", current_player.user_id)
+                        return
+                    # 如果是all_in或已经行动过且下注足够，继续寻找下一个需要行动的玩家
+                    elif debug:
+                        logger.debug("Player %s doesn't need to act (all_in=%s, bet=%s/%s, has_acted=%s)", current_player.user_id, current_player.is_all_in, current_player.current_bet, self.current_bet, current_player.has_acted_this_round)
         
-        print(f"[DEBUG] No more players need to act, checking if betting round is complete")
+        logger.debug("No more players need to act, checking if betting round is complete")
         
         # 检查是否只剩一个活跃玩家，如果是则直接进入摊牌
-        active_players = [p for p in self.players if p.is_active and not p.is_folded]
-        if len(active_players) <= 1:
-            print(f"[DEBUG] Only {len(active_players)} active players left, going to showdown")
+        if self._live <= 1:
+            logger.debug("Only %s active players left, going to showdown", self._live)
             self.game_stage = "showdown"
             self._showdown()
             return
         
         # 特殊处理两人游戏preflop阶段：如果小盲注跟注了，需要给大盲注一个行动机会
         if len(self.players) == 2 and self.game_stage == "preflop":
-            players_acted = [p for p in active_players if p.has_acted_this_round]
-            all_bets_equal = all(p.current_bet == self.current_bet or p.is_all_in for p in active_players)
-            
             # 如果只有小盲注行动过且下注相等（小盲跟注），设置大盲注为当前玩家
-            if len(players_acted) == 1 and all_bets_equal:
+            if self._acted == 1 and self._owing == 0:
                 # 找到大盲注玩家（非庄家位置）
                 for i, player in enumerate(self.players):
                     if player.position != self.dealer_position and player.is_active and not player.is_folded:
                         self.current_player_index = i
-                        print(f"[DEBUG] Two-player preflop: Setting big blind as current player: {player.user_id} at index {i}")
+                        logger.debug("Two-player preflop: Setting big blind as current player: %s at index %s", player.user_id, i)
                         return
         
         # 如果没有找到需要行动的玩家，检查下注轮是否完成
         if self._is_betting_round_complete():
-            print(f"[DEBUG] Betting round complete, moving to next stage")
+            logger.debug("Betting round complete, moving to next stage")
             self._next_stage()
         else:
             # 如果下注轮未完成但没有玩家需要行动，可能是逻辑错误
-            print(f"[DEBUG] Warning: No players need to act but betting round not complete")
+            logger.warning("No players need to act but betting round not complete")
             # 设置为第一个活跃且未弃牌的玩家
             for i, player in enumerate(self.players):
                 if player.is_active and not player.is_folded:
                     self.current_player_index = i
-                    print(f"[DEBUG] Reset to first active player: {player.user_id} at index {i}")
+                    logger.debug("Reset to first active player: %s at index %s", player.user_id, i)
                     break
     
     def _is_betting_round_complete(self) -> bool:
-        """检查下注轮是否完成"""
-        active_players = [p for p in self.players if p.is_active and not p.is_folded]
+        """检查下注轮是否完成（只读取本轮计数）"""
+        live = self._live
         
-        print(f"[DEBUG] _is_betting_round_complete: active_players count = {len(active_players)}")
-        print(f"[DEBUG] Active players: {[(p.user_id, p.current_bet, p.is_all_in, p.has_acted_this_round) for p in active_players]}")
-        print(f"[DEBUG] Current bet: {self.current_bet}")
-        print(f"[DEBUG] Game stage: {self.game_stage}")
+        logger.debug("_is_betting_round_complete: live=%s, all_in=%s, acted=%s, owing=%s, waiting=%s",
+                     live, self._all_in, self._acted, self._owing, self._waiting)
+        logger.debug("Current bet: %s", self.current_bet)
+        logger.debug("Game stage: %s", self.game_stage)
         
-        if len(active_players) <= 1:
-            print(f"[DEBUG] Betting round complete: only {len(active_players)} active players")
+        if live <= 1:
+            logger.debug("Betting round complete: only %s active players", live)
             return True
         
         # 检查是否所有活跃玩家都all-in，如果是则直接进入结算
-        all_players_all_in = all(p.is_all_in for p in active_players)
-        if all_players_all_in:
-            print(f"[DEBUG] Betting round complete: all active players are all-in")
+        if self._all_in == live:
+            logger.debug("Betting round complete: all active players are all-in")
             return True
         
-        # 特殊处理两人游戏preflop阶段                                                                                                                      
-        if len(active_players) == 2 and self.game_stage == "preflop":
-            # 在两人游戏preflop阶段，小盲注先行动，然后大盲注有机会行动
-            players_acted = [p for p in active_players if p.has_acted_this_round]
-            print(f"[DEBUG] Preflop two-player: {len(players_acted)} players have acted")
-            
-            # 检查是否所有玩家的下注都相等
-            all_bets_equal = all(p.current_bet == self.current_bet or p.is_all_in for p in active_players)
-            all_have_acted = all(p.has_acted_this_round for p in active_players)
-            print(f"[DEBUG] Preflop: all_bets_equal={all_bets_equal}, all_have_acted={all_have_acted}")
-            
+        # 特殊处理两人游戏preflop阶段
+        if live == 2 and self.game_stage == "preflop":
             # 两人游戏preflop规则：
             # 1. 如果小盲注还没行动，轮次未完成
             # 2. 如果小盲注行动了但大盲注还没行动，且下注不相等（小盲加注），轮次未完成
             # 3. 如果小盲注行动了且下注相等（小盲跟注），给大盲注一个行动机会
             # 4. 只有当大盲注也行动过，或者所有下注相等且至少小盲注行动过，轮次才完成
-            
-            if len(players_acted) == 0:
-                print(f"[DEBUG] Preflop: No players have acted yet, round not complete")
+            if self._acted == 0:
+                logger.debug("Preflop: No players have acted yet, round not complete")
                 return False
             
             # 如果所有玩家都行动过且下注相等，轮次完成
-            if all_have_acted and all_bets_equal:
-                print(f"[DEBUG] Preflop: All players have acted and bets are equal, round complete")
+            if self._acted == live and self._owing == 0:
+                logger.debug("Preflop: All players have acted and bets are equal, round complete")
                 return True
             
-            # 如果只有小盲注行动过，且下注相等（小盲跟注），给大盲注一个check的机会
-            if len(players_acted) == 1 and all_bets_equal:
-                print(f"[DEBUG] Preflop: Small blind called, big blind gets a chance to act")
-                return False
-            
-            print(f"[DEBUG] Preflop: Round not complete - players_acted={len(players_acted)}, all_bets_equal={all_bets_equal}, all_have_acted={all_have_acted}")
+            logger.debug("Preflop: Round not complete - players_acted=%s, owing=%s", self._acted, self._owing)
             return False
         
-        # 常规逻辑：检查所有活跃玩家是否都已行动且下注相等
-        players_need_action = []
-        for player in active_players:
-            if not player.is_all_in and player.current_bet < self.current_bet:
-                players_need_action.append(player.user_id)
-        
-        if players_need_action:
-            print(f"[DEBUG] Betting round NOT complete: players {players_need_action} still need to act")
+        # 常规逻辑：所有未全下的活跃玩家都已补齐下注
+        if self._owing:
+            logger.debug("Betting round NOT complete: %s players still need to act", self._owing)
             return False
         
         # 确保所有玩家都已在本轮行动过（除了all_in的玩家）
-        players_not_acted = [p.user_id for p in active_players if not p.has_acted_this_round and not p.is_all_in]
-        if players_not_acted:
-            print(f"[DEBUG] Betting round NOT complete: players {players_not_acted} haven't acted this round")
-            return False
-        
-        # 检查是否所有玩家的下注都相等（或者是all_in）
-        all_bets_equal = all(p.current_bet == self.current_bet or p.is_all_in for p in active_players)
-        if not all_bets_equal:
-            print(f"[DEBUG] Betting round NOT complete: bets are not equal")
+        if self._waiting:
+            logger.debug("Betting round NOT complete: %s players haven't acted this round", self._waiting)
             return False
         
-        # 特殊情况：如果所有玩家都已行动且下注都为0（所有人都check），轮次完成
-        if self.current_bet == 0 and all(p.has_acted_this_round or p.is_all_in for p in active_players):
-            print(f"[DEBUG] Betting round complete: all players checked (current_bet=0)")
-            return True
-        
-        print(f"[DEBUG] Betting round complete: all players have acted and bets are equal")
+        logger.debug("Betting round complete: all players have acted and bets are equal")
         return True
     
     def _next_stage(self):
         """进入下一阶段"""
         # 检查是否只剩一个活跃玩家，如果是则直接进入摊牌
-        active_players = [p for p in self.players if p.is_active and not p.is_folded]
-        if len(active_players) <= 1:
-            print(f"[DEBUG] Only {len(active_players)} active players left, going to showdown")
+        if self._live <= 1:
+            logger.debug("Only %s active players left, going to showdown", self._live)
             self.game_stage = "showdown"
             self._showdown()
             return
         
         # 检查是否所有活跃玩家都all-in，如果是则直接进入摊牌
-        all_players_all_in = all(p.is_all_in for p in active_players)
-        if all_players_all_in:
-            print(f"[DEBUG] All active players are all-in, going directly to showdown")
+        if self._all_in == self._live:
+            logger.debug("All active players are all-in, going directly to showdown")
+            # 记录发完剩余公共牌之前的局面，供胜率计算
+            if len(self.community_cards) < 5:
+                self.all_in_snapshot = {
+                    "hole_cards": {p.user_id: list(p.hole_cards) for p in self.players if p.is_active and not p.is_folded},
+                    "community_cards": list(self.community_cards),
+                    "remaining_cards": list(self.deck.cards)
+                }
             # 如果还没有发完所有公共牌，需要先发完
             if self.game_stage == "preflop":
                 # 发翻牌、转牌、河牌
                 self.community_cards.extend(self.deck.deal_cards(5))
-                print(f"[DEBUG] Dealt all remaining community cards for all-in showdown")
+                logger.debug("Dealt all remaining community cards for all-in showdown")
             elif self.game_stage == "flop":
                 # 发转牌、河牌
                 self.community_cards.extend(self.deck.deal_cards(2))
-                print(f"[DEBUG] Dealt turn and river for all-in showdown")
+                logger.debug("Dealt turn and river for all-in showdown")
             elif self.game_stage == "turn":
                 # 发河牌
                 self.community_cards.extend(self.deck.deal_cards(1))
-                print(f"[DEBUG] Dealt river for all-in showdown")
+                logger.debug("Dealt river for all-in showdown")
             
             self.game_stage = "showdown"
             self._showdown()
@@ -648,6 +968,7 @@ class PokerGame:
             player.reset_for_new_round()
         
         self.current_bet = 0
+        self._recount()
         
         if self.game_stage == "preflop":
             # 发翻牌
@@ -663,21 +984,14 @@ class PokerGame:
             self.game_stage = "river"
         elif self.game_stage == "river":
             # 摊牌
-            print(f"[DEBUG] River stage complete, going to showdown")
+            logger.debug("River stage complete, going to showdown")
             self.game_stage = "showdown"
             self._showdown()
-            # 游戏结束后设置为finished状态
-            self.game_stage = "finished"
-            print(f"[DEBUG] Game finished, stage set to: {self.game_stage}")
             return
         
         # 设置下一轮的第一个行动玩家（小盲注位置）
         # 找到庄家在数组中的索引
-        dealer_array_index = None
-        for i, player in enumerate(self.players):
-            if player.position == self.dealer_position:
-                dealer_array_index = i
-                break
+        dealer_array_index = self._dealer_index()
         
         if dealer_array_index is not None:
             if len(self.players) == 2:
@@ -694,117 +1008,156 @@ class PokerGame:
     
     def _find_next_active_player(self):
         """找到下一个活跃玩家"""
-        start_index = self.current_player_index
-        attempts = 0
-        max_attempts = len(self.players)
-        
-        while attempts < max_attempts:
-            current_player = self.players[self.current_player_index]
-            print(f"[DEBUG] _find_next_active_player: checking player {current_player.user_id} at index {self.current_player_index}")
-            print(f"[DEBUG] Player state: is_active={current_player.is_active}, is_folded={current_player.is_folded}, is_all_in={current_player.is_all_in}")
+        players = self._players
+        count = len(players)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        
+        for _ in range(count):
+            current_player = players[self.current_player_index]
+            if debug:
+                logger.debug("_find_next_active_player: checking player %s at index %s", current_player.user_id, self.current_player_index)
+                logger.debug("Player state: is_active=%s, is_folded=%s, is_all_in=%s", current_player.is_active, current_player.is_folded, current_player.is_all_in)
             
             # 找到活跃且未弃牌的玩家（all_in玩家也可以是当前玩家）
             if current_player.is_active and not current_player.is_folded:
-                print(f"[DEBUG] Found active player: {current_player.user_id} at index {self.current_player_index}")
+                if debug:
+                    logger.debug("Found active player: %s at index %s", current_player.user_id, self.current_player_index)
                 return
             
-            self.current_player_index = (self.current_player_index + 1) % len(self.players)
-            attempts += 1
+            self.current_player_index = (self.current_player_index + 1) % count
         
         # 如果没有找到活跃玩家，直接到摊牌
-        print(f"[DEBUG] No active players found, going to showdown")
+        logger.debug("No active players found, going to showdown")
         self.game_stage = "showdown"
         self._showdown()
-        # 确保游戏状态设置为finished
-        if not self.game_stage == "finished":
-            self.game_stage = "finished"
-            print(f"[DEBUG] Game stage set to finished after showdown")
     
     def _showdown(self):
         """摊牌阶段"""
-        print(f"[DEBUG] _showdown called")
-        active_players = [p for p in self.players if not p.is_folded]
-        print(f"[DEBUG] Active players in showdown: {[p.user_id for p in active_players]}")
-        
-        if len(active_players) == 1:
-            # 只有一个玩家，直接获胜
-            winner = active_players[0]
-            winner.chips += self.pot
-            print(f"[DEBUG] Single winner: {winner.user_id}, won {self.pot} chips")
-            self.is_finished = True
-            self.game_stage = "finished"
-            # 生成游戏结果数据
-            self.game_results = self._generate_game_results(active_players, winner, self.pot)
-            # 更新庄家位置到下一个玩家
-            self._move_dealer_position()
-            # 注意：不再立即重置玩家状态，由websocket_handler延迟处理
+        logger.debug("_showdown called")
+        self.game_stage = "showdown"
+        
+        if self.defer_showdown and self._live > 1:
+            # 由PokerGameManager收集后批量评估，再调用resolve_showdown结算；
+            # 只剩一名在局玩家时没有需要比较的手牌，直接结算
+            self.pending_showdown = True
+            self._emit("showdown_pending")
             return
         
-        # 评估所有玩家的手牌
+        hands = self.showdown_hands()
+        strengths = HandEvaluator.evaluate_batch([cards for _, cards in hands])
+        self.resolve_showdown({user_id: int(strength) for (user_id, _), strength in zip(hands, strengths)})
+    
+    def showdown_hands(self) -> List[Tuple[int, List[int]]]:
+        """摊牌时需要评估的手牌：[(user_id, 手牌+公共牌)]"""
+        return [(p.user_id, p.hole_cards + self.community_cards) for p in self.players if not p.is_folded]
+    
+    def resolve_showdown(self, strengths: Dict[int, int]):
+        """根据已评估的手牌强度结算奖池"""
+        active_players = [p for p in self.players if not p.is_folded]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Active players in showdown: %s", [p.user_id for p in active_players])
+        
+        # 按手牌强度排序，评估结果直接复用到游戏结果中
         player_hands = []
-        for player in active_players:
-            all_cards = player.hole_cards + self.community_cards
-            hand_rank, hand_values = HandEvaluator.evaluate_hand(all_cards)
+        for player in sorted(active_players, key=lambda p: strengths.get(p.user_id, 0), reverse=True):
+            hand_rank, hand_values = HandEvaluator.decode_strength(strengths.get(player.user_id, 0))
             player_hands.append((player, hand_rank, hand_values))
-            print(f"[DEBUG] Player {player.user_id} hand: {hand_rank}, values: {hand_values}")
-        
-        # 按手牌强度排序
-        player_hands.sort(key=lambda x: (x[1].value, x[2]), reverse=True)
+            logger.debug("Player %s hand: %s, values: %s", player.user_id, hand_rank, hand_values)
         
-        # 分配奖池
-        winner = player_hands[0][0]
-        winner.chips += self.pot
-        print(f"[DEBUG] Showdown winner: {winner.user_id}, won {self.pot} chips")
+        # 按奖池账本结算主池和边池，平分时零头从庄家左手边开始分配
+        settlement = self.pot_ledger.settle(strengths, self._seat_order_from_dealer())
+        # 没有在局玩家时奖池退还给投入者，弃牌的玩家也可能收到退款
+        for player in self.players:
+            player.chips += settlement['payouts'].get(player.user_id, 0)
+        winner = player_hands[0][0] if player_hands else None
+        logger.debug("Showdown payouts: %s", settlement['payouts'])
         
+        # 结算成功后才解除挂起，结算失败时牌桌仍保持挂起等待重试
+        self.pending_showdown = False
         self.is_finished = True
         self.game_stage = "finished"
         # 生成游戏结果数据
-        self.game_results = self._generate_game_results(active_players, winner, self.pot, player_hands)
+        self.game_results = self._generate_game_results(winner, self.pot, player_hands, settlement)
+        # 通知监听者持久化本手牌记录（须在移动庄家位置之前）
+        self._emit("hand_complete", self._build_hand_record(settlement, strengths))
         # 更新庄家位置到下一个玩家
         self._move_dealer_position()
         # 注意：不再立即重置玩家状态，由websocket_handler延迟处理
     
-    def _generate_game_results(self, active_players: List[Player], winner: Player, pot_amount: int, player_hands: List = None) -> Dict:
+    def _seat_order_from_dealer(self) -> List[int]:
+        """从庄家左手边开始的座位顺序（user_id列表）"""
+        seated = sorted(self.players, key=lambda p: p.position)
+        start = next((i for i, p in enumerate(seated) if p.position > self.dealer_position), 0)
+        return [p.user_id for p in seated[start:] + seated[:start]]
+    
+    def _generate_game_results(self, winner: Optional[Player], pot_amount: int, player_hands: List, settlement: Dict) -> Dict:
         """生成游戏结果数据"""
         results = []
         
-        if player_hands:
-            # 多人摊牌情况
-            for i, (player, hand_rank, hand_values) in enumerate(player_hands):
-                win_amount = pot_amount if player == winner else 0
-                results.append({
-                    'user_id': player.user_id,
-                    'username': player.username,
-                    'hole_cards': [card.to_dict() for card in player.hole_cards],
-                    'hand_rank': hand_rank.name,
-                    'hand_rank_value': hand_rank.value,
-                    'hand_strength': hand_values,
-                    'win_amount': win_amount,
-                    'final_chips': player.chips,
-                    'rank': i + 1
-                })
-        else:
-            # 单人获胜情况
-            for player in active_players:
-                win_amount = pot_amount if player == winner else 0
-                all_cards = player.hole_cards + self.community_cards
-                hand_rank, hand_values = HandEvaluator.evaluate_hand(all_cards)
-                results.append({
-                    'user_id': player.user_id,
-                    'username': player.username,
-                    'hole_cards': [card.to_dict() for card in player.hole_cards],
-                    'hand_rank': hand_rank.name,
-                    'hand_rank_value': hand_rank.value,
-                    'hand_strength': hand_values,
-                    'win_amount': win_amount,
-                    'final_chips': player.chips,
-                    'rank': 1 if player == winner else 2
-                })
+        for i, (player, hand_rank, hand_values) in enumerate(player_hands):
+            win_amount = settlement['payouts'].get(player.user_id, 0)
+            results.append({
+                'user_id': player.user_id,
+                'username': player.username,
+                'hole_cards': [card_to_dict(card) for card in player.hole_cards],
+                'hand_rank': hand_rank.name,
+                'hand_rank_value': hand_rank.value,
+                'hand_strength': hand_values,
+                'win_amount': win_amount,
+                'final_chips': player.chips,
+                'rank': i + 1
+            })
         
         return {
             'pot_amount': pot_amount,
-            'winner_id': winner.user_id,
-            'results': results
+            'winner_id': winner.user_id if winner else None,
+            'pots': settlement['pots'],
+            'results': results,
+            # 公开本手牌的种子，玩家可核对开局前公布的承诺并复算牌堆
+            'deck_seed': self.hand_seed.hex() if self.hand_seed else None,
+            'deck_commitment': self.deck_commitment
+        }
+    
+    def _build_hand_record(self, settlement: Dict, strengths: Dict[int, int]) -> Dict:
+        """本手牌的持久化记录：公共牌、底池及每位参与者的手牌、下注和输赢，
+        以及重放所需的盲注、牌堆顺序和操作序列"""
+        players = {p.user_id: p for p in self.players}
+        participants = []
+        for user_id, seat in self.hand_roster.items():
+            player = players.get(user_id)
+            total_bet = self.pot_ledger.totals.get(user_id, 0)
+            win_amount = settlement['payouts'].get(user_id, 0)
+            participants.append({
+                'user_id': user_id,
+                'username': seat['username'],
+                'position': seat['position'],
+                'hole_cards': ''.join(card_to_str(card) for card in player.hole_cards) if player else None,
+                'hole_card_ids': list(player.hole_cards) if player else [],
+                'chips_at_start': seat['chips_at_start'],
+                # 中途离开的玩家按开局筹码减去已投入、加上退还的筹码计算
+                'chips_at_end': player.chips if player else seat['chips_at_start'] - total_bet + win_amount,
+                'is_folded': player.is_folded if player else True,
+                'is_all_in': player.is_all_in if player else False,
+                'total_bet': total_bet,
+                'win_amount': win_amount,
+                'hand_strength': strengths.get(user_id)
+            })
+        
+        return {
+            'room_id': self.room_id,
+            'started_at': self.hand_started_at,
+            'finished_at': time.time(),
+            'small_blind': self.small_blind,
+            'big_blind': self.big_blind,
+            'pot': self.pot,
+            'community_cards': ' '.join(card_to_str(card) for card in self.community_cards),
+            'board': list(self.community_cards),
+            'dealer_position': self.dealer_position,
+            'deck_order': self.hand_deck_order,
+            'deck_seed': self.hand_seed,
+            'actions': list(self.hand_actions),
+            'pots': settlement['pots'],
+            'participants': participants
         }
     
     def get_hand_rank_name(self, hand_rank: HandRank) -> str:
@@ -829,23 +1182,20 @@ class PokerGame:
             return
         
         # 找到当前庄家在数组中的索引
-        current_dealer_index = None
-        for i, player in enumerate(self.players):
-            if player.position == self.dealer_position:
-                current_dealer_index = i
-                break
+        current_dealer_index = self._dealer_index()
         
         if current_dealer_index is not None:
             # 移动到下一个玩家（顺时针）
             next_dealer_index = (current_dealer_index + 1) % len(self.players)
             self.dealer_position = self.players[next_dealer_index].position
-            print(f"[DEBUG] Dealer position moved from {self.players[current_dealer_index].position} to {self.dealer_position}")
+            logger.debug("Dealer position moved from %s to %s", self.players[current_dealer_index].position, self.dealer_position)
         else:
             # 如果找不到当前庄家，设置为第一个玩家
             if self.players:
                 self.dealer_position = self.players[0].position
-                print(f"[DEBUG] Dealer position reset to {self.dealer_position}")
+                logger.debug("Dealer position reset to %s", self.dealer_position)
     
+    @_journaled
     def _reset_all_players_ready_status(self):
         """将所有玩家的准备状态设为未准备，并清空游戏状态"""
         for player in self.players:
@@ -863,13 +1213,22 @@ class PokerGame:
         self.game_stage = "waiting"
         self.is_finished = False
         self.pot = 0
+        self.pot_ledger.reset()
         self.current_bet = 0
+        self._recount()
         self.current_player_index = 0
         self.community_cards = []
         self.game_results = None
-        
-        print(f"[DEBUG] All players ready status reset to False and game state cleared")
+        self.all_in_snapshot = None
+        self.equity = None
+        self.equity_estimates = {}
+        # 两手之间提前洗好下一手的牌并公布承诺，开局时不再洗牌
+        self.hand_seed = None
+        self.deck_commitment = self.rng.prepare().commitment
+        
+        logger.debug("All players ready status reset to False and game state cleared")
     
+    @_journaled
     def set_player_ready(self, user_id: int, ready: bool) -> bool:
         """设置玩家准备状态"""
         player = self._get_player_by_id(user_id)
@@ -879,99 +1238,297 @@ class PokerGame:
         player.is_ready = ready
         return True
     
+    @_journaled
     def change_player_seat(self, user_id: int, new_position: int) -> bool:
         """切换玩家座位"""
-        print(f"[DEBUG] change_player_seat called: user_id={user_id}, new_position={new_position}")
+        logger.debug("change_player_seat called: user_id=%s, new_position=%s", user_id, new_position)
         
         if self.game_stage != "waiting":
-            print(f"[DEBUG] Cannot change seat during game stage: {self.game_stage}")
+            logger.debug("Cannot change seat during game stage: %s", self.game_stage)
             return False  # 游戏进行中不能切换座位
         
         player = self._get_player_by_id(user_id)
         if not player:
-            print(f"[DEBUG] Player with user_id {user_id} not found in game")
+            logger.debug("Player with user_id %s not found in game", user_id)
             return False
         
-        # 检查新位置是否有效（支持9个座位：0-8）
-        if new_position < 0 or new_position >= 9:
-            print(f"[DEBUG] Invalid position: {new_position} (must be 0-8)")
+        # 检查新位置是否有效（座位号0到MAX_SEATS-1）
+        if new_position < 0 or new_position >= MAX_SEATS:
+            logger.debug("Invalid position: %s (must be 0-%s)", new_position, MAX_SEATS - 1)
             return False
         
-        print(f"[DEBUG] Checking if position {new_position} is occupied...")
+        logger.debug("Checking if position %s is occupied...", new_position)
         # 检查新位置是否被占用
-        for p in self.players:
-            if p.position == new_position and p.user_id != user_id:
-                print(f"[DEBUG] Position {new_position} is already occupied by user {p.user_id}")
-                return False
+        occupant = self.seats[new_position]
+        if occupant is not None and occupant is not player:
+            logger.debug("Position %s is already occupied by user %s", new_position, occupant.user_id)
+            return False
         
-        print(f"[DEBUG] Position {new_position} is available")
+        logger.debug("Position %s is available", new_position)
         
         # 更新玩家位置
         old_position = player.position
         player.position = new_position
-        print(f"[DEBUG] Player {user_id} moved from position {old_position} to {new_position}")
+        logger.debug("Player %s moved from position %s to %s", user_id, old_position, new_position)
         
-        # 重新排序玩家列表，确保按座位位置排序
-        self.players.sort(key=lambda p: (p.position if p.position >= 0 else 999, p.user_id))
-        print(f"[DEBUG] Players after sorting: {[(p.user_id, p.position) for p in self.players]}")
+        # 按新座位重建玩家顺序
+        self._reindex()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Players after sorting: %s", [(p.user_id, p.position) for p in self.players])
         
         return True
     
+    def to_snapshot(self) -> Dict:
+        """完整牌桌状态（玩家、牌堆顺序、奖池账本、阶段、庄家等），用于持久化快照"""
+        snapshot = {field: getattr(self, field) for field in _SNAPSHOT_FIELDS}
+        snapshot['players'] = [dict(vars(player)) for player in self.players]
+        snapshot['deck'] = self.deck.cards
+        snapshot['pot_ledger'] = self.pot_ledger.to_snapshot()
+        snapshot['rng'] = {'hands_drawn': self.rng.hands_drawn, 'upcoming_seed': self.rng.upcoming_seed}
+        return snapshot
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> "PokerGame":
+        """从快照恢复牌桌；增量广播基线不保存，恢复后第一次广播为完整状态"""
+        game = cls(snapshot['room_id'], snapshot['small_blind'], snapshot['big_blind'])
+        for field in _SNAPSHOT_FIELDS:
+            # 旧版本快照中没有的字段保持默认值
+            if field in snapshot:
+                setattr(game, field, snapshot[field])
+        players = []
+        for data in snapshot['players']:
+            player = Player(data['user_id'], data['username'], data['chips'], data['position'])
+            player.__dict__.update(data)
+            players.append(player)
+        # 座位索引和本轮计数由恢复后的玩家状态重建
+        game.players = players
+        game.deck.cards = list(snapshot['deck'])
+        game.pot_ledger = PotLedger.from_snapshot(snapshot['pot_ledger'])
+        # 恢复已公布承诺的下一手种子，重启后承诺仍然有效
+        rng_state = snapshot.get('rng', {})
+        game.rng = TableRng(game.room_id, hands_drawn=rng_state.get('hands_drawn', 0),
+                            upcoming_seed=rng_state.get('upcoming_seed'))
+        if game.game_stage == "waiting" and rng_state.get('upcoming_seed') is None:
+            game.deck_commitment = game.rng.prepare().commitment
+        return game
+    
+    def replay(self, entries: List[Dict]):
+        """按顺序重放快照之后的操作日志"""
+        for entry in entries:
+            getattr(self, entry['op'])(*entry['args'], **entry.get('kwargs', {}))
+    
     def get_game_state(self, user_id: Optional[int] = None) -> Dict:
         """获取游戏状态"""
-        print(f"[DEBUG] get_game_state called for user {user_id}")
-        print(f"[DEBUG] Current players in game: {[(p.user_id, p.position) for p in self.players]}")
-        print(f"[DEBUG] Game stage: {self.game_stage}, current_player_index: {self.current_player_index}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("get_game_state called for user %s", user_id)
+            logger.debug("Current players in game: %s", [(p.user_id, p.position) for p in self.players])
+            logger.debug("Game stage: %s, current_player_index: %s", self.game_stage, self.current_player_index)
         
         players_data = []
         for player in self.players:
             player_dict = player.to_dict(show_hole_cards=(user_id == player.user_id))
             players_data.append(player_dict)
-            print(f"[DEBUG] Player data: user_id={player.user_id}, position={player.position}, dict_position={player_dict.get('position')}")
+            logger.debug("Player data: user_id=%s, position=%s, dict_position=%s", player.user_id, player.position, player_dict.get('position'))
         
         # 确定当前行动玩家
         current_player = None
         if self.game_stage != "waiting" and self.game_stage != "finished" and self.game_stage != "showdown":
             if 0 <= self.current_player_index < len(self.players):
                 current_player = self.players[self.current_player_index].user_id
-                print(f"[DEBUG] Current player determined: {current_player} at index {self.current_player_index}")
+                logger.debug("Current player determined: %s at index %s", current_player, self.current_player_index)
             else:
-                print(f"[DEBUG] Invalid current_player_index: {self.current_player_index}, players count: {len(self.players)}")
+                logger.warning("Invalid current_player_index: %s, players count: %s", self.current_player_index, len(self.players))
         else:
-            print(f"[DEBUG] Game stage {self.game_stage} - no current player needed")
+            logger.debug("Game stage %s - no current player needed", self.game_stage)
         
         state = {
             "room_id": self.room_id,
             "stage": self.game_stage,
             "pot": self.pot,
+            "side_pots": self.pot_ledger.summary(),
             "current_bet": self.current_bet,
             "current_player": current_player,
-            "community_cards": [card.to_dict() for card in self.community_cards],
+            "community_cards": [card_to_dict(card) for card in self.community_cards],
             "players": players_data,
-            "is_finished": self.is_finished
+            "is_finished": self.is_finished,
+            "equity": self.equity,
+            "deck_commitment": self.deck_commitment,
+            "seq": self.state_version
         }
         
-        print(f"[DEBUG] Final game state players: {[(p['user_id'], p['position']) for p in state['players']]}")
-        print(f"[DEBUG] Game stage: {self.game_stage}, current_player_index: {self.current_player_index}")
-        print(f"[DEBUG] Current player: {state['current_player']}, dealer_position: {self.dealer_position}")
-        print(f"[DEBUG] Pot: {self.pot}, current_bet: {self.current_bet}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Final game state players: %s", [(p['user_id'], p['position']) for p in state['players']])
+            logger.debug("Game stage: %s, current_player_index: %s", self.game_stage, self.current_player_index)
+            logger.debug("Current player: %s, dealer_position: %s", state['current_player'], self.dealer_position)
+            logger.debug("Pot: %s, current_bet: %s", self.pot, self.current_bet)
         return state
+    
+    def build_state_patch(self) -> Tuple[Optional[Dict], Dict[int, List[Dict]]]:
+        """生成相对上次广播的状态增量
+
+        返回 (公共增量, {user_id: 自己的手牌})；状态无变化时公共增量为None。
+        增量中的字段都是直接覆盖的值，重复应用结果不变；客户端按seq检测丢包，
+        缺失时重新请求完整快照。
+        """
+        state = self.get_game_state()
+        previous = self._patch_baseline
+        
+        changes = {
+            key: value for key, value in state.items()
+            if key not in ("players", "seq") and previous.get(key, _MISSING) != value
+        }
+        
+        previous_players = {p["user_id"]: p for p in previous.get("players", [])}
+        players = {}
+        for player_dict in state["players"]:
+            old = previous_players.get(player_dict["user_id"])
+            if old is None:
+                players[player_dict["user_id"]] = player_dict
+            else:
+                diff = {key: value for key, value in player_dict.items() if old.get(key) != value}
+                if diff:
+                    players[player_dict["user_id"]] = diff
+        
+        order = [p["user_id"] for p in state["players"]]
+        current_ids = set(order)
+        removed = [user_id for user_id in previous_players if user_id not in current_ids]
+        order_changed = order != [p["user_id"] for p in previous.get("players", [])]
+        
+        # 手牌只发给本人
+        private = {}
+        sent_hole_cards = {}
+        for player in self.players:
+            cards = tuple(player.hole_cards)
+            sent_hole_cards[player.user_id] = cards
+            if self._sent_hole_cards.get(player.user_id, ()) != cards:
+                private[player.user_id] = [card_to_dict(card) for card in cards]
+        self._sent_hole_cards = sent_hole_cards
+        
+        if not (changes or players or removed or order_changed or private):
+            return None, {}
+        
+        self.state_version += 1
+        self._patch_baseline = state
+        patch = {
+            "room_id": self.room_id,
+            "seq": self.state_version,
+            "changes": changes,
+            "players": players,
+            "removed": removed
+        }
+        if order_changed:
+            patch["order"] = order
+        return patch, private
 
 class PokerGameManager:
-    def __init__(self):
+    def __init__(self, batch_showdowns: bool = False):
         self.games: Dict[int, PokerGame] = {}
+        # 每手牌结束时收到牌局记录的回调（如持久化队列）
+        self.hand_complete_listeners: List[Callable[[Dict], None]] = []
+        # 所有牌桌事件的回调（如快照存储），参数同PokerGame.event_listeners
+        self.game_event_listeners: List[Callable[[PokerGame, str, Dict], None]] = []
+        # 开启后各牌桌的摊牌先挂起，由evaluate_pending_showdowns统一批量评估，各房间再分别结算
+        self.batch_showdowns = batch_showdowns
+        self.pending_showdowns: Dict[int, PokerGame] = {}
+        self.showdown_strengths: Dict[int, Dict[int, int]] = {}
     
     def create_game(self, room_id: int, small_blind: int, big_blind: int) -> PokerGame:
         """创建新游戏"""
         game = PokerGame(room_id, small_blind, big_blind)
-        self.games[room_id] = game
+        self._register(game)
         return game
     
+    def _register(self, game: PokerGame):
+        game.defer_showdown = self.batch_showdowns
+        game.event_listeners.append(self._on_game_event)
+        self.games[game.room_id] = game
+        if game.pending_showdown:
+            self.pending_showdowns[game.room_id] = game
+    
+    def restore_games(self, tables: List[Tuple[Dict, List[Dict]]]) -> List[int]:
+        """从 [(快照, 之后的操作日志)] 恢复牌桌，返回恢复的房间ID"""
+        restored = []
+        for snapshot, journal in tables:
+            try:
+                game = PokerGame.from_snapshot(snapshot)
+                # 重放时还未注册监听者，不会重复产生日志或牌局记录
+                game.defer_showdown = self.batch_showdowns
+                game.replay(journal)
+            except Exception:
+                logger.exception("恢复房间 %s 的牌桌失败", snapshot.get('room_id'))
+                continue
+            self._register(game)
+            restored.append(game.room_id)
+        return restored
+    
     def get_game(self, room_id: int) -> Optional[PokerGame]:
         """获取游戏"""
         return self.games.get(room_id)
     
     def remove_game(self, room_id: int):
         """移除游戏"""
-        if room_id in self.games:
-            del self.games[room_id]
\ No newline at end of file
+        game = self.games.pop(room_id, None)
+        self.pending_showdowns.pop(room_id, None)
+        self.showdown_strengths.pop(room_id, None)
+        if game:
+            self._on_game_event(game, "removed", {})
+    
+    def _on_game_event(self, game: PokerGame, event: str, data: Dict):
+        """处理牌局事件"""
+        if event == "showdown_pending":
+            self.pending_showdowns[game.room_id] = game
+        elif event == "hand_complete":
+            for listener in self.hand_complete_listeners:
+                listener(data)
+        for listener in self.game_event_listeners:
+            listener(game, event, data)
+    
+    def evaluate_pending_showdowns(self):
+        """一次向量化调用评估所有挂起且尚未评估的牌桌手牌，强度暂存到各自结算时使用
+
+        挂起牌桌的手牌和公共牌在结算前不会再变化，这里只读取，不修改其他房间的牌局。
+        """
+        games, table_hands = [], []
+        for game in self.pending_showdowns.values():
+            if game.room_id in self.showdown_strengths:
+                continue
+            try:
+                hands = game.showdown_hands()
+            except Exception:
+                logger.exception("读取房间 %s 的摊牌手牌失败", game.room_id)
+                continue
+            games.append(game)
+            table_hands.append(hands)
+        if not games:
+            return
+        
+        strengths = HandEvaluator.evaluate_batch([cards for hands in table_hands for _, cards in hands])
+        offset = 0
+        for game, hands in zip(games, table_hands):
+            self.showdown_strengths[game.room_id] = {
+                user_id: int(strengths[offset + i]) for i, (user_id, _) in enumerate(hands)
+            }
+            offset += len(hands)
+    
+    def resolve_pending_showdown(self, room_id: int) -> bool:
+        """结算一张牌桌挂起的摊牌（在该房间的actor中调用），成功后才移出挂起集合
+
+        评估时顺带批量评估其他挂起的牌桌，它们各自在自己的actor中结算时直接使用结果。
+        """
+        game = self.pending_showdowns.get(room_id)
+        if game is None:
+            return False
+        self.evaluate_pending_showdowns()
+        table_strengths = self.showdown_strengths.get(room_id)
+        if table_strengths is None:
+            return False
+        try:
+            game.resolve_showdown(table_strengths)
+        except Exception:
+            logger.exception("房间 %s 的摊牌结算失败", room_id)
+            return False
+        del self.pending_showdowns[room_id]
+        del self.showdown_strengths[room_id]
+        # 挂起的摊牌不在player_action内结算，单独记入操作日志
+        game._emit("journal", {"op": "resolve_showdown", "args": [table_strengths], "kwargs": {}})
+        return True
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+牌局历史：只追加的二进制日志和读取/重放工具
+
+每手牌结束时写入一帧：4字节小端长度 + msgpack编码的定长列表，文件按大小轮转。
+记录包含开局座位筹码、发牌种子和牌堆顺序、全部操作、公共牌和结算，
+可以通过PokerGame确定性地重放，用于纠纷核查；统计模式只解码不重放，用于批量分析。
+
+用法:
+    python hand_history.py dump   [文件或目录...]   # 每手牌输出一行JSON
+    python hand_history.py stats  [文件或目录...]   # 手数、各玩家输赢汇总
+    python hand_history.py replay [文件或目录...]   # 逐手重放并核对结算结果
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional
+import msgpack
+from game_logic import PokerGame, Player, card_to_str
+from rng import shuffle_from_seed
+from logger import get_logger
+
+logger = get_logger("hand_history")
+
+# 日志目录和单个文件的轮转大小
+HAND_HISTORY_DIR = os.getenv("HAND_HISTORY_DIR", "hand_history")
+HAND_HISTORY_MAX_BYTES = int(os.getenv("HAND_HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 记录格式版本，字段顺序见 encode_hand
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<I")
+# 最常见的player_action编码为 [user_id, 动作码, 金额]，其他操作保留 [操作名, 参数, 关键字参数]
+_ACTION_CODES = {"fold": 0, "check": 1, "call": 2, "raise": 3, "all_in": 4}
+_ACTION_NAMES = {code: name for name, code in _ACTION_CODES.items()}
+_FOLDED = 1
+_ALL_IN = 2
+
+def _encode_action(entry: List) -> List:
+    op, args, kwargs = entry
+    if op == "player_action" and not kwargs and len(args) == 3 and args[1] in _ACTION_CODES:
+        return [args[0], _ACTION_CODES[args[1]], args[2]]
+    return [op, args, kwargs]
+
+def _decode_action(item: List) -> List:
+    if isinstance(item[0], int):
+        return ["player_action", [item[0], _ACTION_NAMES[item[1]], item[2]], {}]
+    return item
+
+def encode_hand(record: Dict) -> bytes:
+    """牌局记录（hand_complete事件数据）编码为一帧"""
+    seats = [
+        [
+            p['user_id'], p['username'], p['position'],
+            p['chips_at_start'], p['chips_at_end'], p['total_bet'], p['win_amount'],
+            bytes(p['hole_card_ids']), p['hand_strength'],
+            (_FOLDED if p['is_folded'] else 0) | (_ALL_IN if p['is_all_in'] else 0)
+        ]
+        for p in record['participants']
+    ]
+    payload = msgpack.packb([
+        FORMAT_VERSION, record['room_id'], record['started_at'], record['finished_at'],
+        record['small_blind'], record['big_blind'], record['dealer_position'],
+        bytes(record['deck_order']), bytes(record['board']), record['pot'],
+        seats,
+        [_encode_action(entry) for entry in record['actions']],
+        [[pot['amount'], pot['winners'], pot['eligible']] for pot in record['pots']],
+        record.get('deck_seed')
+    ], use_bin_type=True)
+    return _HEADER.pack(len(payload)) + payload
+
+def decode_hand(item: List) -> Dict:
+    """一帧解码后的列表转换为字典"""
+    (version, room_id, started_at, finished_at, small_blind, big_blind, dealer_position,
+     deck_order, board, pot, seats, actions, pots) = item[:13]
+    return {
+        'version': version,
+        'room_id': room_id,
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'small_blind': small_blind,
+        'big_blind': big_blind,
+        'dealer_position': dealer_position,
+        'deck_order': list(deck_order),
+        'board': list(board),
+        'pot': pot,
+        'seats': [
+            {
+                'user_id': seat[0], 'username': seat[1], 'position': seat[2],
+                'chips_at_start': seat[3], 'chips_at_end': seat[4], 'total_bet': seat[5],
+                'win_amount': seat[6], 'hole_cards': list(seat[7]), 'hand_strength': seat[8],
+                'is_folded': bool(seat[9] & _FOLDED), 'is_all_in': bool(seat[9] & _ALL_IN)
+            }
+            for seat in seats
+        ],
+        'actions': [_decode_action(action) for action in actions],
+        'pots': [{'amount': amount, 'winners': winners, 'eligible': eligible} for amount, winners, eligible in pots],
+        'deck_seed': item[13] if len(item) > 13 else None
+    }
+
+class HandHistoryWriter:
+    """追加写入牌局历史（PokerGameManager.hand_complete_listeners回调）
+
+    每次进程启动写入新文件，超过max_bytes后轮转；每手牌写完即flush到操作系统，
+    进程崩溃最多留下一帧不完整的尾部，读取时会跳过。
+    """
+
+    def __init__(self, directory: str = HAND_HISTORY_DIR, max_bytes: int = HAND_HISTORY_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._file = None
+        self._size = 0
+        self._index = None
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+
+    def submit(self, record: Dict):
+        try:
+            frame = encode_hand(record)
+            if self._file is None or self._size >= self.max_bytes:
+                self._rotate()
+            self._file.write(frame)
+            self._file.flush()
+        except Exception:
+            # 不能让写历史的错误影响牌局结算
+            self.failed += 1
+            logger.exception("写入房间 %s 的牌局历史失败", record.get('room_id'))
+            return
+        self._size += len(frame)
+        self.bytes_written += len(frame)
+        self.written += 1
+
+    def _rotate(self):
+        if self._file:
+            self._file.close()
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            existing = [_file_index(name) for name in os.listdir(self.directory)]
+            self._index = max([index for index in existing if index is not None], default=0)
+        self._index += 1
+        path = os.path.join(self.directory, f"hands-{self._index:06d}.log")
+        self._file = open(path, "ab")
+        self._size = 0
+        logger.info("牌局历史写入新文件 %s", path)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict:
+        return {
+            "written": self.written,
+            "failed": self.failed,
+            "bytes_written": self.bytes_written,
+            "current_file_index": self._index
+        }
+
+def _file_index(name: str) -> Optional[int]:
+    if name.startswith("hands-") and name.endswith(".log"):
+        try:
+            return int(name[6:-4])
+        except ValueError:
+            return None
+    return None
+
+def log_files(paths: Iterable[str]) -> List[str]:
+    """展开目录为按序号排列的日志文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted((index, name) for name in os.listdir(path)
+                           if (index := _file_index(name)) is not None)
+            files.extend(os.path.join(path, name) for _, name in names)
+        else:
+            files.append(path)
+    return files
+
+def iter_raw_hands(paths: Iterable[str]) -> Iterator[List]:
+    """流式读取所有帧，返回未转换的列表（字段顺序见 encode_hand），适合批量统计"""
+    unpackb = msgpack.unpackb
+    header_size = _HEADER.size
+    for path in log_files(paths):
+        with open(path, "rb") as f:
+            data = f.read()
+        view = memoryview(data)
+        offset, end = 0, len(data)
+        while offset + header_size <= end:
+            (length,) = _HEADER.unpack_from(data, offset)
+            start = offset + header_size
+            if start + length > end:
+                break
+            yield unpackb(view[start:start + length])
+            offset = start + length
+        if offset != end:
+            logger.warning("%s 末尾有不完整的记录（%s 字节），已跳过", path, end - offset)
+
+def iter_hands(paths: Iterable[str]) -> Iterator[Dict]:
+    for item in iter_raw_hands(paths):
+        yield decode_hand(item)
+
+def replay_hand(hand: Dict) -> PokerGame:
+    """按记录的座位、庄家和牌堆顺序重建牌桌并重放全部操作"""
+    game = PokerGame(hand['room_id'], hand['small_blind'], hand['big_blind'])
+    game._first_game = False
+    game.dealer_position = hand['dealer_position']
+    game.players = [
+        Player(seat['user_id'], seat['username'], seat['chips_at_start'], seat['position'])
+        for seat in hand['seats']
+    ]
+    game.start_game(deck_order=hand['deck_order'])
+    game.replay({'op': op, 'args': args, 'kwargs': kwargs} for op, args, kwargs in hand['actions'])
+    return game
+
+def verify_hand(hand: Dict) -> List[str]:
+    """重放一手牌并与记录比对，返回不一致之处"""
+    game = replay_hand(hand)
+    problems = []
+    if hand['deck_seed'] is not None and shuffle_from_seed(hand['deck_seed']) != hand['deck_order']:
+        problems.append("牌堆顺序与公开的种子不符")
+    if not game.is_finished:
+        problems.append(f"重放后牌局未结束（阶段 {game.game_stage}）")
+    if game.community_cards != hand['board']:
+        problems.append(f"公共牌不一致: {game.community_cards} != {hand['board']}")
+    players = {p.user_id: p for p in game.players}
+    for seat in hand['seats']:
+        player = players.get(seat['user_id'])
+        if player is None:
+            continue
+        if player.chips != seat['chips_at_end']:
+            problems.append(f"玩家 {seat['user_id']} 筹码不一致: {player.chips} != {seat['chips_at_end']}")
+        if player.hole_cards != seat['hole_cards']:
+            problems.append(f"玩家 {seat['user_id']} 手牌不一致")
+    return problems
+
+def _format_hand(hand: Dict) -> Dict:
+    """dump输出：牌显示为字符串"""
+    hand = dict(hand)
+    hand['deck_order'] = ' '.join(card_to_str(card) for card in hand['deck_order'])
+    hand['board'] = ' '.join(card_to_str(card) for card in hand['board'])
+    if hand['deck_seed'] is not None:
+        hand['deck_seed'] = hand['deck_seed'].hex()
+    hand['seats'] = [
+        dict(seat, hole_cards=''.join(card_to_str(card) for card in seat['hole_cards']))
+        for seat in hand['seats']
+    ]
+    return hand
+
+def _dump(paths: List[str]):
+    for hand in iter_hands(paths):
+        print(json.dumps(_format_hand(hand), ensure_ascii=False))
+
+def _stats(paths: List[str]):
+    started = time.perf_counter()
+    hands = 0
+    total_pot = 0
+    players: Dict[int, List] = {}  # {user_id: [用户名, 手数, 净输赢, 赢的手数]}
+    for item in iter_raw_hands(paths):
+        hands += 1
+        total_pot += item[9]
+        for seat in item[10]:
+            entry = players.get(seat[0])
+            if entry is None:
+                entry = players[seat[0]] = [seat[1], 0, 0, 0]
+            entry[1] += 1
+            entry[2] += seat[4] - seat[3]
+            if seat[6] > seat[5]:
+                entry[3] += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"手数: {hands}  总底池: {total_pot}  玩家数: {len(players)}")
+    print(f"耗时 {elapsed:.2f}s，{hands / elapsed * 60 if elapsed else 0:,.0f} 手/分钟")
+    for user_id, (username, played, net, won) in sorted(players.items(), key=lambda item: -item[1][2]):
+        print(f"{user_id:>8} {username:<16} 手数 {played:>8}  净输赢 {net:>+10}  胜率 {won / played:.1%}")
+
+def _replay(paths: List[str], limit: Optional[int]):
+    started = time.perf_counter()
+    hands = 0
+    mismatched = 0
+    for hand in iter_hands(paths):
+        hands += 1
+        try:
+            problems = verify_hand(hand)
+        except Exception as e:
+            problems = [f"重放出错: {e!r}"]
+        if problems:
+            mismatched += 1
+            print(f"房间 {hand['room_id']} 开始于 {hand['started_at']:.3f} 的牌局不一致:")
+            for problem in problems:
+                print(f"  {problem}")
+        if limit and hands >= limit:
+            break
+    elapsed = time.perf_counter() - started
+
+    print(f"重放 {hands} 手，不一致 {mismatched} 手，耗时 {elapsed:.2f}s")
+    return mismatched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="牌局历史读取/重放工具")
+    parser.add_argument("command", choices=["dump", "stats", "replay"])
+    parser.add_argument("paths", nargs="*", default=[HAND_HISTORY_DIR], help="日志文件或目录")
+    parser.add_argument("--limit", type=int, default=None, help="replay最多重放的手数")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        _dump(args.paths)
+    elif args.command == "stats":
+        _stats(args.paths)
+    else:
+        sys.exit(1 if _replay(args.paths, args.limit) else 0)
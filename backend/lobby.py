@@ -0,0 +1,251 @@
+import os
+import json
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Set
+from sqlalchemy import select, update
+from database import AsyncSessionLocal
+from models import Room, RoomStatus
+from sharding import owns_room
+from logger import get_logger
+
+logger = get_logger("lobby")
+
+# 房间人数和状态写回数据库的间隔（秒）
+LOBBY_FLUSH_INTERVAL = float(os.getenv("LOBBY_FLUSH_INTERVAL", "2"))
+
+@dataclass
+class LobbyRoom:
+    """大厅中一个房间的展示信息（字段与RoomResponse一致）"""
+    id: int
+    name: str
+    small_blind: int
+    big_blind: int
+    max_players: int
+    current_players: int
+    status: str
+    created_at: Optional[str]
+
+    @classmethod
+    def from_model(cls, room: Room) -> "LobbyRoom":
+        return cls(
+            id=room.id,
+            name=room.name,
+            small_blind=room.small_blind,
+            big_blind=room.big_blind,
+            max_players=room.max_players,
+            current_players=room.current_players or 0,
+            status=room.status.value if room.status else RoomStatus.WAITING.value,
+            created_at=room.created_at.isoformat() if room.created_at else None
+        )
+
+    @property
+    def free_seats(self) -> int:
+        return max(0, self.max_players - self.current_players)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass
+class LobbyFilter:
+    """房间筛选条件；未指定状态时列出所有未结束的房间"""
+    status: Optional[str] = None
+    min_big_blind: Optional[int] = None
+    max_big_blind: Optional[int] = None
+    min_free_seats: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "LobbyFilter":
+        data = data or {}
+        return cls(
+            status=data.get("status"),
+            min_big_blind=data.get("min_big_blind"),
+            max_big_blind=data.get("max_big_blind"),
+            min_free_seats=data.get("min_free_seats") or 0
+        )
+
+    def matches(self, room: LobbyRoom) -> bool:
+        if self.status is None:
+            if room.status == RoomStatus.FINISHED.value:
+                return False
+        elif room.status != self.status:
+            return False
+        if self.min_big_blind is not None and room.big_blind < self.min_big_blind:
+            return False
+        if self.max_big_blind is not None and room.big_blind > self.max_big_blind:
+            return False
+        return room.free_seats >= self.min_free_seats
+
+class LobbyIndex:
+    """内存中的大厅房间索引
+
+    房间列表接口和大厅订阅都从索引读取；人数和状态由牌局事件更新，
+    本进程承载的牌桌变化后定期批量写回数据库（数据库只是镜像）。
+    收不到其他节点的牌局事件时（分片部署且没有跨节点的广播后端），
+    其他分片的房间在每次写回后从数据库刷新。
+    订阅者按各自的筛选条件收到房间的增加、更新和移除事件。
+    """
+
+    def __init__(self, flush_interval: float = LOBBY_FLUSH_INTERVAL):
+        self.rooms: Dict[int, LobbyRoom] = {}
+        # 本节点的订阅者：{user_id: 筛选条件}
+        self.subscribers: Dict[int, LobbyFilter] = {}
+        # 向订阅者发送已序列化的消息（由ConnectionManager设置）
+        self.send: Optional[Callable[[int, str], None]] = None
+        self.flush_interval = flush_interval
+        # 是否定期从数据库刷新其他分片的房间（由ConnectionManager按部署方式设置）
+        self.refresh_foreign = False
+        self._dirty: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.events_sent = 0
+        self.rows_written = 0
+        self.flush_failures = 0
+        self.rooms_refreshed = 0
+        self.refresh_failures = 0
+
+    async def load(self):
+        """启动时从数据库载入所有房间"""
+        async with AsyncSessionLocal() as db:
+            rooms = (await db.scalars(select(Room).order_by(Room.id))).all()
+        self.rooms = {room.id: LobbyRoom.from_model(room) for room in rooms}
+        logger.info("大厅索引已载入 %s 个房间", len(self.rooms))
+
+    async def lookup(self, room_id: int) -> Optional[LobbyRoom]:
+        """按ID取房间；索引中没有时（如其他节点新建的房间）从数据库补充"""
+        room = self.rooms.get(room_id)
+        if room is not None:
+            return room
+        async with AsyncSessionLocal() as db:
+            model = await db.scalar(select(Room).where(Room.id == room_id))
+        if model is None:
+            return None
+        room = self.rooms[room_id] = LobbyRoom.from_model(model)
+        return room
+
+    def query(self, room_filter: LobbyFilter, offset: int = 0, limit: Optional[int] = None) -> List[LobbyRoom]:
+        """按房间ID顺序返回符合条件的房间"""
+        matched = [room for room in sorted(self.rooms.values(), key=lambda room: room.id) if room_filter.matches(room)]
+        return matched[offset:offset + limit if limit is not None else None]
+
+    def apply(self, room_id: int, room: Optional[LobbyRoom]):
+        """更新（room为None时移除）索引中的房间，并按筛选条件通知订阅者"""
+        old = self.rooms.get(room_id)
+        if room is None:
+            self.rooms.pop(room_id, None)
+        else:
+            self.rooms[room_id] = room
+        self.updates += 1
+        if self.subscribers:
+            self._notify(room_id, old, room)
+
+    def _notify(self, room_id: int, old: Optional[LobbyRoom], new: Optional[LobbyRoom]):
+        # 同一种事件只序列化一次
+        texts: Dict[str, str] = {}
+        for user_id, room_filter in list(self.subscribers.items()):
+            was = old is not None and room_filter.matches(old)
+            now = new is not None and room_filter.matches(new)
+            if now:
+                action = "updated" if was else "added"
+            elif was:
+                action = "removed"
+            else:
+                continue
+            text = texts.get(action)
+            if text is None:
+                text = texts[action] = json.dumps({
+                    "type": "lobby_update",
+                    "data": {"action": action, "room_id": room_id, "room": new.to_dict() if now else None}
+                })
+            self.send(user_id, text)
+            self.events_sent += 1
+
+    def subscribe(self, user_id: int, room_filter: LobbyFilter) -> List[LobbyRoom]:
+        """订阅大厅事件，返回当前符合条件的房间作为初始列表"""
+        self.subscribers[user_id] = room_filter
+        return self.query(room_filter)
+
+    def unsubscribe(self, user_id: int):
+        self.subscribers.pop(user_id, None)
+
+    def mark_dirty(self, room_id: int):
+        """本节点的牌桌改变了房间人数或状态，等待写回数据库"""
+        self._dirty.add(room_id)
+
+    def start(self):
+        """启动后台写回任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写回剩余的变化"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if self.refresh_foreign:
+                await self.refresh()
+
+    async def flush(self):
+        """一个事务写回所有变化过的房间的人数和状态"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rooms = [self.rooms[room_id] for room_id in dirty if room_id in self.rooms]
+        try:
+            async with AsyncSessionLocal() as db:
+                for room in rooms:
+                    await db.execute(
+                        update(Room)
+                        .where(Room.id == room.id)
+                        .values(current_players=room.current_players, status=RoomStatus(room.status))
+                    )
+                await db.commit()
+            self.rows_written += len(rooms)
+        except Exception as e:
+            # 下次写回时重试
+            self.flush_failures += 1
+            self._dirty |= dirty
+            logger.error("写回 %s 个房间的人数和状态失败: %s", len(rooms), e)
+
+    async def refresh(self):
+        """从数据库刷新不由本节点承载的房间（人数和状态由所属节点写回），以及其他节点新建或删除的房间"""
+        try:
+            async with AsyncSessionLocal() as db:
+                models = (await db.scalars(select(Room))).all()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error("从数据库刷新大厅房间失败: %s", e)
+            return
+        fresh = {model.id: LobbyRoom.from_model(model) for model in models}
+        for room_id in sorted(set(self.rooms) | set(fresh)):
+            current = self.rooms.get(room_id)
+            if current is not None and owns_room(room_id):
+                # 本节点的牌桌以内存中的索引为准，数据库可能还没写回
+                continue
+            room = fresh.get(room_id)
+            if room != current:
+                self.apply(room_id, room)
+                self.rooms_refreshed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "rooms": len(self.rooms),
+            "subscribers": len(self.subscribers),
+            "updates": self.updates,
+            "events_sent": self.events_sent,
+            "pending_writes": len(self._dirty),
+            "rows_written": self.rows_written,
+            "flush_failures": self.flush_failures,
+            "rooms_refreshed": self.rooms_refreshed,
+            "refresh_failures": self.refresh_failures
+        }
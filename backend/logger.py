@@ -0,0 +1,95 @@
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# 所有模块日志器的公共前缀，环境变量中的模块名不含该前缀
+ROOT_LOGGER = "poker"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+# 环境变量：
+#   LOG_LEVEL      默认级别，如 INFO
+#   LOG_LEVELS     按模块覆盖，如 game_logic=DEBUG,websocket_handler=WARNING
+#   LOG_RING_SIZE  环形缓冲区保留的最近日志条数
+DEFAULT_LEVEL = "INFO"
+DEFAULT_RING_SIZE = 2000
+
+class RingBufferHandler(logging.Handler):
+    """在内存中保留最近N条日志，用于事后排查"""
+
+    def __init__(self, capacity: int = DEFAULT_RING_SIZE):
+        super().__init__()
+        self.records: Deque[Dict] = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.records.append({
+                "time": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage()
+            })
+        except Exception:
+            self.handleError(record)
+
+    def recent(self, limit: int = 200, level: Optional[str] = None, module: Optional[str] = None) -> List[Dict]:
+        """最近的日志（按时间顺序），可按最低级别和模块过滤"""
+        min_level = logging.getLevelName(level.upper()) if level else logging.NOTSET
+        name = f"{ROOT_LOGGER}.{module}" if module else None
+        records = [
+            record for record in self.records
+            if logging.getLevelName(record["level"]) >= min_level and (name is None or record["logger"] == name)
+        ]
+        return records[-limit:] if limit > 0 else []
+
+ring_buffer = RingBufferHandler(int(os.getenv("LOG_RING_SIZE", DEFAULT_RING_SIZE)))
+_configured = False
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    """解析 "module=LEVEL,module=LEVEL" 形式的级别配置"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            module, level = item.split("=", 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    """配置根日志器（只执行一次）：输出到stderr并写入环形缓冲区"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(os.getenv("LOG_LEVEL", DEFAULT_LEVEL).upper())
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.addHandler(ring_buffer)
+    root.propagate = False
+
+    for module, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(f"{ROOT_LOGGER}.{module}").setLevel(level)
+
+def get_logger(module: str) -> logging.Logger:
+    """获取模块日志器
+
+    消息使用 %s 占位符延迟格式化，级别未开启时不会拼接字符串；
+    参数本身计算代价高时用 logger.isEnabledFor(logging.DEBUG) 包裹。
+    """
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{module}")
+
+def set_level(level: str, module: Optional[str] = None):
+    """运行时调整级别，module为空时调整默认级别"""
+    name = f"{ROOT_LOGGER}.{module}" if module else ROOT_LOGGER
+    logging.getLogger(name).setLevel(level.upper())
+
+def get_levels() -> Dict[str, str]:
+    """当前显式设置的级别：{"": 默认级别, module: 级别}"""
+    levels = {"": logging.getLevelName(logging.getLogger(ROOT_LOGGER).level)}
+    prefix = f"{ROOT_LOGGER}."
+    for name, logger in logging.Logger.manager.loggerDict.items():
+        if name.startswith(prefix) and isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name[len(prefix):]] = logging.getLevelName(logger.level)
+    return levels
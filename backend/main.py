@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException, Depends, status, WebSocket
+from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import logging
 import uvicorn
 
 from database import get_db, engine, Base
-from models import User, Room, Game, Transaction, BorrowRecord, SystemConfig, RoomStatus
+from models import User, Room, Game, Transaction, BorrowRecord, SystemConfig
 from schemas import (
     UserCreate, UserLogin, UserResponse, UserUpdate,
     RoomCreate, RoomResponse,
@@ -14,8 +17,15 @@ from schemas import (
     BorrowRequest, BorrowResponse,
     SystemConfigUpdate
 )
-from auth import get_password_hash, authenticate_user, create_access_token, get_current_user, verify_token
-from websocket_handler import websocket_endpoint, manager
+from auth import authenticate_user, create_access_token, get_current_user, verify_token, identity_cache
+from websocket_handler import websocket_endpoint, manager, dispatcher
+from passwords import password_hasher
+from table_store import TableStore
+from lobby import LobbyRoom, LobbyFilter
+from sharding import SHARD_COUNT, SHARD_INDEX, owns_room, room_from_path, shard_for_room
+from logger import get_logger, ring_buffer, set_level, get_levels
+
+logger = get_logger("main")
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
@@ -31,19 +41,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if SHARD_COUNT > 1:
+    @app.middleware("http")
+    async def reject_foreign_rooms(request: Request, call_next):
+        """分片部署时拒绝不属于本进程的房间请求（应由路由进程转发到所属分片）"""
+        room_id = room_from_path(request.url.path)
+        if room_id is not None and not owns_room(room_id):
+            return JSONResponse(
+                status_code=421,
+                content={"detail": "房间不在本分片", "shard": shard_for_room(room_id)}
+            )
+        return await call_next(request)
+
 security = HTTPBearer()
 # game_manager将从websocket_handler导入，确保使用同一个实例
 
+@app.on_event("startup")
+async def start_background_tasks():
+    # 载入大厅房间索引，恢复重启前进行中的牌桌
+    await manager.lobby.load()
+    manager.restore_tables(TableStore())
+    manager.hand_writer.start()
+    manager.lobby.start()
+    manager.timers.start()
+    await manager.backplane.start()
+
+@app.on_event("shutdown")
+async def drain_background_tasks():
+    # 关闭前写完所有已结束牌局的记录，并快照所有牌桌
+    await manager.timers.stop()
+    await manager.stop_room_actors()
+    await manager.hand_writer.stop()
+    manager.hand_history.close()
+    manager.save_tables()
+    await manager.lobby.stop()
+    await manager.backplane.stop()
+    password_hasher.shutdown()
+
+def client_ip(request: Request) -> Optional[str]:
+    """客户端IP（分片部署时工作进程只接受路由进程的转发，取路由进程设置的X-Forwarded-For）"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if SHARD_COUNT > 1 and forwarded:
+        return forwarded
+    return request.client.host if request.client else None
+
 # 用户认证相关接口
 @app.post("/api/auth/register", response_model=dict)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
     # 检查用户名是否已存在
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(status_code=400, detail="用户名已存在")
     
     # 创建新用户
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password, client_ip(request))
     new_user = User(
         username=user_data.username,
         hashed_password=hashed_password,
@@ -53,14 +104,14 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return {"success": True, "message": "注册成功"}
 
 @app.post("/api/auth/login", response_model=dict)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_data.username, user_data.password)
+async def login(user_data: UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, user_data.username, user_data.password, client_ip(request))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -104,14 +155,16 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 async def borrow_chips(
     borrow_data: BorrowRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # 检查借码条件
+    # 缓存的当前用户只读，在本会话中重新查询后修改
+    current_user = await db.scalar(select(User).where(User.id == current_user.id))
     if current_user.borrow_count <= 0:
         raise HTTPException(status_code=400, detail="借码次数已用完")
     
     # 获取系统配置的单次借码数量
-    config = db.query(SystemConfig).filter(SystemConfig.key == "borrow_amount").first()
+    config = await db.scalar(select(SystemConfig).where(SystemConfig.key == "borrow_amount"))
     borrow_amount = int(config.value) if config else 1000
     
     # 检查是否满足借码条件（余额为0或小于等于大盲注）
@@ -131,8 +184,9 @@ async def borrow_chips(
     )
     
     db.add(borrow_record)
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    identity_cache.invalidate_user(current_user.id)
     
     return BorrowResponse(
         success=True,
@@ -146,7 +200,7 @@ async def borrow_chips(
 async def create_recharge_request(
     transaction_data: TransactionCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # 创建充值申请记录
     transaction = Transaction(
@@ -158,7 +212,7 @@ async def create_recharge_request(
     )
     
     db.add(transaction)
-    db.commit()
+    await db.commit()
     
     return {
         "success": True,
@@ -169,11 +223,13 @@ async def create_recharge_request(
 @app.get("/api/user/transactions", response_model=List[TransactionResponse])
 async def get_user_transactions(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id
-    ).order_by(Transaction.created_at.desc()).limit(20).all()
+    transactions = (await db.scalars(
+        select(Transaction).where(
+            Transaction.user_id == current_user.id
+        ).order_by(Transaction.created_at.desc()).limit(20)
+    )).all()
     
     return [TransactionResponse(
         id=t.id,
@@ -188,12 +244,12 @@ async def get_user_transactions(
 @app.get("/api/admin/users", response_model=List[UserResponse])
 async def get_all_users(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="权限不足")
     
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return [UserResponse(
         id=str(u.id),
         username=u.username,
@@ -210,12 +266,12 @@ async def get_all_users(
 async def approve_recharge(
     transaction_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="权限不足")
     
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    transaction = await db.scalar(select(Transaction).where(Transaction.id == transaction_id))
     if not transaction:
         raise HTTPException(status_code=404, detail="交易记录不存在")
     
@@ -223,12 +279,13 @@ async def approve_recharge(
         raise HTTPException(status_code=400, detail="该交易已处理")
     
     # 审批通过，增加用户筹码
-    user = db.query(User).filter(User.id == transaction.user_id).first()
+    user = await db.scalar(select(User).where(User.id == transaction.user_id))
     user.chips += transaction.amount
     transaction.status = "approved"
     transaction.description += f" - 管理员{current_user.username}审批通过"
     
-    db.commit()
+    await db.commit()
+    identity_cache.invalidate_user(user.id)
     
     return {"success": True, "message": "充值审批成功"}
 
@@ -236,41 +293,83 @@ async def approve_recharge(
 async def set_borrow_amount(
     config_data: SystemConfigUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="权限不足")
     
-    config = db.query(SystemConfig).filter(SystemConfig.key == "borrow_amount").first()
+    config = await db.scalar(select(SystemConfig).where(SystemConfig.key == "borrow_amount"))
     if config:
         config.value = str(config_data.value)
     else:
         config = SystemConfig(key="borrow_amount", value=str(config_data.value))
         db.add(config)
     
-    db.commit()
+    await db.commit()
     
     return {"success": True, "message": f"单次借码数量已设置为{config_data.value}"}
 
+@app.get("/api/admin/metrics")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="权限不足")
+    
+    return {
+        "shard": SHARD_INDEX,
+        "websocket": manager.get_metrics(),
+        "messages": dispatcher.stats(),
+        "hand_writer": manager.hand_writer.stats(),
+        "hand_history": manager.hand_history.stats(),
+        "identity_cache": identity_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "table_store": manager.table_store.stats() if manager.table_store else None
+    }
+
+@app.get("/api/admin/logs")
+async def get_recent_logs(
+    limit: int = Query(200, ge=1, le=2000),
+    level: Optional[str] = None,
+    module: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="权限不足")
+    
+    return {"levels": get_levels(), "records": ring_buffer.recent(limit, level, module)}
+
+@app.post("/api/admin/logs/level")
+async def set_log_level(
+    level: str,
+    module: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="权限不足")
+    
+    if not isinstance(logging.getLevelName(level.upper()), int):
+        raise HTTPException(status_code=400, detail="无效的日志级别")
+    
+    set_level(level, module)
+    return {"success": True, "levels": get_levels()}
+
 # 房间管理接口
 @app.get("/api/rooms", response_model=List[RoomResponse])
-async def get_rooms(db: Session = Depends(get_db)):
-    rooms = db.query(Room).filter(Room.status != "finished").all()
-    return [RoomResponse(
-        id=r.id,
-        name=r.name,
-        small_blind=r.small_blind,
-        big_blind=r.big_blind,
-        max_players=r.max_players,
-        current_players=r.current_players,
-        status=r.status.value,
-        created_at=r.created_at
-    ) for r in rooms]
+async def get_rooms(
+    room_status: Optional[str] = Query(default=None, alias="status"),
+    min_big_blind: Optional[int] = None,
+    max_big_blind: Optional[int] = None,
+    min_free_seats: int = Query(default=0, ge=0),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=500)
+):
+    """房间列表（从大厅索引读取；实时更新请通过WebSocket订阅大厅）"""
+    rooms = manager.lobby.query(LobbyFilter(room_status, min_big_blind, max_big_blind, min_free_seats), offset, limit)
+    return [RoomResponse(**room.to_dict()) for room in rooms]
 
 @app.post("/api/rooms", response_model=RoomResponse)
 async def create_room(
     room_data: RoomCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_room = Room(
         name=room_data.name,
@@ -281,130 +380,87 @@ async def create_room(
     )
     
     db.add(new_room)
-    db.commit()
-    db.refresh(new_room)
-    
-    return RoomResponse(
-        id=new_room.id,
-        name=new_room.name,
-        small_blind=new_room.small_blind,
-        big_blind=new_room.big_blind,
-        max_players=new_room.max_players,
-        current_players=new_room.current_players,
-        status=new_room.status.value,
-        created_at=new_room.created_at
-    )
+    await db.commit()
+    await db.refresh(new_room)
+    
+    # 新房间推送给所有大厅订阅者
+    room = LobbyRoom.from_model(new_room)
+    manager.publish_lobby(room.id, room)
+    return RoomResponse(**room.to_dict())
 
 @app.get("/api/rooms/{room_id}", response_model=RoomResponse)
-async def get_room(room_id: int, db: Session = Depends(get_db)):
-    room = db.query(Room).filter(Room.id == room_id).first()
+async def get_room(room_id: int):
+    room = await manager.lobby.lookup(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    return RoomResponse(
-        id=room.id,
-        name=room.name,
-        small_blind=room.small_blind,
-        big_blind=room.big_blind,
-        max_players=room.max_players,
-        current_players=room.current_players,
-        status=room.status.value,
-        created_at=room.created_at
-    )
+    return RoomResponse(**room.to_dict())
 
 @app.delete("/api/rooms/{room_id}")
 async def delete_room(
     room_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await db.scalar(select(Room).where(Room.id == room_id))
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 检查房间是否有玩家
-    if room.current_players > 0:
+    # 检查房间是否有玩家（以大厅索引中的实时人数为准）
+    lobby_room = await manager.lobby.lookup(room_id)
+    if lobby_room.current_players > 0:
         raise HTTPException(status_code=400, detail="房间内还有玩家，无法删除")
     
-    db.delete(room)
-    db.commit()
+    await db.delete(room)
+    await db.commit()
+    manager.publish_lobby(room_id, None)
     
     return {"success": True, "message": "房间删除成功"}
 
 @app.post("/api/rooms/{room_id}/join")
 async def join_room(
     room_id: int,
-    join_data: dict,
-    db: Session = Depends(get_db)
+    join_data: dict
 ):
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
+    # 房间人数只统计已入座的玩家（join-game后由牌局事件更新）
     if room.current_players >= room.max_players:
         raise HTTPException(status_code=400, detail="房间已满")
     
-    # 更新房间玩家数量
-    room.current_players += 1
-    if room.current_players == 1:
-        room.status = RoomStatus.WAITING
-    
-    db.commit()
-    
     return {
         "success": True,
         "message": "成功加入房间",
-        "room": RoomResponse(
-            id=room.id,
-            name=room.name,
-            small_blind=room.small_blind,
-            big_blind=room.big_blind,
-            max_players=room.max_players,
-            current_players=room.current_players,
-            status=room.status.value,
-            created_at=room.created_at
-        )
+        "room": RoomResponse(**room.to_dict())
     }
 
 @app.post("/api/rooms/{room_id}/leave")
 async def leave_room(
     room_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 从游戏中移除玩家
-    game = manager.game_manager.get_game(room_id)
-    if game:
-        game.remove_player(current_user.id)
-        # 更新房间玩家数量为实际游戏中的玩家数
-        room.current_players = len(game.players)
-    else:
-        # 如果没有游戏实例，直接减少玩家数
-        if room.current_players > 0:
-            room.current_players -= 1
-    
-    if room.current_players == 0:
-        room.status = RoomStatus.WAITING
-    
-    db.commit()
+    # 从游戏中移除玩家（在房间actor中执行，与WebSocket消息按顺序处理；房间人数由牌局事件更新）
+    # 与断线相同：离座可能结束本手牌或改变行动玩家，移除后广播状态并重新计时
+    await manager.run_in_room(room_id, manager._remove_from_game, room_id, current_user.id)
     
     return {"success": True, "message": "成功离开房间"}
 
 @app.get("/api/rooms/{room_id}/game-state")
 async def get_game_state(
     room_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """获取房间的游戏状态"""
-    print(f"[DEBUG API] get_game_state called: room_id={room_id}, user_id={current_user.id}")
+    logger.debug("get_game_state called: room_id=%s, user_id=%s", room_id, current_user.id)
     
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
-        print(f"[DEBUG API] Room not found for room_id: {room_id}")
+        logger.debug("Room not found for room_id: %s", room_id)
         raise HTTPException(status_code=404, detail="房间不存在")
     
     # 获取游戏实例
@@ -412,18 +468,15 @@ async def get_game_state(
     
     if not game:
         # 如果游戏不存在，创建一个新游戏
-        print(f"[DEBUG API] Creating new game for room_id: {room_id}")
+        logger.debug("Creating new game for room_id: %s", room_id)
         game = manager.game_manager.create_game(room_id, room.small_blind, room.big_blind)
     
-    # 同步房间的current_players字段与实际游戏中的玩家数量
     actual_players = len(game.players)
-    if room.current_players != actual_players:
-        room.current_players = actual_players
-        db.commit()
     
     # 获取游戏状态
     game_state = game.get_game_state(current_user.id)
-    print(f"[DEBUG API] Game state players: {[(p['user_id'], p['position']) for p in game_state.get('players', [])]}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Game state players: %s", [(p['user_id'], p['position']) for p in game_state.get('players', [])])
     
     return {
         "success": True,
@@ -434,7 +487,7 @@ async def get_game_state(
             "big_blind": room.big_blind,
             "max_players": room.max_players,
             "current_players": actual_players,
-            "status": room.status.value
+            "status": room.status
         },
         "game": {
             "id": str(room_id),
@@ -451,92 +504,113 @@ async def get_game_state(
         }
      }
 
+@app.get("/api/rooms/{room_id}/equity")
+async def get_equity(
+    room_id: int,
+    samples: int = Query(default=100_000, ge=1_000, le=1_000_000),
+    current_user: User = Depends(get_current_user)
+):
+    """获取全下后的胜率"""
+    game = manager.game_manager.get_game(room_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="游戏不存在")
+    
+    if not game.all_in_snapshot:
+        raise HTTPException(status_code=400, detail="仅在全员全下后提供胜率")
+    
+    equity = await manager.compute_all_in_equity(game, samples=samples, time_budget=2.0)
+    return {"success": True, "equity": equity}
+
 @app.post("/api/rooms/{room_id}/join-game")
 async def join_game(
     room_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """加入游戏"""
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 获取或创建游戏实例
-    game = manager.game_manager.get_game(room_id)
-    if not game:
-        game = manager.game_manager.create_game(room_id, room.small_blind, room.big_blind)
-    
-    # 检查玩家是否已经在游戏中
-    existing_player = game._get_player_by_id(current_user.id)
-    if existing_player:
+    async def add_player():
+        # 获取或创建游戏实例
+        game = manager.game_manager.get_game(room_id)
+        if not game:
+            game = manager.game_manager.create_game(room_id, room.small_blind, room.big_blind)
+        
+        # 检查玩家是否已经在游戏中
+        existing_player = game._get_player_by_id(current_user.id)
+        if existing_player:
+            return False, game.get_game_state(current_user.id)
+        
+        # 添加玩家到游戏，不指定位置（让前端通过change-seat选择）
+        success = game.add_player(current_user.id, current_user.username, current_user.chips)
+        if not success:
+            raise HTTPException(status_code=400, detail="游戏已满或无法加入")
+        return True, game.get_game_state(current_user.id)
+    
+    joined, game_state = await manager.run_in_room(room_id, add_player)
+    if not joined:
         return {
             "success": True,
             "message": "已在游戏中",
-            "game_state": game.get_game_state(current_user.id)
+            "game_state": game_state
         }
     
-    # 添加玩家到游戏，不指定位置（让前端通过change-seat选择）
-    success = game.add_player(current_user.id, current_user.username, current_user.chips)
-    if not success:
-        raise HTTPException(status_code=400, detail="游戏已满或无法加入")
-    
-    # 更新房间的current_players字段以反映实际游戏中的玩家数量
-    room.current_players = len(game.players)
-    db.commit()
-    
     return {
         "success": True,
         "message": "成功加入游戏",
-        "game_state": game.get_game_state(current_user.id)
+        "game_state": game_state
     }
 
 @app.post("/api/rooms/{room_id}/ready")
 async def set_player_ready(
     room_id: int,
     ready_data: dict,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """设置玩家准备状态"""
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 获取游戏实例
-    game = manager.game_manager.get_game(room_id)
-    if not game:
-        raise HTTPException(status_code=404, detail="游戏不存在")
-    
-    # 记录设置前的游戏状态
-    was_waiting = game.game_stage == "waiting"
-    
-    # 设置玩家准备状态
     ready = ready_data.get("ready", False)
-    success = game.set_player_ready(current_user.id, ready)
-    
-    if not success:
-        raise HTTPException(status_code=400, detail="设置准备状态失败")
-    
-    # 广播玩家准备状态变化
-    await manager.broadcast_to_room({
-        "type": "player_ready_changed",
-        "data": {
-            "user_id": current_user.id,
-            "ready": ready
-        }
-    }, room_id)
     
-    # 检查游戏是否已经自动开始
-    if was_waiting and game.game_stage != "waiting":
-        # 游戏已经自动开始，广播游戏开始消息
+    async def set_ready():
+        # 获取游戏实例
+        game = manager.game_manager.get_game(room_id)
+        if not game:
+            raise HTTPException(status_code=404, detail="游戏不存在")
+        
+        # 记录设置前的游戏状态
+        was_waiting = game.game_stage == "waiting"
+        
+        # 设置玩家准备状态
+        success = game.set_player_ready(current_user.id, ready)
+        
+        if not success:
+            raise HTTPException(status_code=400, detail="设置准备状态失败")
+        
+        # 广播玩家准备状态变化
         await manager.broadcast_to_room({
-            "type": "game_started",
-            "data": {"message": "所有玩家已准备，游戏开始！"}
+            "type": "player_ready_changed",
+            "data": {
+                "user_id": current_user.id,
+                "ready": ready
+            }
         }, room_id)
+        
+        # 检查游戏是否已经自动开始
+        if was_waiting and game.game_stage != "waiting":
+            # 游戏已经自动开始，广播游戏开始消息
+            await manager.broadcast_to_room({
+                "type": "game_started",
+                "data": {"message": "所有玩家已准备，游戏开始！"}
+            }, room_id)
+        
+        # 广播游戏状态更新到WebSocket
+        await manager.broadcast_game_state(room_id)
     
-    # 广播游戏状态更新到WebSocket
-    await manager.broadcast_game_state(room_id)
+    await manager.run_in_room(room_id, set_ready)
     
     return {
         "success": True,
@@ -548,37 +622,39 @@ async def set_player_ready(
 async def change_seat(
     room_id: int,
     seat_data: dict,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """切换座位"""
-    print(f"[DEBUG API] change_seat endpoint called: room_id={room_id}, user_id={current_user.id}, seat_data={seat_data}")
+    logger.debug("change_seat endpoint called: room_id=%s, user_id=%s, seat_data=%s", room_id, current_user.id, seat_data)
     
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
-        print(f"[DEBUG API] Room not found for room_id: {room_id}")
+        logger.debug("Room not found for room_id: %s", room_id)
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 获取游戏实例
-    game = manager.game_manager.get_game(room_id)
-    if not game:
-        print(f"[DEBUG API] Game not found for room_id: {room_id}")
-        raise HTTPException(status_code=404, detail="游戏不存在")
-    
     # 切换座位
     seat_index = seat_data.get("seat_index")
     if seat_index is None:
-        print(f"[DEBUG API] Seat index is None")
+        logger.debug("Seat index is None")
         raise HTTPException(status_code=400, detail="座位索引不能为空")
     
-    print(f"[DEBUG API] Game found, calling change_player_seat with user_id={current_user.id}, seat_index={seat_index}")
-    success = game.change_player_seat(current_user.id, seat_index)
+    async def change_player_seat():
+        # 获取游戏实例
+        game = manager.game_manager.get_game(room_id)
+        if not game:
+            logger.debug("Game not found for room_id: %s", room_id)
+            raise HTTPException(status_code=404, detail="游戏不存在")
+        
+        logger.debug("Game found, calling change_player_seat with user_id=%s, seat_index=%s", current_user.id, seat_index)
+        return game.change_player_seat(current_user.id, seat_index)
+    
+    success = await manager.run_in_room(room_id, change_player_seat)
     
     if not success:
-        print(f"[DEBUG API] Seat change failed")
+        logger.debug("Seat change failed")
         raise HTTPException(status_code=400, detail="切换座位失败，座位可能已被占用")
     
-    print(f"[DEBUG API] Seat change successful")
+    logger.debug("Seat change successful")
     return {
         "success": True,
         "message": f"成功切换到座位{seat_index + 1}",
@@ -588,29 +664,29 @@ async def change_seat(
 @app.post("/api/rooms/{room_id}/start-game")
 async def start_game(
     room_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """开始新游戏"""
-    print(f"[DEBUG API] start_game endpoint called: room_id={room_id}, user_id={current_user.id}")
+    logger.debug("start_game endpoint called: room_id=%s, user_id=%s", room_id, current_user.id)
     
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await manager.lobby.lookup(room_id)
     if not room:
-        print(f"[DEBUG API] Room not found for room_id: {room_id}")
+        logger.debug("Room not found for room_id: %s", room_id)
         raise HTTPException(status_code=404, detail="房间不存在")
     
-    # 获取游戏实例
-    game = manager.game_manager.get_game(room_id)
-    if not game:
-        print(f"[DEBUG API] Game not found for room_id: {room_id}")
-        raise HTTPException(status_code=404, detail="游戏不存在")
-    
-    # 调用开始游戏方法
-    print(f"[DEBUG API] Calling start_game method")
-    success = game.start_game()
-    
-    if success:
-        print(f"[DEBUG API] Game started successfully")
+    async def start():
+        # 获取游戏实例
+        game = manager.game_manager.get_game(room_id)
+        if not game:
+            logger.debug("Game not found for room_id: %s", room_id)
+            raise HTTPException(status_code=404, detail="游戏不存在")
+        
+        # 调用开始游戏方法
+        logger.debug("Calling start_game method")
+        if not game.start_game():
+            return None
+        
+        logger.debug("Game started successfully")
         # 广播游戏开始消息
         await manager.broadcast_to_room({
             "type": "game_started",
@@ -619,20 +695,24 @@ async def start_game(
         
         # 广播游戏状态
         await manager.broadcast_game_state(room_id)
-        
+        return game.get_game_state(current_user.id)
+    
+    game_state = await manager.run_in_room(room_id, start)
+    
+    if game_state is not None:
         return {
             "success": True,
             "message": "游戏开始成功",
-            "game_state": game.get_game_state(current_user.id)
+            "game_state": game_state
         }
     else:
-        print(f"[DEBUG API] Game start failed")
+        logger.debug("Game start failed")
         raise HTTPException(status_code=400, detail="无法开始游戏，玩家数量不足或游戏已在进行中")
 
 # WebSocket路由
 @app.websocket("/ws")
-async def websocket_route(websocket: WebSocket, token: str, db: Session = Depends(get_db)):
-    await websocket_endpoint(websocket, token, db)
+async def websocket_route(websocket: WebSocket, token: str):
+    await websocket_endpoint(websocket, token)
 
 # 根路径
 @app.get("/")
@@ -642,7 +722,7 @@ async def root():
 # 健康检查
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "德州扑克游戏后端运行正常"}
+    return {"status": "healthy", "message": "德州扑克游戏后端运行正常", "shard": SHARD_INDEX, "shard_count": SHARD_COUNT}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# bcrypt轮数（每加1耗时翻倍）；修改后旧哈希在用户下次登录时按新轮数重新计算
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 哈希线程数（bcrypt计算时释放GIL，线程池即可并行且不阻塞事件循环）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 排队和执行中的哈希任务上限，超出时直接返回503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 16)))
+# 单个客户端IP同时进行的哈希任务上限，超出时返回429
+PASSWORD_HASH_PER_CLIENT = int(os.getenv("PASSWORD_HASH_PER_CLIENT", "4"))
+
+# 密码加密配置：轮数不等于BCRYPT_ROUNDS的哈希视为需要更新
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+class PasswordHasher:
+    """在有界线程池中计算bcrypt，接口协程只等待结果
+
+    准入控制：总的排队任务数和每个客户端IP的并发数都有上限，
+    登录高峰时多余的请求立即被拒绝，而不是无限排队拖慢所有请求。
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING,
+                 per_client: int = PASSWORD_HASH_PER_CLIENT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_client = per_client
+        self.pending = 0
+        self._per_client: Dict[str, int] = {}
+        # 最近的排队时间（秒），用于计算分位数
+        self._queue_times: Deque[float] = deque(maxlen=1000)
+        self.completed = 0
+        self.rejected_busy = 0
+        self.rejected_client = 0
+        self.rehashed = 0
+
+    async def _run(self, client: Optional[str], func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected_busy += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="服务器繁忙，请稍后再试")
+        if client is not None and self._per_client.get(client, 0) >= self.per_client:
+            self.rejected_client += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="请求过于频繁，请稍后再试")
+
+        self.pending += 1
+        if client is not None:
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+        submitted = time.perf_counter()
+
+        def timed():
+            self._queue_times.append(time.perf_counter() - submitted)
+            return func(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            if client is not None:
+                remaining = self._per_client[client] - 1
+                if remaining:
+                    self._per_client[client] = remaining
+                else:
+                    del self._per_client[client]
+
+    async def hash(self, password: str, client: Optional[str] = None) -> str:
+        """生成密码哈希"""
+        return await self._run(client, pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str,
+                                client: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """验证密码；哈希参数已变化时同时返回按新参数计算的哈希"""
+        verified, new_hash = await self._run(client, pwd_context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        waits = sorted(self._queue_times)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "rounds": BCRYPT_ROUNDS,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected_busy": self.rejected_busy,
+            "rejected_client": self.rejected_client,
+            "rehashed": self.rehashed,
+            "queue_ms_p50": percentile(0.5),
+            "queue_ms_p95": percentile(0.95),
+            "queue_ms_max": percentile(1.0)
+        }
+
+password_hasher = PasswordHasher()
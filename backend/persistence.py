@@ -0,0 +1,241 @@
+import os
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List
+import msgpack
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import User, Game, GameParticipation, GameStatus
+from logger import get_logger
+
+logger = get_logger("persistence")
+
+# 待写入牌局记录上限，超出后溢出到本地文件，保证内存有界
+MAX_PENDING_HANDS = 10_000
+# 单个事务最多写入的牌局数
+BATCH_SIZE = 200
+# 写入失败的重试次数和首次退避时间（秒，每次翻倍）
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5
+# 队列已满或重试耗尽的记录追加到此文件（含筹码变化，不能丢弃），启动时和队列空闲时重放写库
+HAND_WRITER_SPILL_PATH = os.getenv("HAND_WRITER_SPILL_PATH", "hand_results_spill.bin")
+# 队列空闲时检查溢出文件的间隔（秒）
+SPILL_REPLAY_INTERVAL = 5.0
+
+class HandResultWriter:
+    """牌局结果的异步写回队列
+
+    牌局结束时只把记录放入有界队列，后台任务按批在线程中用同步会话写库，
+    写入 Game / GameParticipation 并按输赢增量更新 User 的筹码、总局数和胜率。
+    记录包含筹码变化，任何情况下都不丢弃：队列已满或重试耗尽时追加到溢出文件（fsync），
+    后台任务在启动时和队列空闲时把溢出的记录在一个事务中重放，提交成功后才删除文件。
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 max_pending: int = MAX_PENDING_HANDS, batch_size: int = BATCH_SIZE,
+                 spill_path: str = HAND_WRITER_SPILL_PATH):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.spill_path = spill_path
+        # 正在重放的溢出记录；重放期间新溢出的记录写入新的溢出文件
+        self.replay_path = spill_path + ".replay"
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        self._inflight = None  # 正在写入的批次，停止时等待其完成而不是取消
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failed = 0
+        self.retries = 0
+        # 一批记录写入成功后的回调（如按参与者失效身份缓存）
+        self.written_listeners: List[Callable[[List[Dict]], None]] = []
+
+    def submit(self, record: Dict) -> bool:
+        """放入一手牌的记录（PokerGameManager.hand_complete_listeners回调），不等待写库"""
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("牌局记录队列已满，房间 %s 的牌局记录写入溢出文件", record.get('room_id'))
+            self._spill([record])
+            return False
+
+    def _spill(self, records: List[Dict]):
+        """追加到溢出文件并落盘"""
+        with open(self.spill_path, "ab") as f:
+            for record in records:
+                f.write(msgpack.packb(record, use_bin_type=True))
+            f.flush()
+            os.fsync(f.fileno())
+        self.spilled += len(records)
+
+    def _claim_spilled(self) -> List[Dict]:
+        """取出待重放的溢出记录：溢出文件并入重放文件（上次未完成的重放一并读取）"""
+        if os.path.exists(self.spill_path):
+            if os.path.exists(self.replay_path):
+                with open(self.spill_path, "rb") as src, open(self.replay_path, "ab") as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.spill_path)
+            else:
+                os.replace(self.spill_path, self.replay_path)
+        if not os.path.exists(self.replay_path):
+            return []
+        records = []
+        with open(self.replay_path, "rb") as f:
+            unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+            try:
+                for record in unpacker:
+                    records.append(record)
+            except ValueError:
+                # 追加时断电可能留下不完整的末尾记录
+                logger.error("溢出文件 %s 末尾记录不完整，已跳过", self.replay_path)
+        return records
+
+    async def replay_spilled(self) -> bool:
+        """把溢出的记录在一个事务中写库，成功后删除重放文件；失败时保留文件等待下次重放"""
+        records = self._claim_spilled()
+        if not records:
+            return True
+        try:
+            await asyncio.to_thread(self._write_batch, records)
+        except Exception as e:
+            logger.warning("重放 %s 手溢出的牌局记录失败: %s", len(records), e)
+            return False
+        os.remove(self.replay_path)
+        self.replayed += len(records)
+        self.written += len(records)
+        for listener in self.written_listeners:
+            listener(records)
+        logger.info("已重放 %s 手溢出的牌局记录", len(records))
+        return True
+
+    def _has_spilled(self) -> bool:
+        return os.path.exists(self.spill_path) or os.path.exists(self.replay_path)
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写完队列中剩余的记录"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await self._inflight
+            self._inflight = None
+        while not self.queue.empty():
+            await self._write_with_retry(self._take_batch())
+        if self._has_spilled():
+            await self.replay_spilled()
+        logger.info("牌局记录队列已清空，共写入 %s 手", self.written)
+
+    def _take_batch(self) -> List[Dict]:
+        batch = []
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            if self._has_spilled() and self.queue.empty():
+                self._inflight = asyncio.create_task(self.replay_spilled())
+                await asyncio.shield(self._inflight)
+                self._inflight = None
+            try:
+                first = await asyncio.wait_for(self.queue.get(), SPILL_REPLAY_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            batch = [first]
+            batch.extend(self._take_batch())
+            self._inflight = asyncio.create_task(self._write_with_retry(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _write_with_retry(self, batch: List[Dict]):
+        delay = RETRY_BACKOFF
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                # 在线程中执行，写库不阻塞事件循环
+                await asyncio.to_thread(self._write_batch, batch)
+                self.written += len(batch)
+                for listener in self.written_listeners:
+                    listener(batch)
+                return
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    break
+                self.retries += 1
+                logger.warning("写入 %s 手牌局记录失败（第%s次）: %s", len(batch), attempt + 1, e)
+                await asyncio.sleep(delay)
+                delay *= 2
+        self.failed += len(batch)
+        logger.error("%s 手牌局记录写入失败，已写入溢出文件等待重放", len(batch))
+        self._spill(batch)
+
+    def _write_batch(self, batch: List[Dict]):
+        """一个事务写入一批牌局记录"""
+        db = self.session_factory()
+        try:
+            for record in batch:
+                game = Game(
+                    room_id=record['room_id'],
+                    status=GameStatus.FINISHED,
+                    pot=record['pot'],
+                    community_cards=record['community_cards'],
+                    dealer_position=record['dealer_position'],
+                    created_at=datetime.utcfromtimestamp(record['started_at']),
+                    finished_at=datetime.utcfromtimestamp(record['finished_at'])
+                )
+                db.add(game)
+                db.flush()
+
+                for participant in record['participants']:
+                    db.add(GameParticipation(
+                        game_id=game.id,
+                        user_id=participant['user_id'],
+                        position=participant['position'],
+                        hole_cards=participant['hole_cards'],
+                        chips_at_start=participant['chips_at_start'],
+                        chips_at_end=participant['chips_at_end'],
+                        is_folded=participant['is_folded'],
+                        is_all_in=participant['is_all_in'],
+                        total_bet=participant['total_bet']
+                    ))
+
+                    # 增量更新，避免覆盖API同时对筹码的修改；
+                    # 同一条UPDATE中右侧均取旧值，胜率（百分比）按旧的总局数滚动计算
+                    won = 100.0 if participant['win_amount'] > participant['total_bet'] else 0.0
+                    db.execute(
+                        update(User)
+                        .where(User.id == participant['user_id'])
+                        .values(
+                            chips=User.chips + (participant['chips_at_end'] - participant['chips_at_start']),
+                            total_games=User.total_games + 1,
+                            win_rate=(User.win_rate * User.total_games + won) / (User.total_games + 1)
+                        )
+                    )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "failed": self.failed,
+            "retries": self.retries
+        }
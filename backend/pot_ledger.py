@@ -0,0 +1,162 @@
+from typing import List, Dict, Optional, Set
+
+class Pot:
+    """一个奖池层：收取玩家累计投入在 (floor, cap] 区间内的筹码"""
+
+    def __init__(self, floor: int, cap: Optional[int] = None):
+        self.floor = floor
+        self.cap = cap  # None表示未封顶（当前正在下注的层）
+        self.contributions: Dict[int, int] = {}
+        self.eligible: Set[int] = set()  # 有资格赢得该层的玩家（已投入且未弃牌）
+
+    @property
+    def amount(self) -> int:
+        return sum(self.contributions.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            'amount': self.amount,
+            'cap': self.cap,
+            'eligible': sorted(self.eligible)
+        }
+
+class PotLedger:
+    """奖池账本：下注时增量维护主池和边池，摊牌时一次遍历完成结算"""
+
+    def __init__(self):
+        self.pots: List[Pot] = []
+        self.totals: Dict[int, int] = {}  # 每位玩家本手累计投入
+        self.folded: Set[int] = set()
+        self.reset()
+
+    def reset(self):
+        """新一手牌开始时清空"""
+        self.pots = [Pot(0)]
+        self.totals = {}
+        self.folded = set()
+
+    @property
+    def total(self) -> int:
+        return sum(self.totals.values())
+
+    def add(self, user_id: int, amount: int, all_in: bool = False):
+        """记录一次下注；全下时在该玩家的累计投入处封顶，切出边池"""
+        if amount <= 0 and not all_in:
+            return
+
+        before = self.totals.get(user_id, 0)
+        after = before + amount
+        self.totals[user_id] = after
+
+        for pot in self.pots:
+            upper = after if pot.cap is None else min(after, pot.cap)
+            part = upper - max(before, pot.floor)
+            if part > 0:
+                pot.contributions[user_id] = pot.contributions.get(user_id, 0) + part
+                if user_id not in self.folded:
+                    pot.eligible.add(user_id)
+
+        if all_in:
+            self._split_at(after)
+
+    def fold(self, user_id: int):
+        """弃牌：已投入的筹码留在池中，但不再有资格赢取"""
+        self.folded.add(user_id)
+        for pot in self.pots:
+            pot.eligible.discard(user_id)
+
+    def _split_at(self, level: int):
+        """在累计投入level处把所在的奖池层一分为二"""
+        for index, pot in enumerate(self.pots):
+            if level <= pot.floor or (pot.cap is not None and level >= pot.cap):
+                continue
+
+            upper = Pot(level, pot.cap)
+            pot.cap = level
+            width = level - pot.floor
+            for user_id, contribution in list(pot.contributions.items()):
+                excess = contribution - width
+                if excess > 0:
+                    pot.contributions[user_id] = width
+                    upper.contributions[user_id] = excess
+                    if user_id not in self.folded:
+                        upper.eligible.add(user_id)
+            self.pots.insert(index + 1, upper)
+            return
+
+    def to_snapshot(self) -> Dict:
+        """可序列化的账本状态（用于牌桌快照）"""
+        return {
+            'pots': [
+                {'floor': pot.floor, 'cap': pot.cap, 'contributions': pot.contributions, 'eligible': sorted(pot.eligible)}
+                for pot in self.pots
+            ],
+            'totals': self.totals,
+            'folded': sorted(self.folded)
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: Dict) -> "PotLedger":
+        ledger = cls()
+        ledger.pots = []
+        for item in data['pots']:
+            pot = Pot(item['floor'], item['cap'])
+            pot.contributions = dict(item['contributions'])
+            pot.eligible = set(item['eligible'])
+            ledger.pots.append(pot)
+        ledger.totals = dict(data['totals'])
+        ledger.folded = set(data['folded'])
+        return ledger
+
+    def summary(self) -> List[Dict]:
+        """非空奖池列表，第一个为主池，其余为边池"""
+        return [pot.to_dict() for pot in self.pots if pot.contributions]
+
+    def settle(self, strengths: Dict[int, int], seat_order: List[int]) -> Dict:
+        """按手牌强度结算所有奖池
+
+        strengths: {user_id: 手牌强度}，只包含未弃牌的玩家（为空时各层退还给投入者）；
+        seat_order: 从庄家左手边开始的座位顺序，平分时零头筹码按此顺序分配。
+        返回 {'payouts': {user_id: 赢得或退还的筹码}, 'pots': [每个奖池的结算明细]}
+        """
+        order = {user_id: i for i, user_id in enumerate(seat_order)}
+        payouts = {user_id: 0 for user_id in strengths}
+        pot_results = []
+
+        for pot in self.pots:
+            amount = pot.amount
+            if amount == 0:
+                continue
+
+            contenders = [user_id for user_id in pot.eligible if user_id in strengths]
+            if not contenders:
+                # 该层投入者都已弃牌，归仍在局中的最强玩家
+                contenders = list(strengths)
+            if not contenders:
+                # 没有玩家还在局中（如所有人都已离座），该层退还给投入者
+                for user_id, contribution in pot.contributions.items():
+                    payouts[user_id] = payouts.get(user_id, 0) + contribution
+                pot_results.append({
+                    'amount': amount,
+                    'winners': [],
+                    'refunded': sorted(pot.contributions),
+                    'eligible': sorted(pot.eligible)
+                })
+                continue
+            best = max(strengths[user_id] for user_id in contenders)
+            winners = sorted(
+                (user_id for user_id in contenders if strengths[user_id] == best),
+                key=lambda user_id: order.get(user_id, len(order))
+            )
+
+            share, odd_chips = divmod(amount, len(winners))
+            for i, user_id in enumerate(winners):
+                payouts[user_id] += share + (1 if i < odd_chips else 0)
+
+            pot_results.append({
+                'amount': amount,
+                'winners': winners,
+                'eligible': sorted(pot.eligible)
+            })
+
+        return {'payouts': payouts, 'pots': pot_results}
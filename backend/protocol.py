@@ -0,0 +1,144 @@
+"""
+WebSocket消息编码：默认JSON文本帧，可协商为msgpack二进制帧
+
+两种编码共用同一份消息定义（MESSAGE_TYPES和CARD_FIELDS）：
+- JSON帧：{"type": "game_state", "data": {...}}，牌为 {"suit", "rank", "display"} 字典；
+- 二进制帧：msgpack编码的 [类型编号, data]，类型编号为消息类型在MESSAGE_TYPES中的下标，
+  CARD_FIELDS字段中的牌换成整数牌ID（(点数-2)*4 + 花色序号，与game_logic一致），其余字段不变。
+
+客户端通过查询参数 ?protocol=msgpack 或子协议 poker.msgpack 选择二进制编码，二进制连接上
+客户端发出的消息也使用同样的二进制帧。
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect
+from game_logic import card_to_dict, card_to_str
+
+JSON = "json"
+MSGPACK = "msgpack"
+PROTOCOLS = (JSON, MSGPACK)
+# 子协议名：poker.json / poker.msgpack
+SUBPROTOCOL_PREFIX = "poker."
+
+# 消息类型表，只能在末尾追加（类型编号即下标，已发布的客户端依赖这些编号）
+MESSAGE_TYPES = (
+    # 客户端 -> 服务器
+    "join_room",
+    "leave_room",
+    "watch_room",
+    "unwatch_room",
+    "subscribe_lobby",
+    "unsubscribe_lobby",
+    "game_action",
+    "start_game",
+    "player_ready",
+    "chat",
+    "sync_state",
+    "show_cards",
+    "ping",
+    # 服务器 -> 客户端（game_action、show_cards与上面共用编号）
+    "pong",
+    "error",
+    "game_state",
+    "game_state_patch",
+    "spectator_state",
+    "game_started",
+    "game_results",
+    "player_joined",
+    "player_left",
+    "player_ready_changed",
+    "chat_message",
+    "lobby_snapshot",
+    "lobby_update",
+    "action_clock",
+    "action_timeout",
+    "next_hand_countdown",
+)
+TYPE_CODES: Dict[str, int] = {name: code for code, name in enumerate(MESSAGE_TYPES)}
+
+# 值为牌列表的字段（任意嵌套层级）
+CARD_FIELDS = frozenset(("hole_cards", "community_cards", "cards"))
+
+_CARD_IDS: Dict[str, int] = {card_to_str(card_id): card_id for card_id in range(52)}
+
+# 房间广播的同一份文本发给多个二进制连接，只转换一次
+_BINARY_CACHE_SIZE = 256
+_binary_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+def _pack_cards(value: Any) -> Any:
+    """把CARD_FIELDS中的牌字典换成整数牌ID"""
+    if isinstance(value, dict):
+        return {
+            key: [_CARD_IDS[card["display"]] if isinstance(card, dict) else card for card in item]
+            if key in CARD_FIELDS and isinstance(item, list) else _pack_cards(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_pack_cards(item) for item in value]
+    return value
+
+def _unpack_cards(value: Any) -> Any:
+    """把CARD_FIELDS中的整数牌ID还原为牌字典"""
+    if isinstance(value, dict):
+        return {
+            key: [card_to_dict(card) if isinstance(card, int) else card for card in item]
+            if key in CARD_FIELDS and isinstance(item, list) else _unpack_cards(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_unpack_cards(item) for item in value]
+    return value
+
+def encode(message: Dict) -> bytes:
+    """消息编码为二进制帧"""
+    code = TYPE_CODES.get(message.get("type"))
+    if code is None:
+        raise ValueError(f"未定义的消息类型: {message.get('type')}")
+    return msgpack.packb([code, _pack_cards(message.get("data", {}))], use_bin_type=True)
+
+def decode(payload: bytes) -> Dict:
+    """二进制帧解码为与JSON帧相同的消息字典"""
+    frame = msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if not isinstance(frame, list) or len(frame) != 2 or not isinstance(frame[0], int) \
+            or not 0 <= frame[0] < len(MESSAGE_TYPES):
+        raise ValueError("无效的二进制消息帧")
+    return {"type": MESSAGE_TYPES[frame[0]], "data": _unpack_cards(frame[1])}
+
+def text_to_binary(text: str) -> bytes:
+    """已序列化的JSON消息转换为二进制帧（带小缓存）"""
+    payload = _binary_cache.get(text)
+    if payload is None:
+        payload = encode(json.loads(text))
+        _binary_cache[text] = payload
+        if len(_binary_cache) > _BINARY_CACHE_SIZE:
+            _binary_cache.popitem(last=False)
+    else:
+        _binary_cache.move_to_end(text)
+    return payload
+
+def negotiate(websocket: WebSocket) -> Tuple[Optional[str], Optional[str]]:
+    """从查询参数protocol或子协议中选择编码
+
+    返回 (编码, 接受连接时回应的子协议)；请求了不支持的编码时编码为None。
+    查询参数优先，都没有时使用JSON。
+    """
+    requested = websocket.query_params.get("protocol")
+    if requested is not None:
+        return (requested, None) if requested in PROTOCOLS else (None, None)
+    for subprotocol in websocket.scope.get("subprotocols") or ():
+        name = subprotocol[len(SUBPROTOCOL_PREFIX):] if subprotocol.startswith(SUBPROTOCOL_PREFIX) else None
+        if name in PROTOCOLS:
+            return name, subprotocol
+    return JSON, None
+
+async def receive_frame(websocket: WebSocket) -> Union[str, bytes]:
+    """接收一帧客户端消息：文本帧返回str（JSON），二进制帧返回bytes（msgpack）"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message["text"]
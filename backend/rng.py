@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+from logger import get_logger
+
+logger = get_logger("rng")
+
+# 设置后所有牌桌使用确定性种子（由主种子、房间号和手数派生），只用于模拟和测试
+DECK_RNG_SEED = os.getenv("DECK_RNG_SEED")
+# 安全模式下一次从操作系统取出的种子数
+SEED_BATCH_SIZE = 256
+SEED_BYTES = 32
+
+def shuffle_from_seed(seed: bytes) -> List[int]:
+    """由种子确定性地生成牌堆顺序（从末尾发牌）
+
+    SHAKE-256输出的字节流驱动Fisher-Yates洗牌，每次取2字节并拒绝超出范围的值以避免取模偏差。
+    只依赖标准哈希算法，玩家拿到公开的种子后可以用任何语言复算整副牌。
+    """
+    length = 256
+    stream = hashlib.shake_256(seed).digest(length)
+    offset = 0
+    cards = list(range(52))
+    for i in range(51, 0, -1):
+        bound = i + 1
+        limit = 65536 - 65536 % bound
+        while True:
+            if offset + 2 > length:
+                # 同一输入的更长输出以原输出为前缀，接着往后取即可
+                length *= 2
+                stream = hashlib.shake_256(seed).digest(length)
+            value = stream[offset] << 8 | stream[offset + 1]
+            offset += 2
+            if value < limit:
+                break
+        j = value % bound
+        cards[i], cards[j] = cards[j], cards[i]
+    return cards
+
+def seed_commitment(seed: bytes) -> str:
+    """开局前公布的种子承诺"""
+    return hashlib.sha256(seed).hexdigest()
+
+def verify_deck(seed: bytes, commitment: str, deck_order: Optional[List[int]] = None) -> bool:
+    """核对公开的种子与开局前的承诺（及记录的牌堆顺序）是否一致"""
+    if seed_commitment(seed) != commitment:
+        return False
+    return deck_order is None or shuffle_from_seed(seed) == list(deck_order)
+
+class SeedPool:
+    """进程内共享的安全种子池：按批从os.urandom取随机字节，减少系统调用"""
+
+    def __init__(self, batch_size: int = SEED_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._seeds: List[bytes] = []
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def take(self) -> bytes:
+        with self._lock:
+            if not self._seeds:
+                block = os.urandom(SEED_BYTES * self.batch_size)
+                self._seeds = [block[i:i + SEED_BYTES] for i in range(0, len(block), SEED_BYTES)]
+                self.batches += 1
+            return self._seeds.pop()
+
+seed_pool = SeedPool()
+
+@dataclass
+class HandSeed:
+    seed: bytes
+    commitment: str
+    deck: List[int]
+
+class TableRng:
+    """单张牌桌的发牌随机源
+
+    每手牌使用独立的种子：开局前公布 sha256(种子)，牌局结束后公开种子，
+    玩家可以据此验证发牌。下一手的种子和洗好的牌在两手之间提前准备（prepare），
+    开局时直接取用（draw），不在玩家操作路径上洗牌。
+    master_seed为None时种子来自操作系统的安全随机数，否则由主种子确定性派生。
+    """
+
+    def __init__(self, room_id: int, master_seed: Optional[str] = DECK_RNG_SEED,
+                 hands_drawn: int = 0, upcoming_seed: Optional[bytes] = None):
+        self.room_id = room_id
+        self.master_seed = master_seed
+        self.hands_drawn = hands_drawn
+        self._upcoming: Optional[HandSeed] = None
+        if upcoming_seed is not None:
+            # 从快照恢复已公布承诺的下一手种子
+            self._upcoming = HandSeed(upcoming_seed, seed_commitment(upcoming_seed), shuffle_from_seed(upcoming_seed))
+
+    def _next_seed(self) -> bytes:
+        if self.master_seed is None:
+            return seed_pool.take()
+        return hashlib.sha256(f"{self.master_seed}:{self.room_id}:{self.hands_drawn}".encode()).digest()
+
+    def prepare(self) -> HandSeed:
+        """准备（或返回已准备好的）下一手牌的种子和牌堆"""
+        if self._upcoming is None:
+            seed = self._next_seed()
+            self._upcoming = HandSeed(seed, seed_commitment(seed), shuffle_from_seed(seed))
+        return self._upcoming
+
+    @property
+    def upcoming_seed(self) -> Optional[bytes]:
+        return self._upcoming.seed if self._upcoming else None
+
+    def draw(self) -> HandSeed:
+        """取出下一手牌使用的种子和牌堆"""
+        hand_seed = self.prepare()
+        self._upcoming = None
+        self.hands_drawn += 1
+        return hand_seed
+
+if DECK_RNG_SEED is not None:
+    logger.warning("DECK_RNG_SEED已设置，发牌为确定性模式，不能用于真实牌局")
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from logger import get_logger
+
+logger = get_logger("room_actor")
+
+class RoomActor:
+    """单个房间的actor：一个asyncio任务按到达顺序逐条执行命令
+
+    所有修改该房间牌局的操作（WebSocket消息、REST接口、延迟重置、断线移除）都作为命令
+    放入队列，前一条命令（包括其中的await）执行完之前不会开始下一条，同一房间的状态变更
+    不会交错。命令内部再次调用本房间的actor时直接执行，避免自己等待自己造成死锁。
+    """
+
+    def __init__(self, room_id: int):
+        self.room_id = room_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.failed = 0
+        self.max_wait = 0.0  # 命令在队列中等待的最长时间（秒）
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def in_actor(self) -> bool:
+        """当前是否正在本actor的任务中执行"""
+        return self._task is not None and asyncio.current_task() is self._task
+
+    def submit(self, command: Callable[..., Awaitable[Any]], *args) -> asyncio.Future:
+        """放入一条命令，不等待执行；返回结果的future"""
+        future = asyncio.get_running_loop().create_future()
+        self.start()
+        self.queue.put_nowait((command, args, future, time.perf_counter()))
+        return future
+
+    def post(self, command: Callable[..., Awaitable[Any]], *args):
+        """放入一条没有调用者等待结果的命令，异常只记录日志"""
+        self.submit(command, *args).add_done_callback(self._log_failure)
+
+    async def call(self, command: Callable[..., Awaitable[Any]], *args) -> Any:
+        """执行一条命令并等待结果，命令抛出的异常原样抛给调用者"""
+        if self.in_actor():
+            return await command(*args)
+        return await self.submit(command, *args)
+
+    def _log_failure(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("房间 %s 的命令执行失败", self.room_id, exc_info=future.exception())
+
+    async def _run(self):
+        while True:
+            command, args, future, queued_at = await self.queue.get()
+            self.max_wait = max(self.max_wait, time.perf_counter() - queued_at)
+            if future.cancelled():
+                continue
+            try:
+                result = await command(*args)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+                continue
+            self.processed += 1
+            if not future.cancelled():
+                future.set_result(result)
+
+    async def stop(self):
+        """取消actor任务，队列中未执行的命令一并取消"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self.queue.empty():
+            _, _, future, _ = self.queue.get_nowait()
+            future.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "room_id": self.room_id,
+            "queued": self.queue.qsize(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "max_wait_ms": round(self.max_wait * 1000, 2)
+        }
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片部署的路由进程
+
+房间按 sharding.shard_for_room 分配到各工作进程（main:app，SHARD_INDEX区分），路由进程对外监听：
+- /api/rooms/{room_id}/... 转发到房间所属分片，其余HTTP请求（认证、用户、房间列表等只读写数据库）转发到0号分片；
+- /ws 由路由进程接受，按客户端消息中的room_id转发到所属分片，每个分片按需建立一条上游连接，
+  上游下发的消息原样转给客户端（不解析）。没有room_id的消息（如心跳）发往最近使用的分片。
+  客户端协商的消息编码（protocol.negotiate）带到上游连接，文本帧和二进制帧都原样转发。
+"""
+
+import json
+import asyncio
+from typing import Dict, List, Optional, Union
+from urllib.parse import quote
+import httpx
+import websockets
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
+from auth import verify_token
+from protocol import JSON, negotiate, decode, receive_frame
+from sharding import SHARD_COUNT, shard_for_room, room_from_path, shard_address
+from logger import get_logger
+
+logger = get_logger("router")
+
+# 不透传的逐跳头（长度和编码由转发后的响应重新确定）
+_HOP_HEADERS = {"host", "connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding", "upgrade"}
+
+app = FastAPI(title="德州扑克分片路由")
+http_client: Optional[httpx.AsyncClient] = None
+
+@app.on_event("startup")
+async def open_http_client():
+    global http_client
+    http_client = httpx.AsyncClient(timeout=30.0)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+@app.get("/router/shards")
+async def shard_status():
+    """各分片的健康状态"""
+    async def check(index: int) -> Dict:
+        try:
+            response = await http_client.get(f"http://{shard_address(index)}/health", timeout=2.0)
+            return {"shard": index, "address": shard_address(index), "healthy": response.status_code == 200}
+        except httpx.HTTPError as e:
+            return {"shard": index, "address": shard_address(index), "healthy": False, "error": str(e)}
+
+    return {"shard_count": SHARD_COUNT, "shards": await asyncio.gather(*(check(i) for i in range(SHARD_COUNT)))}
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+async def proxy(path: str, request: Request):
+    """HTTP请求转发到所属分片"""
+    room_id = room_from_path(request.url.path)
+    shard = shard_for_room(room_id) if room_id is not None else 0
+    try:
+        upstream = await http_client.request(
+            request.method,
+            f"http://{shard_address(shard)}{request.url.path}",
+            params=request.query_params,
+            headers=[(key, value) for key, value in request.headers.items()
+                     if key.lower() not in _HOP_HEADERS and key.lower() != "x-forwarded-for"]
+                    + [("x-forwarded-for", request.client.host if request.client else "")],
+            content=await request.body()
+        )
+    except httpx.HTTPError as e:
+        logger.error("转发到分片 %s 失败: %s", shard, e)
+        return JSONResponse(status_code=502, content={"detail": f"分片 {shard} 不可用"})
+
+    response = Response(upstream.content, status_code=upstream.status_code)
+    for key, value in upstream.headers.multi_items():
+        if key.lower() not in _HOP_HEADERS:
+            response.headers.append(key, value)
+    return response
+
+class ShardedSession:
+    """一个客户端WebSocket连接及其在各分片上的上游连接"""
+
+    def __init__(self, websocket: WebSocket, token: str, protocol: str = JSON):
+        self.websocket = websocket
+        self.token = token
+        self.protocol = protocol
+        self.upstreams: Dict[int, websockets.WebSocketClientProtocol] = {}
+        self.pumps: List[asyncio.Task] = []
+        self.current_shard = 0
+        self.closed = False
+        self._send_lock = asyncio.Lock()  # 多个上游同时下发时串行写客户端
+
+    async def upstream(self, shard: int) -> websockets.WebSocketClientProtocol:
+        connection = self.upstreams.get(shard)
+        if connection is None:
+            connection = await websockets.connect(
+                f"ws://{shard_address(shard)}/ws?token={quote(self.token)}&protocol={self.protocol}", max_size=None
+            )
+            self.upstreams[shard] = connection
+            self.pumps.append(asyncio.create_task(self._pump(connection)))
+        return connection
+
+    async def _pump(self, connection: websockets.WebSocketClientProtocol):
+        """上游消息原样转给客户端；上游关闭（拒绝token、分片重启、慢连接被断开）时以相同关闭码关闭客户端"""
+        try:
+            async for message in connection:
+                async with self._send_lock:
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.warning("转发上游消息失败: %s", e)
+        if not self.closed:
+            self.closed = True
+            try:
+                await self.websocket.close(code=connection.close_code or 1011)
+            except Exception:
+                pass
+
+    async def route(self, payload: Union[str, bytes]):
+        """按消息中的room_id选择分片转发（二进制帧按msgpack解码后查找room_id）"""
+        try:
+            message = decode(payload) if isinstance(payload, bytes) else json.loads(payload)
+            room_id = (message.get("data") or {}).get("room_id")
+            if room_id:
+                self.current_shard = shard_for_room(int(room_id))
+        except (ValueError, TypeError, AttributeError):
+            # 无法解析的帧或room_id仍转发到当前分片，由分片的校验返回错误消息
+            pass
+        connection = await self.upstream(self.current_shard)
+        await connection.send(payload)
+
+    async def close(self, code: int):
+        """客户端断开：以客户端的关闭码关闭所有上游（1012时分片保留座位）"""
+        self.closed = True
+        for task in self.pumps:
+            task.cancel()
+        await asyncio.gather(*(connection.close(code=code) for connection in self.upstreams.values()),
+                             return_exceptions=True)
+
+@app.websocket("/ws")
+async def websocket_route(websocket: WebSocket, token: str):
+    # 与工作进程一致，token无效时拒绝连接（客户端据此不再重连）
+    if not verify_token(token):
+        await websocket.close(code=4001, reason="Invalid token")
+        return
+    protocol, subprotocol = negotiate(websocket)
+    if protocol is None:
+        await websocket.close(code=4003, reason="Unsupported protocol")
+        return
+    
+    await websocket.accept(subprotocol=subprotocol)
+    session = ShardedSession(websocket, token, protocol)
+    close_code = 1000
+    try:
+        # 先连上0号分片，用户不存在等错误在建立连接时就能发现
+        await session.upstream(0)
+        while True:
+            await session.route(await receive_frame(websocket))
+    except WebSocketDisconnect as e:
+        close_code = e.code
+    except (OSError, websockets.WebSocketException) as e:
+        logger.error("连接分片失败: %s", e)
+        close_code = 1011
+        try:
+            await websocket.close(code=close_code)
+        except Exception:
+            pass
+    finally:
+        await session.close(close_code)
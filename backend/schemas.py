@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -111,6 +111,29 @@ class WSMessage(BaseModel):
     type: str  # join_room, leave_room, game_action, game_state, chat
     data: dict
 
+# WebSocket入站消息的data（由dispatcher注册，未列出的多余字段忽略）
+class EmptyData(BaseModel):
+    pass
+
+class RoomData(BaseModel):
+    room_id: int = Field(..., gt=0)
+
+class GameActionData(RoomData):
+    action: Literal["fold", "check", "call", "raise", "all_in"]
+    amount: int = Field(default=0, ge=0)
+
+class PlayerReadyData(RoomData):
+    ready: bool = False
+
+class ChatData(RoomData):
+    message: str = Field(..., min_length=1, max_length=500)
+
+class LobbyFilterData(BaseModel):
+    status: Optional[Literal["waiting", "playing", "finished"]] = None
+    min_big_blind: Optional[int] = Field(default=None, ge=0)
+    max_big_blind: Optional[int] = Field(default=None, ge=0)
+    min_free_seats: int = Field(default=0, ge=0)
+
 class ChatMessage(BaseModel):
     user_id: int
     username: str
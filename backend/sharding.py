@@ -0,0 +1,32 @@
+import os
+import re
+import zlib
+from typing import Optional
+
+# 分片部署：房间按哈希分配到SHARD_COUNT个工作进程，每个进程只承载自己的房间
+# 单进程部署时SHARD_COUNT为1，所有房间都属于本进程
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+# 工作进程监听 SHARD_HOST:SHARD_BASE_PORT+分片号，由路由进程转发
+SHARD_HOST = os.getenv("SHARD_HOST", "127.0.0.1")
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "8001"))
+
+_ROOM_PATH = re.compile(r"^/api/rooms/(\d+)(?:/|$)")
+
+def shard_for_room(room_id: int, shard_count: int = SHARD_COUNT) -> int:
+    """房间所属的分片号（稳定哈希，与进程和启动顺序无关）"""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(str(room_id).encode()) % shard_count
+
+def owns_room(room_id: int) -> bool:
+    """房间是否由本进程承载"""
+    return shard_for_room(room_id) == SHARD_INDEX
+
+def room_from_path(path: str) -> Optional[int]:
+    """从 /api/rooms/{room_id}/... 路径中取出房间号"""
+    match = _ROOM_PATH.match(path)
+    return int(match.group(1)) if match else None
+
+def shard_address(index: int) -> str:
+    return f"{SHARD_HOST}:{SHARD_BASE_PORT + index}"
@@ -0,0 +1,66 @@
+import os
+import json
+import asyncio
+from typing import Callable, Dict, Optional, Set
+from logger import get_logger
+
+logger = get_logger("spectator")
+
+# 观战帧延迟（秒），防止观众把实时牌局信息透露给在座玩家；0为不延迟
+SPECTATOR_DELAY = float(os.getenv("SPECTATOR_DELAY", "0"))
+# 观战帧的消息类型（发送队列中只保留同房间最新的一帧）
+SPECTATOR_FRAME = "spectator_state"
+
+def public_frame(game) -> Dict:
+    """不含任何手牌的公共状态；牌局结束时带上摊牌结果"""
+    state = game.get_game_state()
+    if game.game_stage == "finished" and game.game_results:
+        state["game_results"] = game.game_results
+    return state
+
+class SpectatorFeed:
+    """一个房间的观战数据
+
+    每个状态版本（PokerGame.state_version）只生成并序列化一次完整公共帧，
+    由publish广播给所有观众共享同一份文本；观众不占座位，也不接收玩家的增量和聊天。
+    """
+
+    def __init__(self, room_id: int, publish: Callable[[str], None], delay: float = SPECTATOR_DELAY):
+        self.room_id = room_id
+        self.publish = publish
+        self.delay = delay
+        # 本节点的观众
+        self.watchers: Set[int] = set()
+        # 最近一次已放出的帧（新观众加入时直接发送）
+        self.frame: Optional[str] = None
+        self.version = -1
+        self.frames_built = 0
+        self.frames_released = 0
+
+    def update(self, game):
+        """状态版本变化时生成新帧，按延迟放出"""
+        if game.state_version == self.version:
+            return
+        self.version = game.state_version
+        text = json.dumps({"type": SPECTATOR_FRAME, "data": public_frame(game)})
+        self.frames_built += 1
+        if self.delay > 0:
+            asyncio.get_running_loop().call_later(self.delay, self._release, text)
+        else:
+            self._release(text)
+
+    def _release(self, text: str):
+        self.frames_released += 1
+        try:
+            self.publish(text)
+        except Exception as e:
+            logger.error("房间 %s 观战帧发布失败: %s", self.room_id, e)
+
+    def stats(self) -> Dict:
+        return {
+            "room_id": self.room_id,
+            "watchers": len(self.watchers),
+            "version": self.version,
+            "frames_built": self.frames_built,
+            "frames_released": self.frames_released
+        }
@@ -2,28 +2,82 @@
 # -*- coding: utf-8 -*-
 """
 德州扑克游戏后端启动脚本
+
+python start.py               单进程（开发模式，自动重载）
+python start.py --workers 4   分片模式：4个工作进程各承载一部分房间，路由进程监听8000端口
 """
 
 import uvicorn
 import os
+import sys
+import signal
+import argparse
+import subprocess
 from pathlib import Path
 
 # 设置工作目录
 backend_dir = Path(__file__).parent
 os.chdir(backend_dir)
 
+def start_workers(count: int, base_port: int, host: str):
+    """启动count个分片工作进程，各自使用独立的牌桌快照和牌局历史文件"""
+    table_store, ext = os.path.splitext(os.getenv("TABLE_STORE_PATH", "table_state.db"))
+    hand_history_dir = os.getenv("HAND_HISTORY_DIR", "hand_history")
+    workers = []
+    for index in range(count):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(count),
+            SHARD_INDEX=str(index),
+            SHARD_HOST=host,
+            SHARD_BASE_PORT=str(base_port),
+            TABLE_STORE_PATH=f"{table_store}-{index}{ext}",
+            HAND_HISTORY_DIR=os.path.join(hand_history_dir, f"shard-{index}")
+        )
+        workers.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--host", host, "--port", str(base_port + index), "--log-level", "warning"],
+            env=env
+        ))
+        print(f"分片 {index}: http://{host}:{base_port + index}")
+    return workers
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="德州扑克游戏后端")
+    parser.add_argument("--workers", type=int, default=1, help="分片工作进程数，大于1时启用分片模式")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-base-port", type=int, default=8001)
+    args = parser.parse_args()
+    
     print("正在启动德州扑克游戏后端服务器...")
     print(f"工作目录: {backend_dir}")
-    print("服务器地址: http://localhost:8000")
-    print("API文档: http://localhost:8000/docs")
-    print("WebSocket连接: ws://localhost:8000/ws")
+    print(f"服务器地址: http://localhost:{args.port}")
+    print(f"API文档: http://localhost:{args.port}/docs")
+    print(f"WebSocket连接: ws://localhost:{args.port}/ws")
     print("-" * 50)
     
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    if args.workers <= 1:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
+        sys.exit(0)
+    
+    # 路由进程和工作进程读取同一组分片配置
+    os.environ.update(
+        SHARD_COUNT=str(args.workers),
+        SHARD_HOST="127.0.0.1",
+        SHARD_BASE_PORT=str(args.worker_base_port)
+    )
+    workers = start_workers(args.workers, args.worker_base_port, "127.0.0.1")
+    try:
+        uvicorn.run("router:app", host="0.0.0.0", port=args.port, log_level="info")
+    finally:
+        # 工作进程收到SIGTERM后正常关闭：写完牌局记录并快照牌桌
+        for worker in workers:
+            worker.send_signal(signal.SIGTERM)
+        for worker in workers:
+            worker.wait()
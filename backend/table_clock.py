@@ -0,0 +1,95 @@
+import os
+import time
+from typing import Dict, Optional, Tuple
+from timing_wheel import Timer
+
+# 每次行动的基础时间（秒），用完后消耗时间银行
+ACTION_TIMEOUT = float(os.getenv("ACTION_TIMEOUT", "20"))
+# 每位玩家的时间银行上限（秒），以及每手牌开始时补充的时间
+TIME_BANK = float(os.getenv("TIME_BANK", "30"))
+TIME_BANK_REFILL = float(os.getenv("TIME_BANK_REFILL", "5"))
+# 一手牌结束到牌桌重置（所有人重新准备）的倒计时（秒）
+NEXT_HAND_DELAY = float(os.getenv("NEXT_HAND_DELAY", "8"))
+# 没有玩家的牌桌空闲多久后关闭（秒）；0为不关闭
+IDLE_TABLE_TIMEOUT = float(os.getenv("IDLE_TABLE_TIMEOUT", "600"))
+
+# 一次行动机会：(本手牌开始时间, 本手牌已记录的动作数, 行动玩家)
+Turn = Tuple[Optional[float], int, int]
+
+def current_turn(game) -> Optional[Turn]:
+    """当前等待行动的玩家；不在下注轮（或等待摊牌结算）时为None"""
+    if game.game_stage not in ("preflop", "flop", "turn", "river") or game.pending_showdown:
+        return None
+    if game.current_player_index >= len(game.players):
+        return None
+    player = game.players[game.current_player_index]
+    if player.is_folded or player.is_all_in or not player.is_active:
+        return None
+    return game.hand_started_at, len(game.hand_actions), player.user_id
+
+class TableClock:
+    """一个牌桌在时间轮中的定时器：行动计时、下一手倒计时和空闲关闭
+
+    每次行动机会给ACTION_TIMEOUT秒加上本人时间银行的余额，超出基础时间的部分从银行扣除，
+    到时未行动则自动过牌（不能过牌时弃牌）并清空银行。
+    """
+
+    def __init__(self, room_id: int):
+        self.room_id = room_id
+        self.turn: Optional[Turn] = None
+        self.turn_started = 0.0
+        self.action_timer: Optional[Timer] = None
+        self.reset_timer: Optional[Timer] = None
+        self.idle_timer: Optional[Timer] = None
+        # {user_id: 时间银行余额（秒）}
+        self.time_banks: Dict[int, float] = {}
+        self._bank_hand: Optional[float] = None
+
+    def bank(self, user_id: int) -> float:
+        return self.time_banks.get(user_id, TIME_BANK)
+
+    def refill(self, game):
+        """新一手牌开始时给在座玩家补充时间银行"""
+        if game.hand_started_at == self._bank_hand:
+            return
+        self._bank_hand = game.hand_started_at
+        seated = {player.user_id for player in game.players}
+        self.time_banks = {
+            user_id: min(TIME_BANK, self.bank(user_id) + TIME_BANK_REFILL)
+            for user_id in seated if user_id in self.time_banks
+        }
+
+    def end_turn(self):
+        """结束当前行动机会，超出基础时间的部分从时间银行扣除"""
+        if self.action_timer:
+            self.action_timer.cancel()
+            self.action_timer = None
+        if self.turn is not None:
+            user_id = self.turn[2]
+            overtime = time.monotonic() - self.turn_started - ACTION_TIMEOUT
+            if overtime > 0:
+                self.time_banks[user_id] = max(0.0, self.bank(user_id) - overtime)
+        self.turn = None
+
+    def start_turn(self, turn: Turn, timer: Timer):
+        self.turn = turn
+        self.turn_started = time.monotonic()
+        self.action_timer = timer
+
+    def cancel_reset(self):
+        if self.reset_timer:
+            self.reset_timer.cancel()
+            self.reset_timer = None
+
+    def cancel_idle(self):
+        if self.idle_timer:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def cancel_all(self):
+        if self.action_timer:
+            self.action_timer.cancel()
+            self.action_timer = None
+        self.turn = None
+        self.cancel_reset()
+        self.cancel_idle()
@@ -0,0 +1,176 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import msgpack
+from game_logic import PokerGame
+from logger import get_logger
+
+logger = get_logger("table_store")
+
+# 牌桌快照文件（独立于业务数据库的本地SQLite）
+TABLE_STORE_PATH = os.getenv("TABLE_STORE_PATH", "table_state.db")
+# 两次快照之间最多累积的操作日志条数，超过后重新快照并清空日志
+SNAPSHOT_EVERY = 50
+# 这些操作不可重放（如洗牌），执行后总是立即快照
+SNAPSHOT_OPS = {"start_game"}
+# 写线程一个事务最多提交的写操作数
+WRITE_BATCH = 500
+
+def _pack(data) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+def _unpack(blob: bytes):
+    # 快照中有以user_id为键的字典
+    return msgpack.unpackb(blob, raw=False, strict_map_key=False)
+
+class TableStore:
+    """牌桌快照 + 操作日志
+
+    每张牌桌保存一份msgpack编码的最新快照，快照之后的状态变更以追加方式记入日志。
+    阶段切换、开局洗牌和日志累积到SNAPSHOT_EVERY条时重新快照并清空该桌日志。
+    使用WAL模式且不逐条fsync：进程崩溃或重启不丢数据，断电可能丢失最后几条。
+
+    事件循环上只决定写什么并完成序列化，SQL写入交给独立的写线程（使用自己的连接）按顺序执行，
+    写线程把队列中积压的写操作合并到一个事务中提交，不阻塞其他房间。
+    """
+
+    def __init__(self, path: str = TABLE_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS table_snapshots ("
+            "room_id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS table_journal ("
+            "room_id INTEGER NOT NULL, seq INTEGER NOT NULL, entry BLOB NOT NULL, "
+            "PRIMARY KEY (room_id, seq))"
+        )
+        # 每桌快照后的日志条数和快照时的阶段
+        self._journal_length: Dict[int, int] = {}
+        self._snapshot_stage: Dict[int, str] = {}
+        self.snapshots_written = 0
+        self.entries_written = 0
+        self.transactions = 0
+        self.write_errors = 0
+        # 写线程的操作队列：(操作, 参数)，None表示停止
+        self._writes: "queue.Queue[Optional[Tuple[str, object]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="table-store", daemon=True)
+        self._writer.start()
+
+    def on_game_event(self, game: PokerGame, event: str, data: Dict):
+        """PokerGameManager.game_event_listeners回调"""
+        if event == "journal":
+            self.record(game, data)
+        elif event == "removed":
+            self.delete(game.room_id)
+
+    def record(self, game: PokerGame, entry: Dict):
+        """记录一次已执行的状态变更：需要时快照，否则追加到日志"""
+        room_id = game.room_id
+        length = self._journal_length.get(room_id)
+        if (length is None or length >= SNAPSHOT_EVERY or entry["op"] in SNAPSHOT_OPS
+                or game.game_stage != self._snapshot_stage.get(room_id)):
+            self.snapshot(game)
+            return
+
+        self._writes.put(("journal", (room_id, length + 1, _pack(entry))))
+        self._journal_length[room_id] = length + 1
+        self.entries_written += 1
+
+    def snapshot(self, game: PokerGame):
+        """写入一张牌桌的快照并清空其日志"""
+        self.snapshot_all([game])
+
+    def snapshot_all(self, games: Iterable[PokerGame]):
+        """在一个事务中快照多张牌桌"""
+        rows = [(game.room_id, _pack(game.to_snapshot()), time.time(), game.game_stage) for game in games]
+        self._writes.put(("snapshot", [row[:3] for row in rows]))
+        for room_id, _, _, stage in rows:
+            self._journal_length[room_id] = 0
+            self._snapshot_stage[room_id] = stage
+        self.snapshots_written += len(rows)
+
+    def delete(self, room_id: int):
+        self._writes.put(("delete", room_id))
+        self._journal_length.pop(room_id, None)
+        self._snapshot_stage.pop(room_id, None)
+
+    def _write_loop(self):
+        """写线程：按顺序执行写操作，每次把已积压的操作合并到一个事务"""
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            ops = [self._writes.get()]
+            while len(ops) < WRITE_BATCH:
+                try:
+                    ops.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            if None in ops:
+                running = False
+                ops = [op for op in ops if op is not None]
+            try:
+                if ops:
+                    self._apply(conn, ops)
+            except Exception:
+                self.write_errors += len(ops)
+                logger.exception("牌桌快照/日志写入失败（%s 条操作）", len(ops))
+            finally:
+                for _ in range(len(ops) + (0 if running else 1)):
+                    self._writes.task_done()
+        conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, ops: List[Tuple[str, object]]):
+        with conn:
+            conn.execute("BEGIN")
+            for op, args in ops:
+                if op == "journal":
+                    conn.execute("INSERT INTO table_journal (room_id, seq, entry) VALUES (?, ?, ?)", args)
+                elif op == "snapshot":
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO table_snapshots (room_id, data, updated_at) VALUES (?, ?, ?)", args
+                    )
+                    conn.executemany("DELETE FROM table_journal WHERE room_id = ?", [(row[0],) for row in args])
+                elif op == "delete":
+                    conn.execute("DELETE FROM table_snapshots WHERE room_id = ?", (args,))
+                    conn.execute("DELETE FROM table_journal WHERE room_id = ?", (args,))
+        self.transactions += 1
+
+    def flush(self):
+        """等待写线程写完已提交的操作"""
+        self._writes.join()
+
+    def load_all(self) -> List[Tuple[Dict, List[Dict]]]:
+        """读出所有牌桌的 (快照, 快照后的操作日志)，各一次批量查询"""
+        self.flush()
+        journals: Dict[int, List[Dict]] = {}
+        for room_id, entry in self.conn.execute("SELECT room_id, entry FROM table_journal ORDER BY room_id, seq"):
+            journals.setdefault(room_id, []).append(_unpack(entry))
+        return [
+            (_unpack(data), journals.get(room_id, []))
+            for room_id, data in self.conn.execute("SELECT room_id, data FROM table_snapshots")
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            "tables": len(self._journal_length),
+            "journal_entries": sum(self._journal_length.values()),
+            "snapshots_written": self.snapshots_written,
+            "entries_written": self.entries_written,
+            "pending_writes": self._writes.qsize(),
+            "transactions": self.transactions,
+            "write_errors": self.write_errors
+        }
+
+    def close(self):
+        """写完队列中的操作后停止写线程"""
+        self._writes.put(None)
+        self._writer.join()
+        self.conn.close()
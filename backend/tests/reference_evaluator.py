@@ -0,0 +1,66 @@
+"""
+改用查表评估器之前的5张牌评估逻辑（基线HandEvaluator._evaluate_five_cards），作为一致性测试的参照
+
+只把输入从Card对象换成整数牌（点数 = card_id // 4 + 2，花色 = card_id % 4），判断逻辑保持原样。
+"""
+
+from typing import List, Tuple
+from game_logic import HandRank
+
+def evaluate_five_cards(cards: List[int]) -> Tuple[HandRank, List[int]]:
+    """评估5张牌的组合"""
+    ranks = sorted([card // 4 + 2 for card in cards], reverse=True)
+    suits = [card % 4 for card in cards]
+
+    # 检查是否为同花
+    is_flush = len(set(suits)) == 1
+
+    # 检查是否为顺子
+    is_straight = _is_straight(ranks)
+
+    # 统计每个点数的出现次数
+    rank_counts = {}
+    for rank in ranks:
+        rank_counts[rank] = rank_counts.get(rank, 0) + 1
+
+    counts = sorted(rank_counts.values(), reverse=True)
+    unique_ranks = sorted(rank_counts.keys(), key=lambda x: (rank_counts[x], x), reverse=True)
+
+    # 判断牌型
+    if is_straight and is_flush:
+        if ranks == [14, 13, 12, 11, 10]:  # 皇家同花顺
+            return HandRank.ROYAL_FLUSH, ranks
+        else:  # 同花顺
+            return HandRank.STRAIGHT_FLUSH, ranks
+    elif counts == [4, 1]:  # 四条
+        return HandRank.FOUR_OF_A_KIND, unique_ranks
+    elif counts == [3, 2]:  # 葫芦
+        return HandRank.FULL_HOUSE, unique_ranks
+    elif is_flush:  # 同花
+        return HandRank.FLUSH, ranks
+    elif is_straight:  # 顺子
+        return HandRank.STRAIGHT, ranks
+    elif counts == [3, 1, 1]:  # 三条
+        return HandRank.THREE_OF_A_KIND, unique_ranks
+    elif counts == [2, 2, 1]:  # 两对
+        return HandRank.TWO_PAIR, unique_ranks
+    elif counts == [2, 1, 1, 1]:  # 一对
+        return HandRank.PAIR, unique_ranks
+    else:  # 高牌
+        return HandRank.HIGH_CARD, ranks
+
+def _is_straight(ranks: List[int]) -> bool:
+    """检查是否为顺子"""
+    ranks = sorted(set(ranks))
+    if len(ranks) != 5:
+        return False
+
+    # 普通顺子
+    if ranks[-1] - ranks[0] == 4:
+        return True
+
+    # A-2-3-4-5 顺子
+    if ranks == [2, 3, 4, 5, 14]:
+        return True
+
+    return False
@@ -0,0 +1,51 @@
+"""查表评估器与基线评估器在全部2,598,960手5张牌上的一致性"""
+
+import itertools
+import numpy as np
+import pytest
+from game_logic import HandEvaluator, HandRank
+from reference_evaluator import evaluate_five_cards
+
+# A-2-3-4-5（轮子顺）在基线中按 [14, 5, 4, 3, 2] 比较，排在6高顺子之上；
+# 查表评估器按5高顺子处理，排在同类所有牌型之下，这是有意的修正
+WHEEL = (14, 5, 4, 3, 2)
+
+@pytest.fixture(scope="module")
+def classes():
+    """参照牌型键 (牌型, 比较点数) -> (查表强度, 一手样例牌)"""
+    hands = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(52), 5)), dtype=np.intp
+    ).reshape(-1, 5)
+    assert len(hands) == 2598960
+    strengths = HandEvaluator.evaluate_array(hands)
+    result = {}
+    for hand, strength in zip(hands.tolist(), strengths.tolist()):
+        rank, values = evaluate_five_cards(hand)
+        key = (rank.value, tuple(values))
+        known = result.setdefault(key, (strength, hand))
+        assert known[0] == strength, f"同一参照牌型得到不同强度: {key}"
+    return result
+
+def test_one_strength_per_reference_class(classes):
+    # 5张牌共7462个不同的强度等级，与参照牌型一一对应
+    assert len(classes) == 7462
+    assert len({strength for strength, _ in classes.values()}) == 7462
+
+def test_category_and_values_match(classes):
+    for (category, values), (strength, hand) in classes.items():
+        assert HandEvaluator.evaluate_strength(hand) == strength
+        rank, decoded = HandEvaluator.decode_strength(strength)
+        assert (rank, tuple(decoded)) == (HandRank(category), values)
+
+def test_ordering_matches_except_wheel(classes):
+    by_strength = sorted(classes, key=lambda key: classes[key][0])
+    by_reference = sorted(classes)
+    # 除轮子顺外，两者的排序完全一致
+    assert [key for key in by_strength if key[1] != WHEEL] == [key for key in by_reference if key[1] != WHEEL]
+
+    # 唯一的差异：轮子顺（同花顺）在基线中高于6高顺子，修正后是同类中最小的
+    for category in (HandRank.STRAIGHT.value, HandRank.STRAIGHT_FLUSH.value):
+        wheel, six_high = (category, WHEEL), (category, (6, 5, 4, 3, 2))
+        assert wheel > six_high
+        assert classes[wheel][0] < classes[six_high][0]
+        assert classes[wheel][0] == min(strength for key, (strength, _) in classes.items() if key[0] == category)
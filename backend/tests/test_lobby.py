@@ -0,0 +1,62 @@
+"""大厅索引：其他分片的房间从数据库刷新，本节点的牌桌以内存为准"""
+
+import asyncio
+import dataclasses
+import pytest
+from sqlalchemy import create_engine, update, delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+import lobby
+from database import Base
+from models import Room, RoomStatus
+from lobby import LobbyIndex, LobbyFilter
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / "poker.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([Room(id=room_id, name=f"room{room_id}", small_blind=10, big_blind=20, max_players=9,
+                         current_players=0, status=RoomStatus.WAITING) for room_id in (1, 2)])
+        db.commit()
+    monkeypatch.setattr(lobby, "AsyncSessionLocal", async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}")))
+    # 房间1由本节点承载，其余房间属于其他分片
+    monkeypatch.setattr(lobby, "owns_room", lambda room_id: room_id == 1)
+    return factory
+
+def test_refresh_updates_only_foreign_rooms(database):
+    async def run():
+        index = LobbyIndex()
+        await index.load()
+        sent = []
+        index.send = lambda user_id, text: sent.append(text)
+        index.subscribe(7, LobbyFilter())
+
+        # 其他分片写回了房间2的人数，新建了房间3；房间1的数据库行落后于本节点的牌桌
+        index.apply(1, dataclasses.replace(index.rooms[1], current_players=4))
+        with database() as db:
+            db.execute(update(Room).where(Room.id == 1).values(current_players=2))
+            db.execute(update(Room).where(Room.id == 2).values(current_players=3, status=RoomStatus.PLAYING))
+            db.add(Room(id=3, name="room3", small_blind=5, big_blind=10, max_players=6,
+                        current_players=0, status=RoomStatus.WAITING))
+            db.commit()
+        sent.clear()
+
+        await index.refresh()
+        assert index.rooms[1].current_players == 4
+        assert (index.rooms[2].current_players, index.rooms[2].status) == (3, "playing")
+        assert 3 in index.rooms
+        assert index.rooms_refreshed == 2 and len(sent) == 2
+
+        # 没有变化时不通知订阅者；其他节点删除的房间从索引中移除
+        await index.refresh()
+        assert len(sent) == 2
+        with database() as db:
+            db.execute(delete(Room).where(Room.id == 3))
+            db.commit()
+        await index.refresh()
+        assert 3 not in index.rooms
+
+    asyncio.run(run())
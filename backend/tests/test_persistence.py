@@ -0,0 +1,88 @@
+"""牌局结果写回：队列已满或写库失败的记录溢出到文件，之后重放，筹码变化不丢失"""
+
+import asyncio
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import persistence
+from database import Base
+from models import User, Game
+from persistence import HandResultWriter
+
+def _record(room_id: int, delta: int) -> dict:
+    now = time.time()
+    return {
+        "room_id": room_id,
+        "pot": abs(delta) * 2,
+        "community_cards": "",
+        "dealer_position": 0,
+        "started_at": now,
+        "finished_at": now,
+        "participants": [
+            {"user_id": user_id, "position": i, "hole_cards": "", "chips_at_start": 1000,
+             "chips_at_end": 1000 + change, "is_folded": False, "is_all_in": False,
+             "total_bet": abs(delta), "win_amount": abs(delta) * 2 if change > 0 else 0}
+            for i, (user_id, change) in enumerate(((1, delta), (2, -delta)))
+        ]
+    }
+
+@pytest.fixture
+def database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'poker.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([User(id=1, username="a", hashed_password="x", chips=1000),
+                    User(id=2, username="b", hashed_password="x", chips=1000)])
+        db.commit()
+    return factory
+
+def _chips(factory):
+    with factory() as db:
+        return {user.id: user.chips for user in db.query(User)}, db.query(Game).count()
+
+def test_failed_batch_is_spilled_and_replayed(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(persistence, "MAX_RETRIES", 1)
+    monkeypatch.setattr(persistence, "RETRY_BACKOFF", 0)
+    available = {"db": False}
+
+    def factory():
+        if not available["db"]:
+            raise ConnectionError("database down")
+        return database()
+
+    async def run():
+        writer = HandResultWriter(session_factory=factory, spill_path=str(tmp_path / "spill.bin"))
+        await writer._write_with_retry([_record(1, 50), _record(1, 20)])
+        assert writer.spilled == 2 and writer.written == 0
+
+        # 数据库仍不可用：重放失败，记录保留在文件中
+        assert not await writer.replay_spilled()
+        assert writer._has_spilled()
+
+        available["db"] = True
+        assert await writer.replay_spilled()
+        assert not writer._has_spilled()
+        assert writer.replayed == 2
+
+    asyncio.run(run())
+    assert _chips(database) == ({1: 1070, 2: 930}, 2)
+
+def test_full_queue_spills_instead_of_dropping(database, tmp_path):
+    async def run():
+        writer = HandResultWriter(session_factory=database, max_pending=1, spill_path=str(tmp_path / "spill.bin"))
+        assert writer.submit(_record(1, 10))
+        assert not writer.submit(_record(1, 30))
+        assert writer.spilled == 1
+        # 停止时写完队列并重放溢出的记录
+        await writer.stop()
+        assert writer.written == 2
+
+        # 重启后不会重复写入
+        restarted = HandResultWriter(session_factory=database, spill_path=str(tmp_path / "spill.bin"))
+        assert await restarted.replay_spilled()
+        assert restarted.replayed == 0
+
+    asyncio.run(run())
+    assert _chips(database) == ({1: 1040, 2: 960}, 2)
@@ -0,0 +1,109 @@
+"""奖池账本的随机性质测试：随机筹码、全下和弃牌下筹码守恒，零头分配确定"""
+
+import random
+import pytest
+from pot_ledger import PotLedger
+
+SCENARIOS = 2000
+
+def _random_hand(rng: random.Random):
+    """随机驱动一手牌的下注，返回 (账本, 各玩家投入, 未弃牌玩家, 座位顺序)"""
+    players = list(range(1, rng.randint(2, 9) + 1))
+    stacks = {user_id: rng.choice((rng.randint(1, 50), rng.randint(1, 2000))) for user_id in players}
+    ledger = PotLedger()
+    committed = {user_id: 0 for user_id in players}
+    folded, all_in = set(), set()
+
+    for _ in range(rng.randint(1, 4)):
+        for user_id in players:
+            if user_id in folded or user_id in all_in:
+                continue
+            live = len(players) - len(folded)
+            roll = rng.random()
+            if roll < 0.2 and live > 1:
+                ledger.fold(user_id)
+                folded.add(user_id)
+            elif roll < 0.4:
+                amount = stacks[user_id] - committed[user_id]
+                ledger.add(user_id, amount, all_in=True)
+                committed[user_id] += amount
+                all_in.add(user_id)
+            else:
+                amount = rng.randint(0, stacks[user_id] - committed[user_id])
+                is_all_in = committed[user_id] + amount == stacks[user_id]
+                ledger.add(user_id, amount, all_in=is_all_in)
+                committed[user_id] += amount
+                if is_all_in:
+                    all_in.add(user_id)
+
+    seat_order = players[:]
+    rng.shuffle(seat_order)
+    return ledger, committed, [user_id for user_id in players if user_id not in folded], seat_order
+
+@pytest.mark.parametrize("seed", range(SCENARIOS // 100))
+def test_payouts_conserve_chips(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        ledger, committed, live, seat_order = _random_hand(rng)
+        # 强度取值范围小，经常出现平分
+        strengths = {user_id: rng.randint(1, 3) for user_id in live}
+        result = ledger.settle(strengths, seat_order)
+
+        assert ledger.total == sum(committed.values())
+        assert sum(pot["amount"] for pot in result["pots"]) == sum(committed.values())
+        assert sum(result["payouts"].values()) == sum(committed.values())
+        assert set(result["payouts"]) == set(live)
+
+@pytest.mark.parametrize("seed", range(SCENARIOS // 100))
+def test_odd_chips_follow_seat_order(seed):
+    rng = random.Random(1000 + seed)
+    for _ in range(100):
+        ledger, _, live, seat_order = _random_hand(rng)
+        strengths = {user_id: rng.randint(1, 2) for user_id in live}
+        result = ledger.settle(strengths, seat_order)
+
+        # 与字典顺序无关：打乱强度的插入顺序结果不变
+        shuffled = list(strengths.items())
+        rng.shuffle(shuffled)
+        assert ledger.settle(dict(shuffled), seat_order) == result
+
+        # 每个奖池的赢家按座位顺序排列，零头从庄家左手边开始逐个多分1个筹码
+        position = {user_id: i for i, user_id in enumerate(seat_order)}
+        expected = {user_id: 0 for user_id in live}
+        for pot in result["pots"]:
+            winners = pot["winners"]
+            assert winners == sorted(winners, key=position.get)
+            assert len({strengths[user_id] for user_id in winners}) == 1
+            share, odd_chips = divmod(pot["amount"], len(winners))
+            for i, user_id in enumerate(winners):
+                expected[user_id] += share + (1 if i < odd_chips else 0)
+        assert result["payouts"] == expected
+
+def test_split_pot_odd_chip_goes_left_of_dealer():
+    ledger = PotLedger()
+    for user_id, amount in ((1, 33), (2, 33), (3, 33)):
+        ledger.add(user_id, amount)
+    ledger.fold(3)
+    result = ledger.settle({1: 5, 2: 5}, seat_order=[2, 3, 1])
+    assert result["payouts"] == {1: 49, 2: 50}
+
+def test_side_pots_from_all_ins():
+    ledger = PotLedger()
+    ledger.add(1, 100, all_in=True)
+    ledger.add(2, 300, all_in=True)
+    ledger.add(3, 500)
+    result = ledger.settle({1: 9, 2: 5, 3: 1}, seat_order=[1, 2, 3])
+    # 主池300归1，边池400归2，只有3投入的200退还给3
+    assert result["payouts"] == {1: 300, 2: 400, 3: 200}
+    assert [pot["amount"] for pot in result["pots"]] == [300, 400, 200]
+
+def test_layers_without_contenders_are_refunded():
+    ledger = PotLedger()
+    ledger.add(1, 10)
+    ledger.add(2, 20)
+    ledger.fold(1)
+    ledger.fold(2)
+    # 没有在局玩家时不会在空序列上取最大值，各层退还给投入者
+    result = ledger.settle({}, seat_order=[1, 2])
+    assert result["payouts"] == {1: 10, 2: 20}
+    assert [pot["winners"] for pot in result["pots"]] == [[]]
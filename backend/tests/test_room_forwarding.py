@@ -0,0 +1,124 @@
+"""房间命令转发：非所属节点不创建牌桌，命令经广播后端转给所属分片执行"""
+
+import asyncio
+import json
+import pytest
+import websocket_handler
+from backplane import Backplane, InProcessBackplane
+from websocket_handler import ConnectionManager
+
+class ShardBackplane(InProcessBackplane):
+    """记录转给其他分片的命令和发给用户的消息"""
+
+    def __init__(self, forward: bool = True):
+        super().__init__()
+        self.forward = forward
+        self.commands = []
+        self.user_messages = []
+
+    def publish_shard(self, shard: int, kind: str, text: str) -> bool:
+        if self.forward:
+            self.commands.append((kind, text))
+        return self.forward
+
+    def publish_user(self, user_id, text, kind=None, room_id=None):
+        self.user_messages.append((user_id, json.loads(text)))
+        super().publish_user(user_id, text, kind, room_id)
+
+def _node(backplane: ShardBackplane) -> ConnectionManager:
+    manager = ConnectionManager()
+    manager.backplane = backplane
+    backplane.attach(manager._deliver_room, manager._deliver_user, manager._deliver_node, manager._deliver_shard)
+
+    async def lookup(room_id):
+        return None
+
+    manager.lobby.lookup = lookup
+    return manager
+
+@pytest.fixture
+def hosting(monkeypatch, tmp_path):
+    """当前执行代码的节点；房间都由owner节点承载（牌局历史写到临时目录）"""
+    monkeypatch.chdir(tmp_path)
+    node = {"name": "remote"}
+    monkeypatch.setattr(websocket_handler, "owns_room", lambda room_id: node["name"] == "owner")
+    return node
+
+async def _deliver(source: ConnectionManager, owner: ConnectionManager, hosting, room_id: int):
+    hosting["name"] = "owner"
+    for kind, text in source.backplane.commands:
+        owner._deliver_shard(kind, text)
+    source.backplane.commands.clear()
+    await owner.run_in_room(room_id, asyncio.sleep, 0)
+    hosting["name"] = "remote"
+
+def test_commands_for_foreign_rooms_run_on_the_owner(hosting):
+    async def run():
+        remote, owner = _node(ShardBackplane()), _node(ShardBackplane())
+
+        await remote.run_room_command(1, 7, "join_room", "alice", 1000)
+        await remote.run_room_command(2, 7, "join_room", "bob", 1000)
+        # 非所属节点只记录本地连接所在的房间，不创建第二张牌桌
+        assert remote.game_manager.get_game(7) is None
+        assert remote.room_connections[7] == [1, 2]
+        assert remote.forwarded_commands == 2
+
+        await _deliver(remote, owner, hosting, 7)
+        game = owner.game_manager.get_game(7)
+        assert [player.user_id for player in game.players] == [1, 2]
+
+        await remote.run_room_command(1, 7, "set_player_ready", True)
+        await remote.run_room_command(2, 7, "set_player_ready", True)
+        await _deliver(remote, owner, hosting, 7)
+        assert game.game_stage == "preflop"
+
+        # 断线后由所属节点移除玩家
+        remote.disconnect(2)
+        await _deliver(remote, owner, hosting, 7)
+        assert [player.user_id for player in game.players] == [1]
+        assert remote.game_manager.get_game(7) is None
+
+    asyncio.run(run())
+
+def test_foreign_room_is_rejected_without_a_cross_node_backplane(hosting):
+    async def run():
+        node = _node(ShardBackplane(forward=False))
+        await node.run_room_command(1, 7, "join_room", "alice", 1000)
+        await node.run_room_command(1, 7, "watch_room")
+
+        assert node.game_manager.get_game(7) is None
+        assert 7 not in node.room_connections and 7 not in node.spectator_feeds
+        assert [message["data"]["message"] for _, message in node.backplane.user_messages] == ["房间不在本分片"] * 2
+
+        # 直接调用也不会在本节点建桌
+        assert not await node.join_room(1, 7, "alice", 1000)
+        assert node.game_manager.get_game(7) is None
+
+    asyncio.run(run())
+
+def test_spectators_on_other_nodes_are_registered_with_the_owner(hosting):
+    async def run():
+        remote, owner = _node(ShardBackplane()), _node(ShardBackplane())
+        hosting["name"] = "owner"
+        owner.game_manager.create_game(7, 10, 20)
+        hosting["name"] = "remote"
+
+        await remote.run_room_command(5, 7, "watch_room")
+        assert remote.spectator_feeds[7].watchers == {5}
+        await _deliver(remote, owner, hosting, 7)
+        assert owner.spectator_feeds[7].watchers == {5}
+
+        remote.unwatch_room(5, 7)
+        await _deliver(remote, owner, hosting, 7)
+        assert 7 not in remote.spectator_feeds and 7 not in owner.spectator_feeds
+
+    asyncio.run(run())
+
+def test_backplane_must_implement_every_publish_method():
+    class RoomOnly(Backplane):
+        def publish_room(self, room_id, text, kind=None, exclude_user=None, overrides=None):
+            pass
+
+    # 缺少publish_user和publish_nodes的后端在构造时就失败
+    with pytest.raises(TypeError):
+        RoomOnly()
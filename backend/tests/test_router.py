@@ -0,0 +1,47 @@
+"""路由进程按room_id选择分片；无效的room_id不影响连接，转发到当前分片"""
+
+import asyncio
+import json
+import pytest
+import router
+from router import ShardedSession
+
+class FakeUpstream:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, payload):
+        self.sent.append(payload)
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(router, "shard_for_room", lambda room_id: room_id % 4)
+    session = ShardedSession(websocket=None, token="token")
+    upstreams = {}
+
+    async def upstream(shard):
+        return upstreams.setdefault(shard, FakeUpstream())
+
+    session.upstream = upstream
+    session.sent_to = upstreams
+    return session
+
+@pytest.mark.parametrize("room_id", ["abc", [1, 2], {"id": 1}, "1e3"])
+def test_invalid_room_id_keeps_current_shard(session, room_id):
+    async def run():
+        await session.route(json.dumps({"type": "join_room", "data": {"room_id": 3}}))
+        frame = json.dumps({"type": "join_room", "data": {"room_id": room_id}})
+        await session.route(frame)
+        assert session.current_shard == 3
+        assert session.sent_to[3].sent[-1] == frame
+
+    asyncio.run(run())
+
+def test_unparseable_frames_are_forwarded(session):
+    async def run():
+        for frame in ("not json", "[1, 2]", json.dumps({"type": "ping", "data": [1]})):
+            await session.route(frame)
+        assert session.current_shard == 0
+        assert len(session.sent_to[0].sent) == 3
+
+    asyncio.run(run())
@@ -0,0 +1,125 @@
+"""批量摊牌：各牌桌分别结算，一张牌桌失败不影响其他牌桌"""
+
+from game_logic import PokerGameManager
+from table_clock import current_turn
+
+def _all_in_table(manager: PokerGameManager, room_id: int):
+    game = manager.create_game(room_id, 10, 20)
+    for user_id in (1, 2, 3):
+        game.add_player(user_id, f"p{user_id}", 1000, user_id - 1)
+    game.start_game()
+    while not game.pending_showdown:
+        player = game.players[game.current_player_index]
+        assert game.player_action(player.user_id, "all_in", 0)["success"]
+    return game
+
+def test_resolves_only_the_requested_table_from_one_batch():
+    manager = PokerGameManager(batch_showdowns=True)
+    first, second = _all_in_table(manager, 1), _all_in_table(manager, 2)
+    assert set(manager.pending_showdowns) == {1, 2}
+
+    assert manager.resolve_pending_showdown(1)
+    assert first.game_stage == "finished"
+    # 第二张牌桌已在同一批次中评估，但仍由它自己结算
+    assert second.pending_showdown and 2 in manager.showdown_strengths
+    assert manager.resolve_pending_showdown(2)
+    assert second.game_stage == "finished"
+    assert not manager.pending_showdowns and not manager.showdown_strengths
+    for game in (first, second):
+        assert sum(player.chips for player in game.players) == 3000
+
+def test_failed_resolution_keeps_table_pending():
+    manager = PokerGameManager(batch_showdowns=True)
+    broken, healthy = _all_in_table(manager, 1), _all_in_table(manager, 2)
+    resolve = broken.resolve_showdown
+
+    def fail(strengths):
+        raise RuntimeError("boom")
+
+    broken.resolve_showdown = fail
+    assert not manager.resolve_pending_showdown(1)
+    assert manager.resolve_pending_showdown(2)
+    assert healthy.game_stage == "finished"
+
+    # 失败的牌桌留在挂起集合中，之后可以重试
+    assert 1 in manager.pending_showdowns
+    broken.resolve_showdown = resolve
+    assert manager.resolve_pending_showdown(1)
+    assert broken.game_stage == "finished"
+
+def _heads_up(manager: PokerGameManager, room_id: int):
+    game = manager.create_game(room_id, 10, 20)
+    for user_id in (1, 2):
+        game.add_player(user_id, f"p{user_id}", 1000, user_id - 1)
+    game.start_game()
+    return game
+
+def test_last_live_player_wins_without_pending_showdown():
+    manager = PokerGameManager(batch_showdowns=True)
+    game = _heads_up(manager, 1)
+    player = game.players[game.current_player_index]
+    assert game.player_action(player.user_id, "fold", 0)["success"]
+
+    # 无需比较手牌，弃牌后立即结算，不挂起等待批量评估
+    assert game.game_stage == "finished" and not game.pending_showdown
+    assert not manager.pending_showdowns
+    assert sum(p.chips for p in game.players) == 2000
+
+def test_removing_a_player_awards_the_pot_to_the_remaining_one():
+    manager = PokerGameManager(batch_showdowns=True)
+    game = _heads_up(manager, 1)
+    waiting = next(p for i, p in enumerate(game.players) if i != game.current_player_index)
+    remaining = game.players[game.current_player_index]
+    committed = game.pot_ledger.totals[waiting.user_id]
+
+    assert game.remove_player(waiting.user_id)
+    assert game.game_stage == "finished" and not manager.pending_showdowns
+    assert game.game_results["winner_id"] == remaining.user_id
+    assert remaining.chips == 1000 + committed
+
+def test_everyone_leaving_refunds_instead_of_failing():
+    game = _heads_up(PokerGameManager(batch_showdowns=True), 1)
+    records = []
+    game.event_listeners.append(lambda game, event, data: records.append(data) if event == "hand_complete" else None)
+    # 双方同时断线：第一位离座时手牌已结算，第二位离座不再触发结算
+    for user_id in (1, 2):
+        assert game.remove_player(user_id)
+    assert game.game_stage == "finished" and not game.players
+    assert len(records) == 1
+
+def _four_handed(manager: PokerGameManager, room_id: int):
+    game = manager.create_game(room_id, 10, 20)
+    for user_id in (1, 2, 3, 4):
+        game.add_player(user_id, f"p{user_id}", 1000, user_id - 1)
+    game.start_game()
+    return game
+
+def _call_until_index(game, index: int):
+    while game.current_player_index != index:
+        player = game.players[game.current_player_index]
+        assert game.player_action(player.user_id, "call", 0)["success"]
+
+def test_removing_the_acting_player_in_the_last_slot_keeps_the_hand_going():
+    game = _four_handed(PokerGameManager(batch_showdowns=True), 1)
+    _call_until_index(game, 3)
+    leaving = game.players[3].user_id
+
+    assert game.remove_player(leaving)
+    # 行动权转给下一位需要行动的玩家，下标不会越界
+    turn = current_turn(game)
+    assert turn is not None and turn[2] != leaving
+    assert game.current_player_index < len(game.players)
+    while game.game_stage == "preflop":
+        player = game.players[game.current_player_index]
+        action = "check" if player.current_bet >= game.current_bet else "call"
+        assert game.player_action(player.user_id, action, 0)["success"]
+    assert game.game_stage == "flop"
+
+def test_removing_an_earlier_seat_keeps_the_turn_with_the_same_player():
+    game = _four_handed(PokerGameManager(batch_showdowns=True), 1)
+    _call_until_index(game, 3)
+    acting = game.players[3].user_id
+    earlier = next(p.user_id for p in game.players[:3] if p.user_id != acting)
+
+    assert game.remove_player(earlier)
+    assert current_turn(game)[2] == acting
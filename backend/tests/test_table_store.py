@@ -0,0 +1,47 @@
+"""牌桌快照和操作日志：写线程按顺序写入，重新打开后恢复出相同的牌桌"""
+
+from game_logic import PokerGameManager
+from table_store import TableStore
+
+def test_restores_tables_written_by_writer_thread(tmp_path):
+    path = str(tmp_path / "tables.db")
+    store = TableStore(path)
+    manager = PokerGameManager()
+    manager.game_event_listeners.append(store.on_game_event)
+    games = []
+    for room_id in (1, 2):
+        game = manager.create_game(room_id, 10, 20)
+        for user_id in (1, 2, 3):
+            game.add_player(user_id, f"p{user_id}", 1000, user_id - 1)
+        game.start_game()
+        for _ in range(2):
+            player = game.players[game.current_player_index]
+            assert game.player_action(player.user_id, "call", 0)["success"]
+        games.append(game)
+    manager.create_game(3, 10, 20)
+    manager.remove_game(3)
+    store.close()
+    assert store.stats()["write_errors"] == 0
+
+    reopened = TableStore(path)
+    restored = PokerGameManager()
+    assert sorted(restored.restore_games(reopened.load_all())) == [1, 2]
+    for game in games:
+        assert restored.get_game(game.room_id).to_snapshot() == game.to_snapshot()
+    reopened.close()
+
+def test_load_all_waits_for_pending_writes(tmp_path):
+    store = TableStore(str(tmp_path / "tables.db"))
+    manager = PokerGameManager()
+    manager.game_event_listeners.append(store.on_game_event)
+    game = manager.create_game(1, 10, 20)
+    game.add_player(1, "p1", 1000, 0)
+    game.add_player(2, "p2", 1000, 1)
+    game.start_game()
+    player = game.players[game.current_player_index]
+    game.player_action(player.user_id, "call", 0)
+    # 写线程可能尚未提交，load_all先等待写完
+    [(snapshot, journal)] = store.load_all()
+    assert snapshot["room_id"] == 1
+    assert len(journal) == store.stats()["journal_entries"]
+    store.close()
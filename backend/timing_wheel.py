@@ -0,0 +1,160 @@
+import os
+import math
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set
+from logger import get_logger
+
+logger = get_logger("timing_wheel")
+
+# 时间轮刻度（秒）：定时器最多晚一个刻度触发
+TIMER_TICK = float(os.getenv("TIMER_TICK", "0.1"))
+# 每层槽数和层数：第n层一个槽覆盖 WHEEL_SLOTS**n 个刻度，默认4层可覆盖约19天
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4
+
+class Timer:
+    """时间轮中的一个定时器；cancel在触发前调用时O(1)移除"""
+    __slots__ = ("deadline", "callback", "args", "slot", "wheel")
+
+    def __init__(self, deadline: int, callback: Callable[..., Any], args: tuple, wheel: "TimingWheel"):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        # 所在的槽；已触发或已取消时为None
+        self.slot: Optional[Set["Timer"]] = None
+        self.wheel = wheel
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self) -> bool:
+        """取消定时器，返回是否在触发前取消成功"""
+        if self.slot is None:
+            return False
+        self.slot.discard(self)
+        self.slot = None
+        self.wheel.pending -= 1
+        self.wheel.cancelled += 1
+        return True
+
+class TimingWheel:
+    """分层时间轮：所有延迟任务共用一个驱动任务
+
+    定时器按到期刻度放入对应层的槽，插入和取消都是O(1)；驱动任务每个刻度只处理
+    第0层的一个槽，高层的槽在低层转完一圈时整体下放（每个定时器最多下放WHEEL_LEVELS-1次）。
+    回调在驱动任务中同步执行，需要修改牌局的回调应把命令交给房间actor。
+    """
+
+    def __init__(self, tick: float = TIMER_TICK, slots: int = WHEEL_SLOTS, levels: int = WHEEL_LEVELS):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.wheels: List[List[Set[Timer]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        # 已处理到的刻度，刻度从创建时开始按单调时钟计数
+        self.current = 0
+        self._origin = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.pending = 0
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.max_lag = 0.0  # 驱动任务最晚比刻度晚多少（秒），反映事件循环阻塞
+
+    def _now_tick(self) -> float:
+        return (time.monotonic() - self._origin) / self.tick
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args) -> Timer:
+        """delay秒后在驱动任务中调用callback(*args)"""
+        # 按实际时间计算到期刻度，驱动任务启动前安排的定时器也不会提前触发
+        deadline = max(self.current + 1, math.ceil(self._now_tick() + delay / self.tick))
+        timer = Timer(deadline, callback, args, self)
+        self._place(timer)
+        self.pending += 1
+        self.scheduled += 1
+        return timer
+
+    def _place(self, timer: Timer):
+        delta = timer.deadline - self.current
+        span = self.slots
+        for level in range(self.levels):
+            if delta < span or level == self.levels - 1:
+                break
+            span *= self.slots
+        # 超出最高层范围的定时器先放到最高层最远的槽，下放时重新计算
+        deadline = min(timer.deadline, self.current + span - 1)
+        slot = self.wheels[level][(deadline // (span // self.slots)) % self.slots]
+        slot.add(timer)
+        timer.slot = slot
+
+    def advance(self):
+        """处理到当前时间为止的所有刻度"""
+        target = int(self._now_tick())
+        while self.current < target:
+            self.current += 1
+            self._cascade()
+            self._fire(self.wheels[0][self.current % self.slots])
+
+    def _cascade(self):
+        # 从高层到低层，把这一刻度开始的高层槽下放到低层
+        span = self.slots ** (self.levels - 1)
+        for level in range(self.levels - 1, 0, -1):
+            if self.current % span == 0:
+                slot = self.wheels[level][(self.current // span) % self.slots]
+                if slot:
+                    timers = list(slot)
+                    slot.clear()
+                    for timer in timers:
+                        self._place(timer)
+            span //= self.slots
+
+    def _fire(self, slot: Set[Timer]):
+        if not slot:
+            return
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            timer.slot = None
+            self.pending -= 1
+            self.fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                self.failed += 1
+                logger.exception("定时器回调执行失败")
+
+    def start(self):
+        """启动驱动任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止驱动任务，未触发的定时器不再执行"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # 睡到下一个刻度的边界，避免累计漂移
+            now_tick = self._now_tick()
+            await asyncio.sleep((math.floor(now_tick) + 1 - now_tick) * self.tick)
+            self.max_lag = max(self.max_lag, (self._now_tick() - math.floor(now_tick) - 1) * self.tick)
+            self.advance()
+
+    def stats(self) -> Dict:
+        return {
+            "tick_ms": round(self.tick * 1000, 1),
+            "pending": self.pending,
+            "scheduled": self.scheduled,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "max_lag_ms": round(self.max_lag * 1000, 2)
+        }
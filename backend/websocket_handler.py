@@ -1,84 +1,391 @@
 import json
+import time
+import dataclasses
 import asyncio
 from typing import Dict, List, Optional
-from fastapi import WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import WebSocket, WebSocketDisconnect
+from database import AsyncSessionLocal
 from models import User, Room
-from auth import verify_token
-from game_logic import PokerGameManager
+from auth import verify_token, identity_cache, load_user
+from game_logic import PokerGameManager, PokerGame, card_to_dict, card_to_str
+from equity import calculate_equity
+from connection import OutboundConnection
+from protocol import JSON, MSGPACK, negotiate, receive_frame
+from dispatcher import MessageDispatcher, InvalidMessage
+from schemas import EmptyData, RoomData, GameActionData, PlayerReadyData, ChatData, LobbyFilterData
+from persistence import HandResultWriter
+from hand_history import HandHistoryWriter
+from table_store import TableStore
+from room_actor import RoomActor
+from backplane import create_backplane
+from spectator import SpectatorFeed, SPECTATOR_FRAME
+from lobby import LobbyIndex, LobbyRoom, LobbyFilter
+from timing_wheel import TimingWheel
+from table_clock import TableClock, current_turn, ACTION_TIMEOUT, NEXT_HAND_DELAY, IDLE_TABLE_TIMEOUT
+from sharding import SHARD_COUNT, owns_room, shard_for_room
+from logger import get_logger
+
+logger = get_logger("websocket_handler")
+
+# 广播路径上计算全下胜率的抽样数和时间上限
+BROADCAST_EQUITY_SAMPLES = 50_000
+BROADCAST_EQUITY_TIME_BUDGET = 0.5
+
+# 玩家对房间的命令：只在承载该房间牌局的节点执行，其他节点收到后经广播后端转给所属分片
+ROOM_COMMANDS = (
+    "join_room", "leave_room", "watch_room", "unwatch_room", "handle_game_action",
+    "start_game", "set_player_ready", "send_game_snapshot", "show_player_cards"
+)
 
 class ConnectionManager:
     def __init__(self):
-        # 存储活跃连接：{user_id: websocket}
-        self.active_connections: Dict[int, WebSocket] = {}
+        # 存储活跃连接：{user_id: 带发送队列的连接}
+        self.active_connections: Dict[int, OutboundConnection] = {}
         # 存储房间连接：{room_id: [user_ids]}
         self.room_connections: Dict[int, List[int]] = {}
-        # 游戏管理器
-        self.game_manager = PokerGameManager()
-    
-    async def connect(self, websocket: WebSocket, user_id: int):
-        """建立WebSocket连接"""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"用户 {user_id} 已连接")
-    
-    def disconnect(self, user_id: int):
-        """断开WebSocket连接"""
-        if user_id in self.active_connections:
+        # 游戏管理器（摊牌批量评估，在广播前统一结算）
+        self.game_manager = PokerGameManager(batch_showdowns=True)
+        # 每手牌结束后异步写回数据库（由应用启动/关闭时启动和清空）
+        self.hand_writer = HandResultWriter()
+        self.game_manager.hand_complete_listeners.append(self.hand_writer.submit)
+        self.hand_writer.written_listeners.append(self._on_hands_written)
+        # 每手牌的完整历史（发牌、操作、摊牌）追加到本地日志，供核查和重放
+        self.hand_history = HandHistoryWriter()
+        self.game_manager.hand_complete_listeners.append(self.hand_history.submit)
+        # 牌桌快照存储（应用启动时恢复牌桌后设置）
+        self.table_store: Optional[TableStore] = None
+        # 因发送积压被断开的连接数
+        self.evicted_connections = 0
+        # 每个房间一个actor，按顺序执行修改该房间牌局的命令
+        self.room_actors: Dict[int, RoomActor] = {}
+        # 广播后端：单进程时直接投递，配置BACKPLANE_URL后经Redis送达其他节点上的连接
+        self.backplane = create_backplane()
+        self.backplane.attach(self._deliver_room, self._deliver_user, self._deliver_node, self._deliver_shard)
+        self.forwarded_commands = 0
+        # 观战：{room_id: 观战数据}，只在本节点有观众的房间生成公共帧
+        self.spectator_feeds: Dict[int, SpectatorFeed] = {}
+        # 大厅房间索引：人数和状态随牌局事件更新，经广播后端同步到所有节点
+        self.lobby = LobbyIndex()
+        self.lobby.send = lambda user_id, text: self._send_text(text, user_id, "lobby_update")
+        # 分片部署且广播后端只在进程内投递时，其他分片的房间人数和状态从数据库刷新
+        self.lobby.refresh_foreign = SHARD_COUNT > 1 and not self.backplane.spans_nodes
+        self.game_manager.game_event_listeners.append(self._on_lobby_game_event)
+        # 所有延迟任务（行动计时、下一手倒计时、空闲牌桌关闭）共用一个时间轮，由应用启动/关闭时启动和停止
+        self.timers = TimingWheel()
+        # 每个牌桌的定时器和时间银行：{room_id: TableClock}
+        self.table_clocks: Dict[int, TableClock] = {}
+        self.action_timeouts = 0
+        self.game_manager.game_event_listeners.append(self._on_clock_game_event)
+    
+    async def connect(self, websocket: WebSocket, user_id: int, protocol: str = JSON, subprotocol: Optional[str] = None):
+        """建立WebSocket连接（protocol为协商出的消息编码，subprotocol为回应客户端的子协议）"""
+        await websocket.accept(subprotocol=subprotocol)
+        previous = self.active_connections.get(user_id)
+        if previous:
+            # 同一用户重连，停止旧连接的发送任务
+            previous.close()
+        self.active_connections[user_id] = OutboundConnection(websocket, user_id, on_evict=self._on_evict,
+                                                            binary=protocol == MSGPACK)
+        self.backplane.subscribe_user(user_id)
+        logger.info("用户 %s 已连接", user_id)
+    
+    def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None, leave_tables: bool = True):
+        """断开WebSocket连接（指定websocket时，仅当它仍是该用户的当前连接才断开）
+
+        leave_tables为False时保留玩家在牌桌上的座位（服务重启，重启后从快照恢复）
+        """
+        connection = self.active_connections.get(user_id)
+        if websocket is not None and (connection is None or connection.websocket is not websocket):
+            return
+        if connection:
+            connection.close()
             del self.active_connections[user_id]
+            self.backplane.unsubscribe_user(user_id)
         
         # 从所有房间中移除用户
         for room_id, users in self.room_connections.items():
             if user_id in users:
                 users.remove(user_id)
-                # 如果房间中有游戏，移除玩家
-                game = self.game_manager.get_game(room_id)
-                if game:
-                    game.remove_player(user_id)
+                self._release_room_channel(room_id)
+                # 如果房间中有游戏，由房间actor移除玩家
+                if leave_tables and self.game_manager.get_game(room_id):
+                    self.room_actor(room_id).post(self._remove_from_game, room_id, user_id)
+                elif leave_tables and not owns_room(room_id):
+                    # 牌桌在其他节点，由所属节点移除玩家
+                    self._forward_room_command(user_id, room_id, "leave_room")
+        
+        for room_id in [room_id for room_id, feed in self.spectator_feeds.items() if user_id in feed.watchers]:
+            self.unwatch_room(user_id, room_id)
+        self.lobby.unsubscribe(user_id)
+        
+        logger.info("用户 %s 已断开连接", user_id)
+    
+    def _on_hands_written(self, batch: List[Dict]):
+        """牌局结果写库后筹码已变化，丢弃参与者的身份缓存"""
+        for record in batch:
+            for participant in record['participants']:
+                identity_cache.invalidate_user(participant['user_id'])
+    
+    async def _remove_from_game(self, room_id: int, user_id: int):
+        game = self.game_manager.get_game(room_id)
+        if game and game.remove_player(user_id):
+            # 断线的玩家可能正轮到行动，广播后由下一位玩家开始计时
+            await self.broadcast_game_state(room_id)
+    
+    def room_actor(self, room_id: int) -> RoomActor:
+        """获取（或创建）房间的actor"""
+        actor = self.room_actors.get(room_id)
+        if actor is None:
+            actor = self.room_actors[room_id] = RoomActor(room_id)
+        return actor
+    
+    async def run_in_room(self, room_id: int, command, *args):
+        """在房间actor中执行命令并等待结果（REST接口和WebSocket消息共用）"""
+        return await self.room_actor(room_id).call(command, *args)
+    
+    async def run_room_command(self, user_id: int, room_id: int, command: str, *args):
+        """执行玩家对房间的命令：本节点承载该房间时交给房间actor，否则转给房间所属的分片
+        
+        本节点不会为其他分片的房间创建牌桌；无法转发（没有跨节点的广播后端）时回复错误。
+        """
+        if owns_room(room_id):
+            return await self.run_in_room(room_id, getattr(self, command), user_id, room_id, *args)
+        if not self._forward_room_command(user_id, room_id, command, *args):
+            await self._reject_foreign_room(user_id, room_id)
+            return
         
-        print(f"用户 {user_id} 已断开连接")
+        # 本节点只记录连接所在的房间和观战，房间广播和观战帧经房间频道送达
+        if command == "join_room":
+            members = self.room_connections.setdefault(room_id, [])
+            if user_id not in members:
+                members.append(user_id)
+                self.backplane.subscribe_room(room_id)
+        elif command == "leave_room":
+            members = self.room_connections.get(room_id)
+            if members and user_id in members:
+                members.remove(user_id)
+                self._release_room_channel(room_id)
+        elif command == "watch_room":
+            feed = self.spectator_feeds.get(room_id)
+            if feed is None:
+                # 公共帧由所属节点生成，本节点只转发给观众
+                feed = self.spectator_feeds[room_id] = SpectatorFeed(room_id, lambda text: None)
+                self.backplane.subscribe_room(room_id)
+            feed.watchers.add(user_id)
+    
+    def _forward_room_command(self, user_id: int, room_id: int, command: str, *args) -> bool:
+        forwarded = self.backplane.publish_shard(
+            shard_for_room(room_id), "room_command", json.dumps([command, user_id, room_id, *args])
+        )
+        if forwarded:
+            self.forwarded_commands += 1
+        return forwarded
+    
+    def _deliver_shard(self, kind: str, text: str):
+        """广播后端回调：其他节点转来的房间命令，在本节点的房间actor中执行"""
+        if kind != "room_command":
+            return
+        command, user_id, room_id, *args = json.loads(text)
+        if command not in ROOM_COMMANDS or not owns_room(room_id):
+            logger.warning("忽略转发的命令 %s（房间 %s 不在本分片）", command, room_id)
+            return
+        if command == "unwatch_room":
+            self.unwatch_room(user_id, room_id)
+        else:
+            self.room_actor(room_id).post(getattr(self, command), user_id, room_id, *args)
+    
+    async def _reject_foreign_room(self, user_id: int, room_id: int):
+        await self.send_personal_message({
+            "type": "error",
+            "data": {"message": "房间不在本分片", "room_id": room_id, "shard": shard_for_room(room_id)}
+        }, user_id)
+    
+    async def stop_room_actors(self):
+        """停止所有房间actor（关闭服务时）"""
+        for actor in self.room_actors.values():
+            await actor.stop()
+        self.room_actors.clear()
+    
+    def _on_evict(self, connection: OutboundConnection, reason: str):
+        """慢消费者被断开"""
+        self.evicted_connections += 1
+        logger.warning("用户 %s 的连接被断开: %s", connection.user_id, reason)
+        self.disconnect(connection.user_id, connection.websocket)
     
     async def send_personal_message(self, message: dict, user_id: int):
-        """发送个人消息"""
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            try:
-                await websocket.send_text(json.dumps(message))
-            except:
-                # 连接已断开，清理
-                self.disconnect(user_id)
+        """发送个人消息（用户可能连接在其他节点，由广播后端送达）"""
+        self.backplane.publish_user(user_id, json.dumps(message), message.get("type"), message.get("data", {}).get("room_id"))
+    
+    def _send_text(self, text: str, user_id: int, kind: Optional[str] = None, room_id: Optional[int] = None):
+        """已序列化的消息放入该连接的发送队列，不等待网络发送"""
+        connection = self.active_connections.get(user_id)
+        if connection:
+            connection.enqueue(text, kind, room_id)
+    
+    def _deliver_room(self, room_id: int, text: str, kind: Optional[str] = None,
+                      exclude_user: Optional[int] = None, overrides: Optional[Dict[int, str]] = None):
+        """广播后端回调：把房间消息放入本节点该房间各连接的发送队列"""
+        if kind == SPECTATOR_FRAME:
+            feed = self.spectator_feeds.get(room_id)
+            if feed:
+                # 同一份文本发给所有观众
+                feed.frame = text
+                for user_id in feed.watchers:
+                    self._send_text(text, user_id, kind, room_id)
+            return
+        for user_id in self.room_connections.get(room_id, ()):
+            if not (exclude_user and user_id == exclude_user):
+                self._send_text(overrides.get(user_id, text) if overrides else text, user_id, kind, room_id)
+    
+    def _deliver_user(self, user_id: int, text: str, kind: Optional[str] = None, room_id: Optional[int] = None) -> bool:
+        """广播后端回调：用户连接在本节点时放入其发送队列"""
+        if user_id not in self.active_connections:
+            return False
+        self._send_text(text, user_id, kind, room_id)
+        return True
+    
+    def _deliver_node(self, kind: str, text: str):
+        """广播后端回调：所有节点共享的消息"""
+        if kind == "lobby":
+            update = json.loads(text)
+            room = update["room"]
+            self.lobby.apply(update["room_id"], LobbyRoom(**room) if room else None)
+    
+    def publish_lobby(self, room_id: int, room: Optional[LobbyRoom]):
+        """更新所有节点大厅索引中的房间（room为None时移除）"""
+        self.backplane.publish_nodes("lobby", json.dumps({"room_id": room_id, "room": room.to_dict() if room else None}))
+    
+    def _on_lobby_game_event(self, game: PokerGame, event: str, data: Dict):
+        """牌桌人数或阶段变化后更新大厅索引，并等待写回数据库"""
+        if event in ("journal", "removed"):
+            self._sync_lobby_room(game, removed=event == "removed")
+    
+    def _sync_lobby_room(self, game: PokerGame, removed: bool = False):
+        room = self.lobby.rooms.get(game.room_id)
+        if room is None:
+            return
+        
+        players = 0 if removed else len(game.players)
+        status = "playing" if not removed and game.game_stage not in ("waiting", "finished") else "waiting"
+        if (players, status) != (room.current_players, room.status):
+            self.lobby.mark_dirty(game.room_id)
+            self.publish_lobby(game.room_id, dataclasses.replace(room, current_players=players, status=status))
+    
+    def subscribe_lobby(self, user_id: int, filters: Optional[Dict] = None):
+        """订阅大厅：先发送符合条件的房间列表，之后只推送房间的增加、更新和移除"""
+        rooms = self.lobby.subscribe(user_id, LobbyFilter.from_dict(filters))
+        self._send_text(json.dumps({
+            "type": "lobby_snapshot",
+            "data": {"rooms": [room.to_dict() for room in rooms]}
+        }), user_id, "lobby_snapshot")
+    
+    def _release_room_channel(self, room_id: int):
+        """本节点不再有该房间的成员和观众时退订房间频道"""
+        if not self.room_connections.get(room_id) and room_id not in self.spectator_feeds:
+            self.backplane.unsubscribe_room(room_id)
     
     async def broadcast_to_room(self, message: dict, room_id: int, exclude_user: Optional[int] = None):
-        """向房间广播消息"""
-        if room_id in self.room_connections:
-            for user_id in self.room_connections[room_id]:
-                if exclude_user and user_id == exclude_user:
-                    continue
-                await self.send_personal_message(message, user_id)
+        """向房间广播消息（只序列化一次，各连接的写任务负责发送）"""
+        self.backplane.publish_room(room_id, json.dumps(message), message.get("type"), exclude_user)
+    
+    def restore_tables(self, store: TableStore) -> List[int]:
+        """启动时从快照和操作日志恢复所有牌桌，之后的状态变更继续记录到store"""
+        start = time.perf_counter()
+        restored = self.game_manager.restore_games(store.load_all())
+        # 重放后的状态重新快照，清空旧日志
+        store.snapshot_all(self.game_manager.games.values())
+        self.game_manager.game_event_listeners.append(store.on_game_event)
+        self.table_store = store
+        
+        for room_id in restored:
+            # 大厅索引中的人数以恢复后的牌桌为准
+            self._sync_lobby_room(self.game_manager.get_game(room_id))
+            # 重启前轮到行动的玩家重新计时，已结束、尚未重置的牌桌重新开始倒计时，空牌桌等待关闭
+            self._update_table_clock(self.game_manager.get_game(room_id))
+            if room_id in self.game_manager.pending_showdowns:
+                # 重启前挂起的摊牌在房间actor中结算并广播
+                self.room_actor(room_id).post(self.broadcast_game_state, room_id)
+        logger.info("已恢复 %s 张牌桌，耗时 %.1fms", len(restored), (time.perf_counter() - start) * 1000)
+        return restored
+    
+    def save_tables(self):
+        """关闭前快照所有牌桌"""
+        if self.table_store:
+            self.table_store.snapshot_all(self.game_manager.games.values())
+            self.table_store.close()
+            self.table_store = None
+    
+    def get_metrics(self) -> Dict:
+        """发送队列指标：连接数、队列深度、已发送/丢弃/合并的消息数"""
+        connections = [connection.stats() for connection in self.active_connections.values()]
+        depths = [stats["queue_depth"] for stats in connections]
+        return {
+            "connections": len(connections),
+            "binary_connections": sum(1 for stats in connections if stats["binary"]),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "messages_sent": sum(stats["sent"] for stats in connections),
+            "messages_dropped": sum(stats["dropped"] for stats in connections),
+            "messages_coalesced": sum(stats["coalesced"] for stats in connections),
+            "evicted_connections": self.evicted_connections,
+            "forwarded_commands": self.forwarded_commands,
+            "slowest": sorted(connections, key=lambda stats: stats["queue_depth"], reverse=True)[:10],
+            "room_actors": self._room_actor_metrics(),
+            "backplane": self.backplane.stats(),
+            "spectators": self._spectator_metrics(),
+            "lobby": self.lobby.stats(),
+            "timers": dict(self.timers.stats(), action_timeouts=self.action_timeouts)
+        }
+    
+    def _room_actor_metrics(self) -> Dict:
+        """房间actor指标：命令积压、已执行/失败数和最长排队时间"""
+        actors = [actor.stats() for actor in self.room_actors.values()]
+        return {
+            "rooms": len(actors),
+            "queued_total": sum(stats["queued"] for stats in actors),
+            "processed": sum(stats["processed"] for stats in actors),
+            "failed": sum(stats["failed"] for stats in actors),
+            "busiest": sorted(actors, key=lambda stats: stats["max_wait_ms"], reverse=True)[:10]
+        }
+    
+    def _spectator_metrics(self) -> Dict:
+        """观战指标：观战房间数、观众数和生成/放出的公共帧数"""
+        feeds = [feed.stats() for feed in self.spectator_feeds.values()]
+        return {
+            "rooms": len(feeds),
+            "watchers": sum(stats["watchers"] for stats in feeds),
+            "frames_built": sum(stats["frames_built"] for stats in feeds),
+            "frames_released": sum(stats["frames_released"] for stats in feeds),
+            "top": sorted(feeds, key=lambda stats: stats["watchers"], reverse=True)[:10]
+        }
     
     async def join_room(self, user_id: int, room_id: int, username: str, chips: int):
         """加入房间"""
+        if not owns_room(room_id):
+            # 牌桌只由所属分片创建，避免同一房间出现两张牌桌
+            await self._reject_foreign_room(user_id, room_id)
+            return False
+        
         if room_id not in self.room_connections:
             self.room_connections[room_id] = []
         
         if user_id not in self.room_connections[room_id]:
             self.room_connections[room_id].append(user_id)
+            self.backplane.subscribe_room(room_id)
         
         # 获取或创建游戏
         game = self.game_manager.get_game(room_id)
         if not game:
-            # 这里应该从数据库获取房间信息
-            game = self.game_manager.create_game(room_id, 10, 20)  # 默认盲注
+            # 盲注取自大厅索引，房间不在索引中时使用默认盲注
+            room = await self.lobby.lookup(room_id)
+            if room:
+                game = self.game_manager.create_game(room_id, room.small_blind, room.big_blind)
+            else:
+                game = self.game_manager.create_game(room_id, 10, 20)
         
         # 添加玩家到游戏，自动分配座位位置
         # 找到第一个可用的座位位置（0-8）
-        available_position = None
-        occupied_positions = {p.position for p in game.players if p.position >= 0}
-        for pos in range(9):  # 最多9个座位
-            if pos not in occupied_positions:
-                available_position = pos
-                break
+        available_position = next((pos for pos, seat in enumerate(game.seats) if seat is None), None)
         
         success = game.add_player(user_id, username, chips, available_position)
         
@@ -107,6 +414,7 @@ class ConnectionManager:
         """离开房间"""
         if room_id in self.room_connections and user_id in self.room_connections[room_id]:
             self.room_connections[room_id].remove(user_id)
+            self._release_room_channel(room_id)
             
             # 从游戏中移除玩家
             game = self.game_manager.get_game(room_id)
@@ -190,34 +498,258 @@ class ConnectionManager:
                 "data": {"message": "无法开始游戏，玩家数量不足"}
             }, user_id)
     
+    async def compute_all_in_equity(self, game: PokerGame, samples: int = BROADCAST_EQUITY_SAMPLES,
+                                    time_budget: float = BROADCAST_EQUITY_TIME_BUDGET) -> Optional[dict]:
+        """全员全下后计算胜率（在线程中执行，不阻塞事件循环）
+
+        结果按 (samples, time_budget) 缓存在本手牌内，穷举结果与抽样参数无关，直接复用；
+        按广播参数计算的结果同时作为game.equity随游戏状态下发。
+        """
+        if not game.all_in_snapshot:
+            return game.equity
+        key = (samples, time_budget)
+        broadcast_key = (BROADCAST_EQUITY_SAMPLES, BROADCAST_EQUITY_TIME_BUDGET)
+        if game.equity is not None and (game.equity["exact"] or key == broadcast_key):
+            return game.equity
+        snapshot = game.all_in_snapshot
+        equity = game.equity_estimates.get(key)
+        if equity is None:
+            equity = await asyncio.to_thread(
+                calculate_equity,
+                snapshot["hole_cards"],
+                snapshot["community_cards"],
+                snapshot["remaining_cards"],
+                samples,
+                time_budget
+            )
+            if game.all_in_snapshot is not snapshot:
+                # 计算期间本手牌已结束
+                return equity
+            game.equity_estimates[key] = equity
+        if key == broadcast_key or equity["exact"]:
+            game.equity = equity
+        return equity
+    
     async def broadcast_game_state(self, room_id: int):
         """广播游戏状态给房间内所有玩家"""
+        # 结算本房间挂起的摊牌（同时批量评估其他挂起的牌桌，由它们各自的actor结算）
+        self.game_manager.resolve_pending_showdown(room_id)
+        
         game = self.game_manager.get_game(room_id)
         if not game:
             return
         
-        if room_id in self.room_connections:
-            for user_id in self.room_connections[room_id]:
-                game_state = game.get_game_state(user_id)
-                await self.send_personal_message({
-                    "type": "game_state",
-                    "data": game_state
-                }, user_id)
-            
-            # 如果游戏结束且有游戏结果数据，广播游戏结果
-            if game.game_stage == "finished" and game.game_results:
-                await self.broadcast_to_room({
-                    "type": "game_results",
-                    "data": game.game_results
-                }, room_id)
-                
-                # 延迟3秒后重置游戏状态为waiting
-                asyncio.create_task(self._delayed_reset_game_state(room_id))
+        # 全下后先算出胜率，随游戏状态一起下发
+        await self.compute_all_in_equity(game)
+        
+        # 房间成员可能连接在其他节点，本节点没有该房间的连接时也照常生成增量
+        # 只下发相对上次广播的增量，手牌变化单独合并给本人
+        patch, private = game.build_state_patch()
+        if patch:
+            overrides = {}
+            for user_id, hole_cards in private.items():
+                players = dict(patch["players"])
+                players[user_id] = dict(players.get(user_id, {}), hole_cards=hole_cards)
+                overrides[user_id] = json.dumps({"type": "game_state_patch", "data": dict(patch, players=players)})
+            self.backplane.publish_room(
+                room_id, json.dumps({"type": "game_state_patch", "data": patch}), "game_state_patch",
+                overrides=overrides
+            )
+        
+        # 观众共享每个状态版本的一帧公共状态
+        feed = self.spectator_feeds.get(room_id)
+        if feed:
+            feed.update(game)
+        
+        # 如果游戏结束且有游戏结果数据，广播游戏结果
+        if game.game_stage == "finished" and game.game_results:
+            await self.broadcast_to_room({
+                "type": "game_results",
+                "data": game.game_results
+            }, room_id)
+        
+        # 行动计时和下一手倒计时随状态更新
+        self._update_table_clock(game)
+    
+    async def send_game_snapshot(self, user_id: int, room_id: int):
+        """发送完整游戏状态（加入房间或客户端检测到增量缺失时）"""
+        game = self.game_manager.get_game(room_id)
+        if not game:
+            await self.send_personal_message({
+                "type": "error",
+                "data": {"message": "游戏不存在"}
+            }, user_id)
+            return
+        
+        await self.send_personal_message({
+            "type": "game_state",
+            "data": game.get_game_state(user_id)
+        }, user_id)
+    
+    async def watch_room(self, user_id: int, room_id: int):
+        """观战：不占座位，只接收（可延迟的）公共状态帧"""
+        game = self.game_manager.get_game(room_id)
+        if not game:
+            await self.send_personal_message({
+                "type": "error",
+                "data": {"message": "游戏不存在"}
+            }, user_id)
+            return
+        
+        feed = self.spectator_feeds.get(room_id)
+        if feed is None:
+            feed = self.spectator_feeds[room_id] = SpectatorFeed(
+                room_id, lambda text: self.backplane.publish_room(room_id, text, SPECTATOR_FRAME)
+            )
+            self.backplane.subscribe_room(room_id)
+        feed.watchers.add(user_id)
+        
+        if feed.frame is not None:
+            # 观众可能连接在其他节点
+            self.backplane.publish_user(user_id, feed.frame, SPECTATOR_FRAME, room_id)
+        else:
+            # 房间的第一个观众：立即生成当前版本的帧（有延迟时到时放出）
+            feed.update(game)
+    
+    def unwatch_room(self, user_id: int, room_id: int):
+        """停止观战，房间没有观众后不再生成公共帧"""
+        feed = self.spectator_feeds.get(room_id)
+        if feed is None:
+            return
+        feed.watchers.discard(user_id)
+        if not feed.watchers:
+            del self.spectator_feeds[room_id]
+            self._release_room_channel(room_id)
+        if not owns_room(room_id):
+            # 所属节点上的观众记录一并移除
+            self._forward_room_command(user_id, room_id, "unwatch_room")
+    
+    def _post_to_room(self, room_id: int, command, *args):
+        """定时器回调：把命令交给房间actor执行（时间轮驱动任务不等待结果）"""
+        self.room_actor(room_id).post(command, *args)
+    
+    def _table_clock(self, room_id: int) -> TableClock:
+        clock = self.table_clocks.get(room_id)
+        if clock is None:
+            clock = self.table_clocks[room_id] = TableClock(room_id)
+        return clock
     
-    async def _delayed_reset_game_state(self, room_id: int):
-        """延迟重置游戏状态为waiting"""
-        await asyncio.sleep(8)  # 等待3秒
+    def _update_table_clock(self, game: PokerGame):
+        """按牌局状态安排行动计时和下一手倒计时（在房间actor中调用）"""
+        room_id = game.room_id
+        clock = self._table_clock(room_id)
         
+        turn = current_turn(game)
+        if turn != clock.turn:
+            clock.end_turn()
+            if turn is not None:
+                clock.refill(game)
+                user_id = turn[2]
+                allowed = ACTION_TIMEOUT + clock.bank(user_id)
+                clock.start_turn(turn, self.timers.call_later(
+                    allowed, self._post_to_room, room_id, self._on_action_timeout, room_id, turn
+                ))
+                self.backplane.publish_room(room_id, json.dumps({
+                    "type": "action_clock",
+                    "data": {
+                        "room_id": room_id,
+                        "user_id": user_id,
+                        "timeout": ACTION_TIMEOUT,
+                        "time_bank": round(clock.bank(user_id), 1),
+                        "deadline": time.time() + allowed
+                    }
+                }), "action_clock")
+        
+        if game.game_stage == "finished" and game.game_results:
+            if clock.reset_timer is None:
+                # 等待期间不占用房间actor，重置本身作为命令排队执行
+                clock.reset_timer = self.timers.call_later(
+                    NEXT_HAND_DELAY, self._post_to_room, room_id, self._reset_finished_game, room_id
+                )
+                self.backplane.publish_room(room_id, json.dumps({
+                    "type": "next_hand_countdown",
+                    "data": {"room_id": room_id, "seconds": NEXT_HAND_DELAY}
+                }), "next_hand_countdown")
+        else:
+            clock.cancel_reset()
+        
+        self._update_idle_timer(game, clock)
+    
+    def _update_idle_timer(self, game: PokerGame, clock: TableClock):
+        """牌桌没有玩家时开始空闲计时，有人入座后取消"""
+        if game.players or IDLE_TABLE_TIMEOUT <= 0:
+            clock.cancel_idle()
+        elif clock.idle_timer is None:
+            clock.idle_timer = self.timers.call_later(
+                IDLE_TABLE_TIMEOUT, self._post_to_room, game.room_id, self._close_idle_table, game.room_id
+            )
+    
+    def _on_clock_game_event(self, game: PokerGame, event: str, data: Dict):
+        """入座/离座后更新空闲计时；牌桌移除后取消它的所有定时器"""
+        if event == "removed":
+            clock = self.table_clocks.pop(game.room_id, None)
+            if clock:
+                clock.cancel_all()
+        elif event == "journal" and data.get("op") in ("add_player", "remove_player"):
+            self._update_idle_timer(game, self._table_clock(game.room_id))
+    
+    async def _on_action_timeout(self, room_id: int, turn):
+        """行动超时：能过牌时自动过牌，否则弃牌"""
+        game = self.game_manager.get_game(room_id)
+        clock = self.table_clocks.get(room_id)
+        if not game or not clock or clock.turn != turn:
+            return
+        if current_turn(game) != turn:
+            # 状态已变化但还没有广播（如玩家离座），广播后重新计时
+            await self.broadcast_game_state(room_id)
+            return
+        
+        user_id = turn[2]
+        player = game.players[game.current_player_index]
+        action = "check" if player.current_bet >= game.current_bet else "fold"
+        if action == "fold" and game.live_count <= 1:
+            # 不让唯一的在局玩家超时弃牌（奖池应直接归他），广播时结算
+            logger.warning("房间 %s 只剩玩家 %s 在局，不自动弃牌", room_id, user_id)
+            await self.broadcast_game_state(room_id)
+            return
+        # 时间银行已用完，这次行动机会不再扣除
+        clock.action_timer = None
+        clock.turn = None
+        clock.time_banks[user_id] = 0.0
+        self.action_timeouts += 1
+        logger.info("房间 %s 玩家 %s 行动超时，自动%s", room_id, user_id, "过牌" if action == "check" else "弃牌")
+        
+        await self.broadcast_to_room({
+            "type": "action_timeout",
+            "data": {"room_id": room_id, "user_id": user_id, "action": action}
+        }, room_id)
+        await self.handle_game_action(user_id, room_id, action)
+    
+    async def _close_idle_table(self, room_id: int):
+        """关闭长时间没有玩家的牌桌，释放牌局、定时器和房间actor"""
+        clock = self.table_clocks.get(room_id)
+        if clock:
+            clock.idle_timer = None
+        game = self.game_manager.get_game(room_id)
+        if not game or game.players:
+            return
+        if self.room_connections.get(room_id) or room_id in self.spectator_feeds:
+            # 还有人停留在房间页面或观战，继续等待
+            self._update_idle_timer(game, self._table_clock(room_id))
+            return
+        
+        self.game_manager.remove_game(room_id)
+        actor = self.room_actors.get(room_id)
+        if actor is not None and actor.in_actor() and actor.queue.empty():
+            # 当前命令就是最后一条，之后的命令会创建新的actor
+            del self.room_actors[room_id]
+            asyncio.get_running_loop().create_task(actor.stop())
+        logger.info("房间 %s 的牌桌空闲超过 %s 秒，已关闭", room_id, IDLE_TABLE_TIMEOUT)
+    
+    async def _reset_finished_game(self, room_id: int):
+        clock = self.table_clocks.get(room_id)
+        if clock:
+            clock.reset_timer = None
         game = self.game_manager.get_game(room_id)
         if game and game.game_stage == "finished":
             # 重置游戏状态
@@ -311,10 +843,7 @@ class ConnectionManager:
             return
         
         # 构建手牌信息
-        cards_info = []
-        for card in player.hole_cards:
-            card_dict = card.to_dict()
-            cards_info.append(card_dict)
+        cards_info = [card_to_dict(card) for card in player.hole_cards]
         
         # 广播展示手牌消息
         await self.broadcast_to_room({
@@ -327,19 +856,73 @@ class ConnectionManager:
         }, room_id)
         
         # 发送聊天消息通知
-        card_text = ""
-        for card in player.hole_cards:
-            rank_str = {
-                11: 'J', 12: 'Q', 13: 'K', 14: 'A'
-            }.get(card.rank.value, str(card.rank.value))
-            card_text += f"{rank_str}{card.suit.value} "
-        
-        await self.send_chat_message(user_id, room_id, f"展示了手牌：{card_text.strip()}", username)
+        card_text = " ".join(card_to_str(card) for card in player.hole_cards)
+        
+        await self.send_chat_message(user_id, room_id, f"展示了手牌：{card_text}", username)
 
 # 全局连接管理器实例
 manager = ConnectionManager()
 
-async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Depends(get_db)):
+# 入站消息分发器；修改牌局的消息交给对应房间的actor按顺序执行
+dispatcher = MessageDispatcher()
+
+@dispatcher.handler("join_room", RoomData)
+async def on_join_room(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "join_room", user.username, user.chips)
+
+@dispatcher.handler("leave_room", RoomData)
+async def on_leave_room(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "leave_room")
+
+@dispatcher.handler("watch_room", RoomData)
+async def on_watch_room(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "watch_room")
+
+@dispatcher.handler("unwatch_room", RoomData)
+async def on_unwatch_room(user: User, data: RoomData):
+    manager.unwatch_room(user.id, data.room_id)
+
+@dispatcher.handler("subscribe_lobby", LobbyFilterData)
+async def on_subscribe_lobby(user: User, data: LobbyFilterData):
+    manager.subscribe_lobby(user.id, data.model_dump())
+
+@dispatcher.handler("unsubscribe_lobby")
+async def on_unsubscribe_lobby(user: User, data: EmptyData):
+    manager.lobby.unsubscribe(user.id)
+
+@dispatcher.handler("game_action", GameActionData)
+async def on_game_action(user: User, data: GameActionData):
+    await manager.run_room_command(user.id, data.room_id, "handle_game_action", data.action, data.amount)
+
+@dispatcher.handler("start_game", RoomData)
+async def on_start_game(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "start_game")
+
+@dispatcher.handler("player_ready", PlayerReadyData)
+async def on_player_ready(user: User, data: PlayerReadyData):
+    await manager.run_room_command(user.id, data.room_id, "set_player_ready", data.ready)
+
+@dispatcher.handler("chat", ChatData)
+async def on_chat(user: User, data: ChatData):
+    await manager.send_chat_message(user.id, data.room_id, data.message, user.username)
+
+@dispatcher.handler("sync_state", RoomData)
+async def on_sync_state(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "send_game_snapshot")
+
+@dispatcher.handler("show_cards", RoomData)
+async def on_show_cards(user: User, data: RoomData):
+    await manager.run_room_command(user.id, data.room_id, "show_player_cards", user.username)
+
+@dispatcher.handler("ping")
+async def on_ping(user: User, data: EmptyData):
+    # 心跳包
+    await manager.send_personal_message({
+        "type": "pong",
+        "data": {}
+    }, user.id)
+
+async def websocket_endpoint(websocket: WebSocket, token: str):
     """WebSocket端点"""
     # 验证token
     username = verify_token(token)
@@ -347,72 +930,39 @@ async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Dep
         await websocket.close(code=4001, reason="Invalid token")
         return
     
-    # 获取用户信息
-    user = db.query(User).filter(User.username == username).first()
+    # 获取用户信息（只在建立连接时查询一次，不在整个连接期间占用数据库会话；命中身份缓存时不查库）
+    user = identity_cache.get(token)
+    if user is None:
+        async with AsyncSessionLocal() as db:
+            user = await load_user(db, token)
     if not user:
         await websocket.close(code=4002, reason="User not found")
         return
     
+    # 消息编码：默认JSON，可通过查询参数或子协议选择msgpack
+    protocol, subprotocol = negotiate(websocket)
+    if protocol is None:
+        await websocket.close(code=4003, reason="Unsupported protocol")
+        return
+    
     # 建立连接
-    await manager.connect(websocket, user.id)
+    await manager.connect(websocket, user.id, protocol, subprotocol)
     
     try:
         while True:
-            # 接收消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            message_type = message.get("type")
-            message_data = message.get("data", {})
-            
-            if message_type == "join_room":
-                room_id = message_data.get("room_id")
-                if room_id:
-                    await manager.join_room(user.id, room_id, user.username, user.chips)
-            
-            elif message_type == "leave_room":
-                room_id = message_data.get("room_id")
-                if room_id:
-                    await manager.leave_room(user.id, room_id)
-            
-            elif message_type == "game_action":
-                room_id = message_data.get("room_id")
-                action = message_data.get("action")
-                amount = message_data.get("amount", 0)
-                if room_id and action:
-                    await manager.handle_game_action(user.id, room_id, action, amount)
-            
-            elif message_type == "start_game":
-                room_id = message_data.get("room_id")
-                if room_id:
-                    await manager.start_game(user.id, room_id)
-            
-            elif message_type == "player_ready":
-                room_id = message_data.get("room_id")
-                ready = message_data.get("ready", False)
-                if room_id is not None:
-                    await manager.set_player_ready(user.id, room_id, ready)
-            
-            elif message_type == "chat":
-                room_id = message_data.get("room_id")
-                message_text = message_data.get("message")
-                if room_id and message_text:
-                    await manager.send_chat_message(user.id, room_id, message_text, user.username)
-            
-            elif message_type == "show_cards":
-                room_id = message_data.get("room_id")
-                if room_id:
-                    await manager.show_player_cards(user.id, room_id, user.username)
-            
-            elif message_type == "ping":
-                # 心跳包
+            # 接收消息（文本帧为JSON，二进制帧为msgpack），校验后交给对应的处理函数
+            payload = await receive_frame(websocket)
+            try:
+                await dispatcher.dispatch(user, payload)
+            except InvalidMessage as e:
                 await manager.send_personal_message({
-                    "type": "pong",
-                    "data": {}
+                    "type": "error",
+                    "data": {"message": "消息格式错误", "message_type": e.message_type, "errors": e.errors}
                 }, user.id)
     
-    except WebSocketDisconnect:
-        manager.disconnect(user.id)
+    except WebSocketDisconnect as e:
+        # 1012：服务重启，保留牌桌座位
+        manager.disconnect(user.id, websocket, leave_tables=e.code != 1012)
     except Exception as e:
-        print(f"WebSocket错误: {e}")
-        manager.disconnect(user.id)
\ No newline at end of file
+        logger.exception("WebSocket错误: %s", e)
+        manager.disconnect(user.id, websocket)
\ No newline at end of file
@@ -58,6 +58,24 @@ export const useRoomStore = defineStore('room', () => {
     }
   }
 
+  const setRooms = (list: Room[]) => {
+    rooms.value = list
+  }
+
+  // 应用大厅订阅推送的房间增加/更新/移除
+  const applyLobbyUpdate = (update: { action: 'added' | 'updated' | 'removed', room_id: number, room: Room | null }) => {
+    const index = rooms.value.findIndex(r => Number(r.id) === update.room_id)
+    if (update.action === 'removed' || !update.room) {
+      if (index >= 0) {
+        rooms.value.splice(index, 1)
+      }
+    } else if (index >= 0) {
+      rooms.value[index] = update.room
+    } else {
+      rooms.value.push(update.room)
+    }
+  }
+
   const joinRoom = async (roomId: string, password?: string) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/rooms/${roomId}/join`, {
@@ -198,6 +216,8 @@ export const useRoomStore = defineStore('room', () => {
     currentRoom,
     isInRoom,
     loadRooms,
+    setRooms,
+    applyLobbyUpdate,
     joinRoom,
     leaveRoom,
     createRoom,
@@ -15,6 +15,10 @@ class WebSocketService {
   private isConnecting = false
   private messageQueue: WebSocketMessage[] = []
   private currentToken: string | null = null
+  // 每个房间最近的完整状态（含seq），用于应用增量
+  private roomStates: Record<number, any> = {}
+  // 大厅订阅的筛选条件，重连后重新订阅
+  private lobbyFilters: Record<string, any> | null = null
 
   constructor() {
     // 不在构造函数中初始化store，而是在需要时获取
@@ -52,6 +56,10 @@ class WebSocketService {
           this.isConnecting = false
           this.reconnectAttempts = 0
           
+          if (this.lobbyFilters) {
+            this.send({ type: 'subscribe_lobby', data: this.lobbyFilters })
+          }
+          
           // 发送队列中的消息
           while (this.messageQueue.length > 0) {
             const message = this.messageQueue.shift()
@@ -106,6 +114,8 @@ class WebSocketService {
     }
     this.messageQueue = []
     this.currentToken = null
+    this.roomStates = {}
+    this.lobbyFilters = null
   }
 
   send(message: WebSocketMessage) {
@@ -179,6 +189,60 @@ class WebSocketService {
     })
   }
 
+  // 请求完整游戏状态（增量缺失时）
+  requestStateSync(roomId: number) {
+    this.send({
+      type: 'sync_state',
+      data: {
+        room_id: roomId
+      }
+    })
+  }
+
+  // 应用游戏状态增量，seq不连续时重新请求完整状态
+  private applyStatePatch(patch: any) {
+    const base = this.roomStates[patch.room_id]
+    if (!base || patch.seq !== base.seq + 1) {
+      if (!base || patch.seq > base.seq) {
+        this.requestStateSync(patch.room_id)
+      }
+      return
+    }
+
+    const players = new Map<number, any>(base.players.map((p: any) => [p.user_id, p]))
+    for (const userId of patch.removed || []) {
+      players.delete(userId)
+    }
+    for (const [id, fields] of Object.entries(patch.players || {})) {
+      const userId = Number(id)
+      players.set(userId, { ...(players.get(userId) || {}), ...(fields as object) })
+    }
+    const order: number[] = patch.order || base.players.map((p: any) => p.user_id).filter((id: number) => players.has(id))
+
+    const next = {
+      ...base,
+      ...patch.changes,
+      seq: patch.seq,
+      players: order.map((id) => players.get(id)).filter(Boolean)
+    }
+    this.roomStates[patch.room_id] = next
+    this.getStores().gameStore.updateGameStateFromAPI(next)
+  }
+
+  // 订阅大厅房间变化（替代轮询房间列表）
+  subscribeLobby(filters: Record<string, any> = {}) {
+    this.lobbyFilters = filters
+    // 未连接时在连接建立后订阅
+    if (this.isConnected()) {
+      this.send({ type: 'subscribe_lobby', data: filters })
+    }
+  }
+
+  unsubscribeLobby() {
+    this.lobbyFilters = null
+    this.send({ type: 'unsubscribe_lobby', data: {} })
+  }
+
   // 心跳包
   ping() {
     this.send({
@@ -210,7 +274,7 @@ class WebSocketService {
     console.log('Received WebSocket message:', message)
     
     try {
-      const { gameStore } = this.getStores()
+      const { gameStore, roomStore } = this.getStores()
       
       switch (message.type) {
         case 'game_state':
@@ -221,9 +285,26 @@ class WebSocketService {
           
           // 更新游戏状态
           if (message.data) {
+            this.roomStates[message.data.room_id] = message.data
             gameStore.updateGameStateFromAPI(message.data)
           }
           break
+
+        case 'game_state_patch':
+          if (message.data) {
+            this.applyStatePatch(message.data)
+          }
+          break
+          
+        case 'lobby_snapshot':
+          roomStore.setRooms(message.data?.rooms || [])
+          break
+
+        case 'lobby_update':
+          if (message.data) {
+            roomStore.applyLobbyUpdate(message.data)
+          }
+          break
           
         case 'game_action':
           // 处理游戏动作结果
@@ -242,6 +323,19 @@ class WebSocketService {
         case 'player_left':
           console.log('Player left:', message.data)
           break
+
+        case 'action_clock':
+          // 轮到玩家行动：deadline为截止时间戳（秒）
+          console.log('Action clock:', message.data)
+          break
+
+        case 'action_timeout':
+          console.log('Action timeout:', message.data)
+          break
+
+        case 'next_hand_countdown':
+          console.log('Next hand countdown:', message.data)
+          break
           
         case 'chat_message':
           // 处理聊天消息